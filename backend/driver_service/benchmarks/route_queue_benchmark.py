@@ -0,0 +1,102 @@
+"""
+Route queue benchmark: legacy JSON route vs packed records + head cursor.
+
+Measures the per-tick route work the simulator does for one driver (peek the
+head, then pop it) and how many bytes of route data each tick has to write,
+for a few route lengths. No database is needed.
+
+    python benchmarks/route_queue_benchmark.py [--lengths 100 1000 5000] [--ticks 500]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'driver_service.settings')
+
+import django
+django.setup()
+
+from drivers.models import Driver
+
+
+class LegacyJsonRoute:
+    """The previous route_queue_json behaviour: parse on every access, re-dump on every pop"""
+
+    def __init__(self, route):
+        self.route_queue_json = json.dumps(route)
+
+    @property
+    def route_queue(self):
+        return json.loads(self.route_queue_json)
+
+    def peek_route(self):
+        queue = self.route_queue
+        return queue[0] if queue else None
+
+    def pop_route(self):
+        queue = self.route_queue
+        coord = queue.pop(0)
+        self.route_queue_json = json.dumps(queue)
+        return coord
+
+
+def make_route(length):
+    return [
+        {'lat': 12.9 + i * 1e-4, 'lng': 77.6 + i * 1e-4,
+         'station_id': None, 'near_station_id': 7 if i % 50 == 0 else None,
+         'near_station_m': 42.0 if i % 50 == 0 else None}
+        for i in range(length)
+    ]
+
+
+def bench_legacy(route, ticks):
+    legacy = LegacyJsonRoute(route)
+    written = 0
+    started = time.perf_counter()
+    for _ in range(ticks):
+        legacy.peek_route()
+        legacy.pop_route()
+        written += len(legacy.route_queue_json)
+    return (time.perf_counter() - started) / ticks, written / ticks
+
+
+def bench_packed(route, ticks):
+    driver = Driver(user_id=0)
+    driver.route_queue = route
+    # Simulate a freshly loaded row: the blob came from the database
+    driver = Driver(user_id=0, route_blob=bytes(driver.route_blob), route_head=0)
+    written = 0
+    started = time.perf_counter()
+    for _ in range(ticks):
+        driver.peek_route()
+        driver.pop_route(save=False)
+        written += sum(
+            len(driver.route_blob) if field == 'route_blob' else 4
+            for field in driver.dirty_route_fields()
+        )
+    return (time.perf_counter() - started) / ticks, written / ticks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Route queue storage benchmark")
+    parser.add_argument('--lengths', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--ticks', type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'waypoints':>10} {'json us/tick':>14} {'packed us/tick':>15} {'speedup':>8} "
+          f"{'json B/tick':>12} {'packed B/tick':>14}")
+    for length in args.lengths:
+        route = make_route(length)
+        ticks = min(args.ticks, length)
+        json_s, json_bytes = bench_legacy(route, ticks)
+        packed_s, packed_bytes = bench_packed(route, ticks)
+        print(f"{length:>10} {json_s * 1e6:>14.1f} {packed_s * 1e6:>15.1f} "
+              f"{json_s / packed_s:>7.1f}x {json_bytes:>12.0f} {packed_bytes:>14.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Driver
+from .models import Driver, SimulatorShard, SimulatorLease
 
 @admin.register(Driver)
 class DriverAdmin(admin.ModelAdmin):
@@ -8,3 +8,11 @@ class DriverAdmin(admin.ModelAdmin):
     list_filter = ('is_simulating',)
     search_fields = ('user_id',)
 
+
+@admin.register(SimulatorShard)
+class SimulatorShardAdmin(admin.ModelAdmin):
+    list_display = ('worker_id', 'partitions', 'last_tick_ms', 'drivers_last_tick', 'last_heartbeat')
+
+@admin.register(SimulatorLease)
+class SimulatorLeaseAdmin(admin.ModelAdmin):
+    list_display = ('partition', 'owner', 'expires_at')
@@ -0,0 +1,68 @@
+"""
+Clocks for the simulator's tick scheduler.
+
+WallClock sleeps for real. VirtualClock advances instantly when asked to
+sleep, so a fast-forward run executes ticks as fast as the CPU allows while
+the scheduler still sees evenly spaced deadlines.
+"""
+
+import time
+from datetime import datetime, timedelta
+
+
+class WallClock:
+
+    def now(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class VirtualClock:
+    """
+    Clock whose time only moves when sleep() is called.
+    It also tracks simulated wall-clock time: every tick_seconds of clock time
+    is one simulated minute, starting from start_time (HH:MM).
+    """
+
+    def __init__(self, tick_seconds=3.0, start_time='10:00'):
+        self.tick_seconds = tick_seconds
+        self.start_time = start_time
+        self._now = 0.0
+
+    def now(self):
+        return self._now
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self._now += seconds
+
+    @property
+    def sim_minutes(self):
+        return int(round(self._now / self.tick_seconds))
+
+    @property
+    def sim_time(self):
+        """Current simulated time as HH:MM"""
+        hour, minute = map(int, self.start_time.split(':'))
+        dt = datetime(2024, 1, 1, hour, minute) + timedelta(minutes=self.sim_minutes)
+        return dt.strftime('%H:%M')
+
+    def minutes_until(self, target_time):
+        """Simulated minutes from start_time to a later target_time the same day (HH:MM)"""
+        minutes = parse_hhmm(target_time) - parse_hhmm(self.start_time)
+        if minutes <= 0:
+            raise ValueError(f"{target_time} is not after the start time {self.start_time}")
+        return minutes
+
+
+def parse_hhmm(value):
+    """'HH:MM' -> minutes after midnight; ValueError when malformed"""
+    try:
+        hour, minute = map(int, value.split(':'))
+    except (AttributeError, ValueError):
+        raise ValueError(f"Expected HH:MM, got {value!r}")
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(f"Expected HH:MM, got {value!r}")
+    return hour * 60 + minute
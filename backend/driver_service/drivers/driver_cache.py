@@ -0,0 +1,207 @@
+"""
+Process-local read-through cache of hot driver records.
+
+GetDriver / GetDrivers (gRPC) and retrieve / by_user (REST) read drivers
+through this cache instead of querying the database (and re-parsing the
+route) on every call. Entries are bounded (least recently used evicted first)
+and expire after a TTL.
+
+Writes in this process invalidate the entry: Driver.save(), delete() and
+save_route() (see models.py) and the bulk location ingest. The simulator runs
+in its own process and the REST and gRPC servers are separate processes too,
+so their writes are only picked up when the TTL expires; keep it short.
+
+A read that raced with an invalidation (loaded before, stored after) is not
+cached, so an invalidated record never comes back until the next load.
+Cached drivers are shared between callers and must be treated as read-only;
+writers load their own copy from the database.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class DriverCache:
+
+    def __init__(self, max_entries=10000, ttl=2.0, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+
+        self._entries = OrderedDict()   # driver id -> (expires_at, driver)
+        self._by_user = {}              # user id -> driver id
+        self._invalidated = OrderedDict()  # driver id -> generation of its last invalidation
+        self._generation = 0
+        self._cleared_generation = 0
+        self._trimmed_generation = 0    # newest invalidation dropped from _invalidated
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def generation(self):
+        """Token to take before loading from the database; pass it to put()"""
+        with self._lock:
+            return self._generation
+
+    def get(self, driver_id):
+        with self._lock:
+            entry = self._entries.get(driver_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, driver = entry
+            if self.clock() >= expires_at:
+                self._drop(driver_id)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(driver_id)
+            self.hits += 1
+            return driver
+
+    def get_by_user(self, user_id):
+        with self._lock:
+            driver_id = self._by_user.get(user_id)
+        if driver_id is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        return self.get(driver_id)
+
+    def put(self, driver, generation):
+        """Cache a driver loaded after generation() returned `generation`"""
+        with self._lock:
+            if (generation < self._cleared_generation
+                    or generation < self._trimmed_generation
+                    or self._invalidated.get(driver.id, -1) > generation):
+                return
+            if driver.id in self._entries:
+                self._drop(driver.id)
+            self._entries[driver.id] = (self.clock() + self.ttl, driver)
+            self._by_user[driver.user_id] = driver.id
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate(self, *driver_ids):
+        with self._lock:
+            self._generation += 1
+            for driver_id in driver_ids:
+                self._drop(driver_id)
+                self._invalidated[driver_id] = self._generation
+                self._invalidated.move_to_end(driver_id)
+                self.invalidations += 1
+            # Only loads still in flight need these; keep the map bounded. A
+            # load older than a dropped record can no longer be checked per
+            # driver, so it is not cached at all
+            while len(self._invalidated) > self.max_entries:
+                _, trimmed = self._invalidated.popitem(last=False)
+                self._trimmed_generation = max(self._trimmed_generation, trimmed)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._cleared_generation = self._generation
+            self._entries.clear()
+            self._by_user.clear()
+            self._invalidated.clear()
+
+    def _drop(self, driver_id):
+        entry = self._entries.pop(driver_id, None)
+        if entry is not None and self._by_user.get(entry[1].user_id) == driver_id:
+            del self._by_user[entry[1].user_id]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_driver_cache():
+    """Process-wide cache (REST and gRPC servers)"""
+    global _cache
+    from django.conf import settings
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = DriverCache(
+                max_entries=settings.DRIVER_CACHE_MAX_ENTRIES,
+                ttl=settings.DRIVER_CACHE_TTL_SECONDS
+            )
+    return _cache
+
+
+def invalidate_drivers(*driver_ids):
+    """Drop drivers from this process's cache after a write"""
+    if _cache is not None:
+        _cache.invalidate(*driver_ids)
+
+
+def cached_driver(driver_id):
+    """Driver by id through the cache; raises Driver.DoesNotExist"""
+    from .models import Driver
+
+    cache = get_driver_cache()
+    driver = cache.get(driver_id)
+    if driver is None:
+        generation = cache.generation()
+        driver = Driver.objects.get(id=driver_id)
+        cache.put(driver, generation)
+    return driver
+
+
+def cached_driver_by_user(user_id):
+    """Driver by user id through the cache; raises Driver.DoesNotExist"""
+    from .models import Driver
+
+    cache = get_driver_cache()
+    driver = cache.get_by_user(user_id)
+    if driver is None:
+        generation = cache.generation()
+        driver = Driver.objects.get(user_id=user_id)
+        cache.put(driver, generation)
+    return driver
+
+
+def cached_drivers(driver_ids):
+    """{id: driver} for the ids that exist; misses are loaded with one query"""
+    from .models import Driver
+
+    cache = get_driver_cache()
+    found = {}
+    missing = []
+    for driver_id in driver_ids:
+        driver = cache.get(driver_id)
+        if driver is None:
+            missing.append(driver_id)
+        else:
+            found[driver_id] = driver
+    if missing:
+        generation = cache.generation()
+        for driver_id, driver in Driver.objects.in_bulk(missing).items():
+            cache.put(driver, generation)
+            found[driver_id] = driver
+    return found
@@ -10,17 +10,134 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'driver_service.settings')
 django.setup()
 
 from drivers.models import Driver
+from drivers.route_annotations import set_annotated_route, get_station
+from drivers.route_edits import (
+    edit_driver_route, RouteEditError, RouteEditConflict,
+    INSERT, REMOVE, REPLACE_HEAD, SET_MATCHED_STATION
+)
+from drivers.spatial_index import get_driver_index
+from drivers.driver_cache import cached_driver, cached_drivers
+from drivers.route_eta import estimate_arrival
+from drivers.location_ingest import LocationIngestBuffer
+from django.conf import settings
 import grpc
+import time
 from concurrent import futures
 
 # Import generated proto files
 from proto_generated import driver_pb2, driver_pb2_grpc
 
 
+# DriverResponse fields a read_mask may select; success/message are always set
+MASKABLE_FIELDS = tuple(
+    name for name in driver_pb2.DriverResponse.DESCRIPTOR.fields_by_name
+    if name not in ('success', 'message', 'conflict')
+)
+# RouteEdit.Op -> drivers.route_edits op
+EDIT_OPS = {
+    driver_pb2.RouteEdit.INSERT: INSERT,
+    driver_pb2.RouteEdit.REMOVE: REMOVE,
+    driver_pb2.RouteEdit.REPLACE_HEAD: REPLACE_HEAD,
+    driver_pb2.RouteEdit.SET_MATCHED_STATION: SET_MATCHED_STATION,
+}
+# Columns only needed to build route_queue
+ROUTE_COLUMNS = ('route_blob', 'route_cumdist', 'route_queue_json')
+
+
+def _mask_paths(read_mask):
+    """Set of DriverResponse fields to fill in; an empty mask means all of them"""
+    paths = set(read_mask.paths)
+    if not paths:
+        return set(MASKABLE_FIELDS)
+    unknown = paths.difference(MASKABLE_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown read_mask path(s): {', '.join(sorted(unknown))}")
+    return paths
+
+
+def _drivers_for(mask):
+    """Driver queryset that skips loading the route unless the mask asks for it"""
+    if 'route_queue' in mask:
+        return Driver.objects.all()
+    return Driver.objects.defer(*ROUTE_COLUMNS)
+
+
+def _driver_response(driver, message, mask):
+    """Build a DriverResponse with only the fields selected by the mask"""
+    response = driver_pb2.DriverResponse(success=True, message=message)
+    if 'driver_id' in mask:
+        response.driver_id = driver.id
+    if 'user_id' in mask:
+        response.user_id = driver.user_id
+    if 'current_lat' in mask:
+        response.current_lat = driver.current_lat
+    if 'current_lng' in mask:
+        response.current_lng = driver.current_lng
+    if 'free_seats' in mask:
+        response.free_seats = driver.free_seats
+    if 'route_queue' in mask:
+        response.route_queue.extend(
+            driver_pb2.Coordinate(latitude=coord['lat'], longitude=coord['lng'])
+            for coord in driver.route_queue
+        )
+    if 'sim_timestamp' in mask:
+        response.sim_timestamp = driver.sim_timestamp
+    if 'matched_station_id' in mask:
+        response.matched_station_id = driver.matched_station_id or 0
+    if 'route_version' in mask:
+        response.route_version = driver.route_version
+    return response
+
+
+def _route_edit(edit):
+    return {
+        'op': EDIT_OPS[edit.op],
+        'index': edit.index,
+        'lat': edit.coordinate.latitude,
+        'lng': edit.coordinate.longitude,
+        'station_id': edit.station_id
+    }
+
+
+def _edit_route(driver_id, edits, expected_version, mask, message):
+    """Run a versioned route edit and build its DriverResponse"""
+    try:
+        driver, attempts = edit_driver_route(
+            driver_id, edits,
+            expected_version=expected_version,
+            max_attempts=settings.ROUTE_EDIT_MAX_ATTEMPTS
+        )
+    except RouteEditConflict as e:
+        print(f"[ROUTE EDIT] Driver {driver_id} - {e}")
+        return driver_pb2.DriverResponse(
+            success=False,
+            conflict=True,
+            driver_id=driver_id,
+            route_version=e.current_version or 0,
+            message=str(e)
+        )
+    if attempts > 1:
+        print(f"[ROUTE EDIT] Driver {driver_id} - applied after {attempts} attempts")
+    return _driver_response(driver, message, mask)
+
+
+def _nearby_driver(entry):
+    return driver_pb2.NearbyDriver(
+        driver_id=entry['driver_id'],
+        user_id=entry['user_id'],
+        latitude=entry['lat'],
+        longitude=entry['lng'],
+        free_seats=entry['free_seats'],
+        matched_station_id=entry['matched_station_id'] or 0,
+        distance_m=entry.get('distance_m', 0.0)
+    )
+
+
 class DriverServiceServicer(driver_pb2_grpc.DriverServiceServicer):
     
     def CreateDriver(self, request, context):
         try:
+            mask = _mask_paths(request.read_mask)
             # Convert route from proto to JSON-serializable format
             route = []
             for coord in request.route:
@@ -33,7 +150,7 @@ class DriverServiceServicer(driver_pb2_grpc.DriverServiceServicer):
                 user_id=request.user_id,
                 free_seats=request.free_seats
             )
-            driver.route_queue = route
+            set_annotated_route(driver, route)
             
             # Set initial position to first coordinate
             if route:
@@ -42,26 +159,7 @@ class DriverServiceServicer(driver_pb2_grpc.DriverServiceServicer):
             
             driver.save()
             
-            # Convert route back to proto format for response
-            route_coords = []
-            for coord in driver.route_queue:
-                route_coords.append(driver_pb2.Coordinate(
-                    latitude=coord['lat'],
-                    longitude=coord['lng']
-                ))
-            
-            return driver_pb2.DriverResponse(
-                success=True,
-                driver_id=driver.id,
-                user_id=driver.user_id,
-                current_lat=driver.current_lat,
-                current_lng=driver.current_lng,
-                free_seats=driver.free_seats,
-                route_queue=route_coords,
-                sim_timestamp=driver.sim_timestamp,
-                matched_station_id=driver.matched_station_id or 0,
-                message="Driver created successfully"
-            )
+            return _driver_response(driver, "Driver created successfully", mask)
         except Exception as e:
             return driver_pb2.DriverResponse(
                 success=False,
@@ -70,28 +168,10 @@ class DriverServiceServicer(driver_pb2_grpc.DriverServiceServicer):
     
     def GetDriver(self, request, context):
         try:
-            driver = Driver.objects.get(id=request.driver_id)
-            
-            # Convert route to proto format
-            route_coords = []
-            for coord in driver.route_queue:
-                route_coords.append(driver_pb2.Coordinate(
-                    latitude=coord['lat'],
-                    longitude=coord['lng']
-                ))
+            mask = _mask_paths(request.read_mask)
+            driver = cached_driver(request.driver_id)
             
-            return driver_pb2.DriverResponse(
-                success=True,
-                driver_id=driver.id,
-                user_id=driver.user_id,
-                current_lat=driver.current_lat,
-                current_lng=driver.current_lng,
-                free_seats=driver.free_seats,
-                route_queue=route_coords,
-                sim_timestamp=driver.sim_timestamp,
-                matched_station_id=driver.matched_station_id or 0,
-                message="Driver retrieved successfully"
-            )
+            return _driver_response(driver, "Driver retrieved successfully", mask)
         except Driver.DoesNotExist:
             return driver_pb2.DriverResponse(
                 success=False,
@@ -103,32 +183,138 @@ class DriverServiceServicer(driver_pb2_grpc.DriverServiceServicer):
                 message=str(e)
             )
     
-    def UpdateDriverLocation(self, request, context):
+    def GetDrivers(self, request, context):
+        """Batch read: every requested driver in one query and one response"""
         try:
-            driver = Driver.objects.get(id=request.driver_id)
-            driver.current_lat = request.latitude
-            driver.current_lng = request.longitude
-            driver.save()
+            mask = _mask_paths(request.read_mask)
+            found = cached_drivers(list(request.driver_ids))
             
-            route_coords = []
-            for coord in driver.route_queue:
-                route_coords.append(driver_pb2.Coordinate(
-                    latitude=coord['lat'],
-                    longitude=coord['lng']
-                ))
+            drivers = []
+            missing = []
+            for driver_id in request.driver_ids:
+                driver = found.get(driver_id)
+                if driver is None:
+                    missing.append(driver_id)
+                else:
+                    drivers.append(_driver_response(driver, "", mask))
             
-            return driver_pb2.DriverResponse(
+            return driver_pb2.GetDriversResponse(
+                success=True,
+                drivers=drivers,
+                missing_driver_ids=missing,
+                message=f"Retrieved {len(drivers)} driver(s)"
+            )
+        except Exception as e:
+            return driver_pb2.GetDriversResponse(
+                success=False,
+                message=str(e)
+            )
+    
+    def FindNearestDrivers(self, request, context):
+        """k nearest available drivers to a point or a station"""
+        try:
+            started = time.perf_counter()
+            if request.station_id:
+                station = get_station(request.station_id)
+                if station is None:
+                    return driver_pb2.NearbyDriversResponse(success=False, message="Station not found")
+                lat, lng = station['lat'], station['lng']
+            else:
+                lat, lng = request.latitude, request.longitude
+            
+            drivers = get_driver_index().nearest(
+                lat, lng,
+                k=request.k or 5,
+                min_free_seats=request.min_free_seats or 1,
+                include_matched=request.include_matched,
+                max_meters=request.max_distance_m or None
+            )
+            return driver_pb2.NearbyDriversResponse(
+                success=True,
+                drivers=[_nearby_driver(driver) for driver in drivers],
+                query_ms=(time.perf_counter() - started) * 1000.0,
+                message=f"Found {len(drivers)} driver(s)"
+            )
+        except Exception as e:
+            return driver_pb2.NearbyDriversResponse(success=False, message=str(e))
+    
+    def EstimateArrivals(self, request, context):
+        """
+        Rank drivers by when they reach a station (or point) along their
+        current routes, soonest first. Distances come from the route prefix
+        sums stored with each driver. uncached reads the drivers from the
+        database, for callers acting on the result right away.
+        """
+        try:
+            if request.station_id:
+                station = get_station(request.station_id)
+                if station is None:
+                    return driver_pb2.ArrivalsResponse(success=False, message="Station not found")
+                lat, lng = station['lat'], station['lng']
+            else:
+                lat, lng = request.latitude, request.longitude
+            
+            driver_ids = list(request.driver_ids)
+            if not driver_ids:
+                driver_ids = [entry['driver_id'] for entry in get_driver_index().nearest(lat, lng, k=request.k or 10)]
+            if request.uncached:
+                found = {driver.id: driver for driver in Driver.objects.filter(id__in=driver_ids)}
+            else:
+                found = cached_drivers(driver_ids)
+            
+            arrivals = []
+            unreachable = []
+            missing = []
+            for driver_id in driver_ids:
+                driver = found.get(driver_id)
+                if driver is None:
+                    missing.append(driver_id)
+                    continue
+                arrival = estimate_arrival(driver, station_id=request.station_id or None, lat=lat, lng=lng)
+                if arrival is None:
+                    unreachable.append(driver_id)
+                else:
+                    arrivals.append(driver_pb2.DriverArrival(driver_id=driver_id, **arrival))
+            arrivals.sort(key=lambda a: (a.arrival_ticks, a.route_meters + a.off_route_meters))
+            
+            return driver_pb2.ArrivalsResponse(
+                success=True,
+                arrivals=arrivals,
+                unreachable_driver_ids=unreachable,
+                missing_driver_ids=missing,
+                message=f"Ranked {len(arrivals)} driver(s)"
+            )
+        except Exception as e:
+            return driver_pb2.ArrivalsResponse(success=False, message=str(e))
+    
+    def FindDriversInBounds(self, request, context):
+        """Simulating drivers inside a lat/lng box (map viewport)"""
+        try:
+            started = time.perf_counter()
+            drivers = get_driver_index().within_bounds(
+                request.min_lat, request.min_lng, request.max_lat, request.max_lng,
+                limit=request.limit or 1000,
+                available_only=request.available_only,
+                min_free_seats=request.min_free_seats or 1
+            )
+            return driver_pb2.NearbyDriversResponse(
                 success=True,
-                driver_id=driver.id,
-                user_id=driver.user_id,
-                current_lat=driver.current_lat,
-                current_lng=driver.current_lng,
-                free_seats=driver.free_seats,
-                route_queue=route_coords,
-                sim_timestamp=driver.sim_timestamp,
-                matched_station_id=driver.matched_station_id or 0,
-                message="Location updated successfully"
+                drivers=[_nearby_driver(driver) for driver in drivers],
+                query_ms=(time.perf_counter() - started) * 1000.0,
+                message=f"Found {len(drivers)} driver(s)"
             )
+        except Exception as e:
+            return driver_pb2.NearbyDriversResponse(success=False, message=str(e))
+    
+    def UpdateDriverLocation(self, request, context):
+        try:
+            mask = _mask_paths(request.read_mask)
+            driver = _drivers_for(mask).get(id=request.driver_id)
+            driver.current_lat = request.latitude
+            driver.current_lng = request.longitude
+            driver.save(update_fields=['current_lat', 'current_lng', 'updated_at'])
+            
+            return _driver_response(driver, "Location updated successfully", mask)
         except Driver.DoesNotExist:
             return driver_pb2.DriverResponse(
                 success=False,
@@ -140,51 +326,96 @@ class DriverServiceServicer(driver_pb2_grpc.DriverServiceServicer):
                 message=str(e)
             )
     
+    def StreamDriverLocations(self, request_iterator, context):
+        """
+        Client-streaming GPS ingest: pings are coalesced per driver and applied
+        in batched writes; the caller gets one lightweight ack when the stream ends.
+        """
+        ingest = LocationIngestBuffer(
+            batch_size=settings.LOCATION_INGEST_BATCH_SIZE,
+            flush_interval=settings.LOCATION_INGEST_FLUSH_MS / 1000.0
+        )
+        try:
+            for ping in request_iterator:
+                ingest.add(ping.driver_id, ping.latitude, ping.longitude, ping.timestamp_ms)
+            ingest.flush()
+            success, message = True, "Locations ingested"
+        except Exception as e:
+            success, message = False, str(e)
+        
+        print(f"[LOCATION INGEST] {ingest.received} ping(s) -> {ingest.applied} write(s) in "
+              f"{ingest.batches} batch(es), {ingest.coalesced} coalesced, {ingest.stale} stale, "
+              f"{len(ingest.unknown_driver_ids)} unknown driver(s)", flush=True)
+        
+        return driver_pb2.LocationIngestAck(
+            success=success,
+            received=ingest.received,
+            applied=ingest.applied,
+            coalesced=ingest.coalesced,
+            stale=ingest.stale,
+            batches=ingest.batches,
+            unknown_driver_ids=sorted(ingest.unknown_driver_ids),
+            message=message
+        )
+    
     def UpdateDriverRoute(self, request, context):
         """
         CRITICAL: This is called by Matching Service to update driver route
         when a match is found. Push the station to the FRONT of the queue.
+        Runs as a versioned edit (see EditDriverRoute), retried on conflict.
         """
         try:
-            driver = Driver.objects.get(id=request.driver_id)
-            
-            if request.action == "PUSH_FRONT":
-                # Push station coordinate to front of queue
-                station_coord = {
-                    'lat': request.station_lat,
-                    'lng': request.station_lng
-                }
-                driver.push_front_route(station_coord)
-                driver.matched_station_id = request.station_id
-                driver.wait_counter = 0  # Reset wait counter
-                driver.save()
-                
-                print(f"[ROUTE UPDATE] Driver {driver.id} - Pushed station {request.station_id} to front")
-            
-            route_coords = []
-            for coord in driver.route_queue:
-                route_coords.append(driver_pb2.Coordinate(
-                    latitude=coord['lat'],
-                    longitude=coord['lng']
-                ))
+            mask = _mask_paths(request.read_mask)
+            if request.action != "PUSH_FRONT":
+                driver = _drivers_for(mask).get(id=request.driver_id)
+                return _driver_response(driver, "Route updated successfully", mask)
             
+            edits = [
+                {'op': INSERT, 'index': 0, 'lat': request.station_lat, 'lng': request.station_lng},
+                {'op': SET_MATCHED_STATION, 'station_id': request.station_id}
+            ]
+            response = _edit_route(request.driver_id, edits, None, mask, "Route updated successfully")
+            if response.success:
+                print(f"[ROUTE UPDATE] Driver {request.driver_id} - Pushed station {request.station_id} to front")
+            return response
+        except Driver.DoesNotExist:
             return driver_pb2.DriverResponse(
-                success=True,
-                driver_id=driver.id,
-                user_id=driver.user_id,
-                current_lat=driver.current_lat,
-                current_lng=driver.current_lng,
-                free_seats=driver.free_seats,
-                route_queue=route_coords,
-                sim_timestamp=driver.sim_timestamp,
-                matched_station_id=driver.matched_station_id or 0,
-                message="Route updated successfully"
+                success=False,
+                message="Driver not found"
+            )
+        except Exception as e:
+            return driver_pb2.DriverResponse(
+                success=False,
+                message=str(e)
             )
+    
+    def EditDriverRoute(self, request, context):
+        """
+        Apply a list of route edits atomically. The write is a compare-and-swap
+        on route_version, so it never overwrites a concurrent simulator move or
+        another edit: with expected_route_version a stale version fails with
+        conflict=True, without one the edits are re-applied to the latest route.
+        """
+        try:
+            mask = _mask_paths(request.read_mask)
+            edits = [_route_edit(edit) for edit in request.edits]
+            if not edits:
+                return driver_pb2.DriverResponse(success=False, message="No edits given")
+            expected_version = (
+                request.expected_route_version
+                if request.HasField('expected_route_version') else None
+            )
+            return _edit_route(request.driver_id, edits, expected_version, mask, "Route edited successfully")
         except Driver.DoesNotExist:
             return driver_pb2.DriverResponse(
                 success=False,
                 message="Driver not found"
             )
+        except RouteEditError as e:
+            return driver_pb2.DriverResponse(
+                success=False,
+                message=str(e)
+            )
         except Exception as e:
             return driver_pb2.DriverResponse(
                 success=False,
@@ -195,7 +426,7 @@ class DriverServiceServicer(driver_pb2_grpc.DriverServiceServicer):
         try:
             driver = Driver.objects.get(id=request.driver_id)
             driver.is_simulating = True
-            driver.save()
+            driver.save(update_fields=['is_simulating', 'updated_at'])
             
             return driver_pb2.SimulationResponse(
                 success=True,
@@ -216,7 +447,7 @@ class DriverServiceServicer(driver_pb2_grpc.DriverServiceServicer):
         try:
             driver = Driver.objects.get(id=request.driver_id)
             driver.is_simulating = False
-            driver.save()
+            driver.save(update_fields=['is_simulating', 'updated_at'])
             
             return driver_pb2.SimulationResponse(
                 success=True,
@@ -235,7 +466,8 @@ class DriverServiceServicer(driver_pb2_grpc.DriverServiceServicer):
 
 
 def serve():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    # Each open StreamDriverLocations stream holds one worker thread
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=settings.GRPC_MAX_WORKERS))
     driver_pb2_grpc.add_DriverServiceServicer_to_server(DriverServiceServicer(), server)
     server.add_insecure_port('[::]:50054')
     print("Driver gRPC server starting on port 50054...")
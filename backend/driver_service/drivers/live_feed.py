@@ -0,0 +1,214 @@
+"""
+Live driver position feed.
+
+The simulator publishes one diff per tick to a RabbitMQ fanout exchange:
+
+    {"type": "tick", "tick": 42, "worker": "...", "drivers": [...], "removed": [ids]}
+
+Each driver service process runs one LiveFeedHub that consumes the exchange
+through an exclusive queue, keeps the latest state of every driver in memory
+and fans each diff out to its subscribers (Server-Sent Events connections).
+A subscriber can be filtered by driver ids and/or a lat/lng bounding box, so
+an extra viewer costs fan-out work only, never a database query.
+
+The state is seeded from the database once, when the first viewer subscribes,
+so a fresh process shows every simulating driver rather than only the ones
+that moved since it started.
+"""
+
+import json
+import queue
+import threading
+import time
+
+import pika
+
+
+def driver_state(driver):
+    """The per-driver payload published in tick diffs"""
+    return {
+        'id': driver.id,
+        'user_id': driver.user_id,
+        'current_lat': driver.current_lat,
+        'current_lng': driver.current_lng,
+        'free_seats': driver.free_seats,
+        'matched_station_id': driver.matched_station_id,
+        'wait_counter': driver.wait_counter,
+        'sim_timestamp': driver.sim_timestamp,
+        'route_length': driver.route_length,
+        'is_simulating': driver.is_simulating
+    }
+
+
+class Subscription:
+
+    def __init__(self, driver_ids=None, bbox=None, buffer_size=64):
+        self.driver_ids = set(driver_ids) if driver_ids else None
+        self.bbox = bbox    # (min_lat, min_lng, max_lat, max_lng)
+        self.events = queue.Queue(maxsize=buffer_size)
+        self.visible = set()
+        self.dropped = 0
+
+    def matches(self, driver):
+        if self.driver_ids is not None and driver['id'] not in self.driver_ids:
+            return False
+        if self.bbox is not None:
+            min_lat, min_lng, max_lat, max_lng = self.bbox
+            if not (min_lat <= driver['current_lat'] <= max_lat
+                    and min_lng <= driver['current_lng'] <= max_lng):
+                return False
+        return True
+
+    def snapshot(self, drivers):
+        """Initial event with every known driver that passes the filter"""
+        shown = [driver for driver in drivers if self.matches(driver)]
+        self.visible = {driver['id'] for driver in shown}
+        return {'type': 'snapshot', 'drivers': shown, 'removed': []}
+
+    def offer(self, diff):
+        """Filter a tick diff for this subscriber and queue it (oldest dropped when full)"""
+        drivers = []
+        removed = [driver_id for driver_id in diff['removed'] if driver_id in self.visible]
+        for driver in diff['drivers']:
+            if self.matches(driver):
+                drivers.append(driver)
+                self.visible.add(driver['id'])
+            elif driver['id'] in self.visible:
+                # Left the bounding box
+                removed.append(driver['id'])
+        self.visible.difference_update(removed)
+        if not drivers and not removed:
+            return
+
+        event = {'type': 'tick', 'tick': diff.get('tick'), 'drivers': drivers, 'removed': removed}
+        while True:
+            try:
+                self.events.put_nowait(event)
+                return
+            except queue.Full:
+                # Slow client: drop the oldest diff rather than block the hub
+                try:
+                    self.events.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+
+class LiveFeedHub:
+
+    def __init__(self, amqp_url, exchange, buffer_size=64, reconnect_delay=5.0, seed=None):
+        self.amqp_url = amqp_url
+        self.exchange = exchange
+        self.buffer_size = buffer_size
+        self.reconnect_delay = reconnect_delay
+        self.seed = seed            # callable returning the current driver states, or None
+
+        self._drivers = {}          # driver id -> latest state
+        self._seeded = seed is None
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+        self.ticks_received = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='live-feed-hub', daemon=True)
+        self._thread.start()
+
+    def subscribe(self, driver_ids=None, bbox=None):
+        """Register a subscriber; returns it together with its snapshot event"""
+        subscription = Subscription(driver_ids, bbox, self.buffer_size)
+        with self._lock:
+            if not self._seeded:
+                self._seed()
+            snapshot = subscription.snapshot(list(self._drivers.values()))
+            self._subscribers.add(subscription)
+        return subscription, snapshot
+
+    def _seed(self):
+        """Load the current state once (caller holds the lock; diffs wait meanwhile)"""
+        try:
+            drivers = self.seed()
+        except Exception as e:
+            print(f"[LIVE FEED] Seeding from the database failed: {e}", flush=True)
+            return
+        for driver in drivers:
+            self._drivers[driver['id']] = driver
+        self._seeded = True
+        print(f"[LIVE FEED] Seeded {len(drivers)} driver(s)", flush=True)
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'drivers': len(self._drivers),
+                'seeded': self._seeded,
+                'ticks_received': self.ticks_received
+            }
+
+    def publish_diff(self, diff):
+        """Apply a tick diff to the in-memory state and fan it out"""
+        with self._lock:
+            for driver in diff['drivers']:
+                self._drivers[driver['id']] = driver
+            for driver_id in diff['removed']:
+                self._drivers.pop(driver_id, None)
+            self.ticks_received += 1
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.offer(diff)
+
+    def _run(self):
+        while True:
+            try:
+                connection = pika.BlockingConnection(pika.URLParameters(self.amqp_url))
+                channel = connection.channel()
+                channel.exchange_declare(exchange=self.exchange, exchange_type='fanout')
+                result = channel.queue_declare(queue='', exclusive=True, auto_delete=True)
+                channel.queue_bind(exchange=self.exchange, queue=result.method.queue)
+                print(f"[LIVE FEED] Consuming {self.exchange}", flush=True)
+
+                def on_message(ch, method, properties, body):
+                    try:
+                        self.publish_diff(json.loads(body))
+                    except Exception as e:
+                        print(f"[LIVE FEED] Bad diff: {e}", flush=True)
+
+                channel.basic_consume(queue=result.method.queue, on_message_callback=on_message, auto_ack=True)
+                channel.start_consuming()
+            except Exception as e:
+                print(f"[LIVE FEED] Connection lost: {e}; reconnecting in {self.reconnect_delay}s", flush=True)
+                time.sleep(self.reconnect_delay)
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def simulating_driver_states():
+    """driver_state() of every simulating driver, read from the database"""
+    from .models import Driver
+
+    drivers = Driver.objects.filter(is_simulating=True).defer('route_queue_json')
+    return [driver_state(driver) for driver in drivers]
+
+
+def get_live_feed_hub():
+    """Process-wide hub, started on first use"""
+    global _hub
+    from django.conf import settings
+
+    with _hub_lock:
+        if _hub is None:
+            _hub = LiveFeedHub(
+                settings.RABBITMQ_URL,
+                settings.LIVE_FEED_EXCHANGE,
+                buffer_size=settings.LIVE_FEED_SUBSCRIBER_BUFFER,
+                seed=simulating_driver_states
+            )
+            _hub.start()
+    return _hub
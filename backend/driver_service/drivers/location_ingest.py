@@ -0,0 +1,84 @@
+"""
+Batched ingest of driver location pings (StreamDriverLocations).
+
+Pings are buffered per driver, keeping only the newest one, and written with
+one bulk UPDATE per batch instead of a load + save per ping. A batch is
+written once batch_size distinct drivers are buffered, when flush_interval has
+passed since the last write (checked as pings arrive), and when the stream
+ends.
+"""
+
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from .driver_cache import invalidate_drivers
+from .models import Driver, NextChangeSeq
+
+
+class LocationIngestBuffer:
+
+    def __init__(self, batch_size=500, flush_interval=1.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._latest = {}        # driver id -> (timestamp_ms, lat, lng), not yet written
+        self._applied_ts = {}    # driver id -> timestamp_ms of the last written ping
+        self._last_flush = time.monotonic()
+
+        self.received = 0
+        self.applied = 0
+        self.coalesced = 0
+        self.stale = 0
+        self.batches = 0
+        self.unknown_driver_ids = set()
+
+    def add(self, driver_id, lat, lng, timestamp_ms):
+        self.received += 1
+        if driver_id in self.unknown_driver_ids:
+            return
+
+        if timestamp_ms < self._applied_ts.get(driver_id, timestamp_ms):
+            self.stale += 1
+            return
+
+        buffered = self._latest.get(driver_id)
+        if buffered is not None:
+            self.coalesced += 1
+            if timestamp_ms < buffered[0]:
+                return
+        self._latest[driver_id] = (timestamp_ms, lat, lng)
+
+        if (len(self._latest) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Write the newest buffered ping of every driver in one bulk UPDATE"""
+        self._last_flush = time.monotonic()
+        if not self._latest:
+            return 0
+
+        latest, self._latest = self._latest, {}
+        existing = set(Driver.objects.filter(id__in=latest).values_list('id', flat=True))
+        self.unknown_driver_ids.update(driver_id for driver_id in latest if driver_id not in existing)
+
+        now = timezone.now()
+        drivers = [
+            Driver(id=driver_id, current_lat=lat, current_lng=lng, updated_at=now, change_seq=NextChangeSeq())
+            for driver_id, (_, lat, lng) in latest.items()
+            if driver_id in existing
+        ]
+        if drivers:
+            with transaction.atomic():
+                Driver.objects.bulk_update(
+                    drivers, ['current_lat', 'current_lng', 'updated_at', 'change_seq'], batch_size=self.batch_size
+                )
+            invalidate_drivers(*(driver.id for driver in drivers))
+        for driver_id in existing:
+            self._applied_ts[driver_id] = latest[driver_id][0]
+
+        self.applied += len(drivers)
+        self.batches += 1
+        return len(drivers)
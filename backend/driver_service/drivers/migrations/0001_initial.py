@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Driver',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField(unique=True)),
+                ('current_lat', models.FloatField(default=0.0)),
+                ('current_lng', models.FloatField(default=0.0)),
+                ('free_seats', models.IntegerField(default=4)),
+                ('route_queue_json', models.TextField(default='[]')),
+                ('sim_timestamp', models.CharField(default='10:00', max_length=10)),
+                ('is_simulating', models.BooleanField(default=False)),
+                ('matched_station_id', models.IntegerField(blank=True, null=True)),
+                ('wait_counter', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user_id'], name='drivers_dri_user_id_bd76ee_idx'), models.Index(fields=['is_simulating'], name='drivers_dri_is_simu_7a1a5a_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drivers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='driver',
+            name='route_blob',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.AddField(
+            model_name='driver',
+            name='route_cumdist',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.AddField(
+            model_name='driver',
+            name='route_head',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='driver',
+            name='route_station_version',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='driver',
+            name='route_version',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='driver',
+            index=models.Index(fields=['updated_at'], name='drivers_dri_updated_062282_idx'),
+        ),
+    ]
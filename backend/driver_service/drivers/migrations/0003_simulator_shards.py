@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drivers', '0002_driver_route_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimulatorLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('partition', models.IntegerField(unique=True)),
+                ('owner', models.CharField(blank=True, default='', max_length=128)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SimulatorShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('worker_id', models.CharField(max_length=128, unique=True)),
+                ('last_heartbeat', models.DateTimeField()),
+                ('partitions', models.CharField(blank=True, default='', max_length=255)),
+                ('last_tick_ms', models.FloatField(default=0.0)),
+                ('drivers_last_tick', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['last_heartbeat'], name='drivers_sim_last_he_65cc40_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:54
+
+from django.db import migrations, models
+
+
+def create_change_sequence(apps, schema_editor):
+    """Sequence drawn by NextChangeSeq (SQLite computes MAX + 1 instead)"""
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE SEQUENCE IF NOT EXISTS drivers_driver_change_seq')
+
+
+def drop_change_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP SEQUENCE IF EXISTS drivers_driver_change_seq')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drivers', '0003_simulator_shards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='driver',
+            name='change_seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='driver',
+            index=models.Index(fields=['change_seq'], name='drivers_dri_change__111df4_idx'),
+        ),
+        migrations.RunPython(create_change_sequence, drop_change_sequence),
+    ]
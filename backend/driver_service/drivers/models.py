@@ -1,6 +1,41 @@
 from django.db import models
+from django.db.models import F, Func
+from django.utils import timezone
 import json
 
+import numpy as np
+
+from .driver_cache import invalidate_drivers
+from .route_queue import cumulative_meters, pack_route, unpack_route, waypoint
+
+# Columns covered by Driver.route_version: writes to them must go through
+# save_route() (compare-and-swap) rather than a plain save()
+ROUTE_GUARDED_FIELDS = (
+    'route_blob', 'route_cumdist', 'route_head', 'route_queue_json', 'route_station_version',
+    'matched_station_id', 'wait_counter'
+)
+
+
+# Postgres sequence behind Driver.change_seq (created by migration 0004)
+CHANGE_SEQUENCE = 'drivers_driver_change_seq'
+
+
+class RouteVersionConflict(Exception):
+    """A route write lost its compare-and-swap: route_version moved since the row was read"""
+
+
+class NextChangeSeq(Func):
+    """
+    Next Driver.change_seq value, drawn by the database while the write runs.
+    Every write to a driver row sets change_seq to this.
+    """
+    template = f"nextval('{CHANGE_SEQUENCE}')"
+    output_field = models.BigIntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # No sequences in SQLite (tests); writes there are serialized anyway
+        return '(SELECT COALESCE(MAX(change_seq), 0) + 1 FROM drivers_driver)', []
+
 
 class Driver(models.Model):
     user_id = models.IntegerField(unique=True)
@@ -8,9 +43,22 @@ class Driver(models.Model):
     current_lng = models.FloatField(default=0.0)
     free_seats = models.IntegerField(default=4)
     
-    # Route queue stored as JSON array of coordinates
-    # Format: [{"lat": 12.34, "lng": 56.78}, ...]
+    # Route queue stored as packed waypoint records plus a cursor to the head
+    # (see drivers/route_queue.py). Externally a route is still a list of
+    # {"lat": 12.34, "lng": 56.78, ...} dicts.
+    route_blob = models.BinaryField(default=b'')
+    # float64 distance along the route to each record, rewritten with route_blob
+    # (see drivers/route_eta.py)
+    route_cumdist = models.BinaryField(default=b'')
+    route_head = models.IntegerField(default=0)
+    # Legacy JSON route, only read for rows written before route_blob existed
     route_queue_json = models.TextField(default='[]')
+    # Each waypoint also carries station_id / near_station_id / near_station_m,
+    # computed against this station catalog version (see drivers/route_annotations.py)
+    route_station_version = models.BigIntegerField(default=0)
+    # Bumped by every route/match write (simulator pops, matching edits) so
+    # concurrent writers can compare-and-swap instead of locking the row
+    route_version = models.BigIntegerField(default=0)
     
     # Simulation state
     sim_timestamp = models.CharField(max_length=10, default='10:00')  # HH:MM format
@@ -22,48 +70,186 @@ class Driver(models.Model):
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Database-assigned and increasing with every write (NextChangeSeq), so
+    # readers can follow changes without trusting writers' clocks (see
+    # drivers/spatial_index.py)
+    change_seq = models.BigIntegerField(default=0)
     
     class Meta:
         indexes = [
             models.Index(fields=['user_id']),
             models.Index(fields=['is_simulating']),
+            models.Index(fields=['updated_at']),
+            models.Index(fields=['change_seq']),
         ]
     
+    def _route_records(self):
+        """Packed route records, parsed once per instance and reused until the blob changes"""
+        cached = self.__dict__.get('_route_cache')
+        if cached is not None and cached[0] is self.route_blob:
+            return cached[1]
+        
+        if not self.route_blob and self.route_queue_json not in ('', '[]'):
+            # Legacy row: convert once, persisted with the next route write
+            try:
+                legacy = json.loads(self.route_queue_json)
+            except:
+                legacy = []
+            self._set_route_records(pack_route(legacy))
+            return self._route_records()
+        
+        records = unpack_route(self.route_blob)
+        self._route_cache = (self.route_blob, records)
+        return records
+    
+    def _set_route_records(self, records):
+        self.route_blob = records.tobytes()
+        self.route_cumdist = cumulative_meters(records).tobytes()
+        self.route_head = 0
+        self.route_queue_json = '[]'
+        self._route_cache = (self.route_blob, records)
+        self._route_blob_dirty = True
+    
+    def dirty_route_fields(self):
+        """
+        Columns to persist after route changes: just the cursor after pops,
+        plus the blob once it has been rewritten (new route, PUSH_FRONT,
+        legacy conversion).
+        """
+        if self.__dict__.get('_route_blob_dirty'):
+            return ('route_blob', 'route_cumdist', 'route_head', 'route_queue_json')
+        return ('route_head',)
+    
+    def route_cumulative(self):
+        """Cumulative route distance per record, aligned with the packed records"""
+        records = self._route_records()
+        cached = self.__dict__.get('_cumdist_cache')
+        if cached is not None and cached[0] is self.route_cumdist:
+            return cached[1]
+        cumulative = np.frombuffer(self.route_cumdist, dtype='<f8') if self.route_cumdist else np.empty(0)
+        if len(cumulative) != len(records):
+            # Row written before route_cumdist existed; persisted with the next route write
+            cumulative = cumulative_meters(records)
+        self._cumdist_cache = (self.route_cumdist, cumulative)
+        return cumulative
+    
     @property
     def route_queue(self):
-        """Get route queue as Python list"""
-        try:
-            return json.loads(self.route_queue_json)
-        except:
-            return []
+        """Get remaining route as Python list"""
+        records = self._route_records()
+        return [waypoint(record) for record in records[self.route_head:]]
     
     @route_queue.setter
     def route_queue(self, value):
         """Set route queue from Python list"""
-        self.route_queue_json = json.dumps(value)
+        self._set_route_records(pack_route(value))
+    
+    @property
+    def route_length(self):
+        """Number of waypoints left in the route"""
+        return max(len(self._route_records()) - self.route_head, 0)
     
     def peek_route(self):
         """Get the first coordinate in route without removing it"""
-        queue = self.route_queue
-        return queue[0] if queue else None
-    
-    def pop_route(self):
-        """Remove and return the first coordinate from route"""
-        queue = self.route_queue
-        if queue:
-            coord = queue.pop(0)
-            self.route_queue = queue
-            self.save()
-            return coord
+        records = self._route_records()
+        if self.route_head < len(records):
+            return waypoint(records[self.route_head])
         return None
     
-    def push_front_route(self, coord):
-        """Add coordinate to the front of the route queue"""
-        queue = self.route_queue
-        queue.insert(0, coord)
-        self.route_queue = queue
-        self.save()
+    def pop_route(self, save=True):
+        """
+        Remove and return the first coordinate from route (advances the head
+        cursor only). Pass save=False to leave persisting to the caller (e.g. a
+        batched flush).
+        """
+        coord = self.peek_route()
+        if coord is not None:
+            self.route_head += 1
+            if save:
+                self._save_route_or_raise()
+        return coord
+    
+    def push_front_route(self, coord, save=True):
+        """
+        Add coordinate to the front of the route queue (rebuilds the blob
+        from the remaining records and resets the head cursor).
+        """
+        records = self._route_records()
+        self._set_route_records(np.concatenate([pack_route([coord]), records[self.route_head:]]))
+        if save:
+            self._save_route_or_raise()
+    
+    def _save_route_or_raise(self):
+        # route_head on its own is only meaningful for the blob it was read
+        # with, so cursor and blob writes are both compare-and-swap: a head
+        # moved for an older blob can never land on a rebuilt one
+        if not self.save_route(*self.dirty_route_fields()):
+            raise RouteVersionConflict(f"Driver {self.id} route changed concurrently")
+    
+    def save_route(self, *fields):
+        """
+        Compare-and-swap write of the given fields: applied only if
+        route_version still holds the value this instance was read with, and
+        bumps it. Returns False (nothing written) when another writer got
+        there first; reload and retry in that case.
+        """
+        now = timezone.now()
+        updated = Driver.objects.filter(id=self.id, route_version=self.route_version).update(
+            route_version=F('route_version') + 1,
+            updated_at=now,
+            change_seq=NextChangeSeq(),
+            **{field: getattr(self, field) for field in fields}
+        )
+        invalidate_drivers(self.id)
+        if not updated:
+            return False
+        self.route_version += 1
+        self.updated_at = now
+        self._route_blob_dirty = False
+        return True
+    
+    def save(self, *args, **kwargs):
+        self.change_seq = NextChangeSeq()
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = list(kwargs['update_fields']) + ['change_seq']
+        super().save(*args, **kwargs)
+        # The database picked the value; it is loaded again if read
+        del self.change_seq
+        invalidate_drivers(self.id)
+    
+    def delete(self, *args, **kwargs):
+        driver_id = self.id
+        result = super().delete(*args, **kwargs)
+        invalidate_drivers(driver_id)
+        return result
     
     def __str__(self):
         return f"Driver {self.user_id} - ({self.current_lat}, {self.current_lng})"
 
+
+
+class SimulatorShard(models.Model):
+    """Heartbeat row for a sharded simulator worker (see drivers/sharding.py)"""
+    worker_id = models.CharField(max_length=128, unique=True)
+    last_heartbeat = models.DateTimeField()
+    partitions = models.CharField(max_length=255, blank=True, default='')  # e.g. "0,4,8"
+    last_tick_ms = models.FloatField(default=0.0)
+    drivers_last_tick = models.IntegerField(default=0)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['last_heartbeat']),
+        ]
+    
+    def __str__(self):
+        return f"Shard {self.worker_id} [{self.partitions}] - {self.last_tick_ms:.1f}ms"
+
+
+class SimulatorLease(models.Model):
+    """Renewable ownership of one driver partition by a simulator worker"""
+    partition = models.IntegerField(unique=True)
+    owner = models.CharField(max_length=128, blank=True, default='')
+    expires_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"Partition {self.partition} -> {self.owner or 'unowned'}"
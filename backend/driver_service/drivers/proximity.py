@@ -0,0 +1,212 @@
+"""
+In-process station proximity engine for the simulator.
+
+Station coordinates are kept in contiguous NumPy arrays and bucketed into a
+uniform lat/lng grid. A proximity query takes the positions of every driver
+that moved in a tick, gathers candidate stations from the 3x3 neighbourhood
+of each driver's cell and runs one vectorized haversine over all candidate
+pairs, so the cost no longer scales with drivers x stations RPCs.
+"""
+
+import math
+import time
+
+import numpy as np
+
+EARTH_RADIUS_METERS = 6371008.8
+METERS_PER_DEGREE = 111320.0
+
+# Cell keys pack (row, col) into one int64 so stations can be sorted by cell
+CELL_KEY_STRIDE = 1 << 32
+
+
+def haversine_meters(lat1, lng1, lat2, lng2):
+    """Vectorized great-circle distance in meters (inputs in degrees)"""
+    lat1 = np.radians(lat1)
+    lat2 = np.radians(lat2)
+    dlat = lat2 - lat1
+    dlng = np.radians(lng2) - np.radians(lng1)
+    a = np.sin(dlat / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class StationProximityEngine:
+    """
+    Grid-indexed station lookup used by SimulationWorker.
+
+    `nearest_within` answers "nearest station within threshold_meters" for a
+    whole batch of positions in one call. `match_waypoint` replaces the old
+    linear `is_coordinate_a_station` scan with a grid lookup using the same
+    lat/lng box tolerance.
+    """
+
+    def __init__(self, threshold_meters=100.0, waypoint_tolerance_deg=0.0005):
+        self.threshold_meters = threshold_meters
+        self.waypoint_tolerance_deg = waypoint_tolerance_deg
+
+        self.stations = []
+        self.ids = np.empty(0, dtype=np.int64)
+        self.lats = np.empty(0, dtype=np.float64)
+        self.lngs = np.empty(0, dtype=np.float64)
+
+        self.cell_lat_deg = 1.0
+        self.cell_lng_deg = 1.0
+        self._cell_keys = np.empty(0, dtype=np.int64)    # sorted unique cell keys
+        self._cell_starts = np.empty(0, dtype=np.int64)  # offsets into _order
+        self._cell_ends = np.empty(0, dtype=np.int64)
+        self._order = np.empty(0, dtype=np.int64)        # station indices grouped by cell
+
+        self.last_timings = {}
+        self.total_queries = 0
+        self.total_points = 0
+
+    def __len__(self):
+        return len(self.stations)
+
+    def load(self, stations):
+        """(Re)build the arrays and grid from a list of station dicts"""
+        started = time.perf_counter()
+
+        self.stations = list(stations)
+        self.ids = np.array([s['id'] for s in self.stations], dtype=np.int64)
+        self.lats = np.array([s['lat'] for s in self.stations], dtype=np.float64)
+        self.lngs = np.array([s['lng'] for s in self.stations], dtype=np.float64)
+
+        # Size cells so that anything within the threshold (or the waypoint box)
+        # of a point always lies in the point's 3x3 cell neighbourhood.
+        self.cell_lat_deg = max(self.threshold_meters / METERS_PER_DEGREE,
+                                self.waypoint_tolerance_deg)
+        max_abs_lat = float(np.abs(self.lats).max()) if len(self.lats) else 0.0
+        ref_lat = min(max_abs_lat + self.cell_lat_deg, 89.0)
+        self.cell_lng_deg = max(
+            self.threshold_meters / (METERS_PER_DEGREE * math.cos(math.radians(ref_lat))),
+            self.waypoint_tolerance_deg
+        )
+
+        # Register every station in its own cell and the 8 surrounding ones, so
+        # a query only has to look up the single cell each point falls in.
+        rows, cols = self._cells(self.lats, self.lngs)
+        keys = []
+        for drow in (-1, 0, 1):
+            for dcol in (-1, 0, 1):
+                keys.append(self._cell_key(rows + drow, cols + dcol))
+        keys = np.concatenate(keys) if keys else np.empty(0, dtype=np.int64)
+        station_idx = np.tile(np.arange(len(self.stations), dtype=np.int64), 9)
+
+        order = np.argsort(keys, kind='stable')
+        self._order = station_idx[order]
+        self._cell_keys, self._cell_starts, counts = np.unique(
+            keys[order], return_index=True, return_counts=True
+        )
+        self._cell_ends = self._cell_starts + counts
+
+        self.last_timings['load_ms'] = (time.perf_counter() - started) * 1000.0
+
+    def _cells(self, lats, lngs):
+        rows = np.floor(np.asarray(lats, dtype=np.float64) / self.cell_lat_deg).astype(np.int64)
+        cols = np.floor(np.asarray(lngs, dtype=np.float64) / self.cell_lng_deg).astype(np.int64)
+        return rows, cols
+
+    @staticmethod
+    def _cell_key(rows, cols):
+        return rows * CELL_KEY_STRIDE + cols
+
+    def _candidate_pairs(self, lats, lngs):
+        """
+        Return (point_idx, station_idx) arrays for every station registered
+        in the cell of each point, i.e. every station in its 3x3 neighbourhood.
+        """
+        empty = np.empty(0, dtype=np.int64)
+        if not len(self._cell_keys):
+            return empty, empty
+
+        keys = self._cell_key(*self._cells(lats, lngs))
+        pos = np.searchsorted(self._cell_keys, keys)
+        pos = np.minimum(pos, len(self._cell_keys) - 1)
+        hit = self._cell_keys[pos] == keys
+        if not hit.any():
+            return empty, empty
+
+        points = np.nonzero(hit)[0]
+        starts = self._cell_starts[pos[hit]]
+        counts = self._cell_ends[pos[hit]] - starts
+
+        # Expand each (point, cell) hit into one pair per station in the cell
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return np.repeat(points, counts), self._order[np.repeat(starts, counts) + offsets]
+
+    def nearest_within(self, lats, lngs):
+        """
+        For each position return the index of the nearest station within
+        threshold_meters (-1 when none) and its distance (inf when none).
+        """
+        started = time.perf_counter()
+
+        lats = np.asarray(lats, dtype=np.float64)
+        lngs = np.asarray(lngs, dtype=np.float64)
+        nearest = np.full(len(lats), -1, dtype=np.int64)
+        distances = np.full(len(lats), np.inf)
+
+        if len(lats) and len(self.stations):
+            point_idx, station_idx = self._candidate_pairs(lats, lngs)
+            if len(point_idx):
+                pair_dist = haversine_meters(
+                    lats[point_idx], lngs[point_idx],
+                    self.lats[station_idx], self.lngs[station_idx]
+                )
+                within = pair_dist <= self.threshold_meters
+                point_idx = point_idx[within]
+                station_idx = station_idx[within]
+                pair_dist = pair_dist[within]
+
+                # Sort by (point, distance) and keep the first pair of each point
+                order = np.lexsort((pair_dist, point_idx))
+                point_idx = point_idx[order]
+                first = np.ones(len(point_idx), dtype=bool)
+                first[1:] = point_idx[1:] != point_idx[:-1]
+                nearest[point_idx[first]] = station_idx[order][first]
+                distances[point_idx[first]] = pair_dist[order][first]
+
+        self.total_queries += 1
+        self.total_points += len(lats)
+        self.last_timings['query_ms'] = (time.perf_counter() - started) * 1000.0
+        self.last_timings['query_points'] = len(lats)
+        return nearest, distances
+
+    def match_waypoints(self, lats, lngs):
+        """
+        For each coordinate return the index of the station whose lat/lng box
+        contains it (-1 when none). The closest box match wins when stations
+        are packed tightly.
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lngs = np.asarray(lngs, dtype=np.float64)
+        matched = np.full(len(lats), -1, dtype=np.int64)
+        if not len(lats) or not self.stations:
+            return matched
+
+        point_idx, station_idx = self._candidate_pairs(lats, lngs)
+        if not len(point_idx):
+            return matched
+
+        lat_diff = np.abs(self.lats[station_idx] - lats[point_idx])
+        lng_diff = np.abs(self.lngs[station_idx] - lngs[point_idx])
+        inside = (lat_diff < self.waypoint_tolerance_deg) & (lng_diff < self.waypoint_tolerance_deg)
+        point_idx = point_idx[inside]
+        station_idx = station_idx[inside]
+        box_dist = lat_diff[inside] ** 2 + lng_diff[inside] ** 2
+
+        order = np.lexsort((box_dist, point_idx))
+        point_idx = point_idx[order]
+        first = np.ones(len(point_idx), dtype=bool)
+        first[1:] = point_idx[1:] != point_idx[:-1]
+        matched[point_idx[first]] = station_idx[order][first]
+        return matched
+
+    def match_waypoint(self, coord):
+        """Return the station whose lat/lng box contains the coordinate, or None"""
+        index = self.match_waypoints([coord['lat']], [coord['lng']])[0]
+        return self.stations[index] if index >= 0 else None
+
+    def station(self, index):
+        return self.stations[index]
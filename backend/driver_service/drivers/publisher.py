@@ -0,0 +1,271 @@
+"""
+Long-lived RabbitMQ publisher for the simulator.
+
+A single pika SelectConnection runs on a background thread and is reused for
+every publish. Messages produced during a tick are buffered and handed to the
+I/O thread in one flush. Publisher confirms arrive asynchronously on that
+thread; nacked messages and messages left unconfirmed when the connection drops
+are republished after reconnecting (at-least-once delivery).
+
+Besides the durable work queue, fanout exchanges (e.g. the live driver feed)
+can be declared up front and published to with publish(..., exchange=name).
+
+Messages published with transient=True (the live feed's tick diffs, which
+are stale by the next tick) are sent non-persistent and at most once: they
+are never republished, and any still waiting when the connection drops are
+discarded. The queue of messages waiting for a channel holds at most
+max_pending; past that the oldest are dropped (counted in 'dropped'), so an
+outage can't grow it without bound.
+"""
+
+import collections
+import json
+import threading
+import time
+
+import pika
+
+
+class RabbitMQPublisher:
+
+    def __init__(self, amqp_url, queue='matching_queue', reconnect_delay=5.0, fanout_exchanges=(),
+                 max_pending=10000):
+        self.amqp_url = amqp_url
+        self.queue = queue
+        self.fanout_exchanges = list(fanout_exchanges)
+        self.reconnect_delay = reconnect_delay
+        self.max_pending = max_pending
+
+        self._buffer = []                       # this tick's messages (caller thread)
+        self._pending = collections.deque()     # (exchange, routing_key, body, transient) waiting for a channel
+        self._unconfirmed = {}                  # delivery_tag -> (message, sent_at), written on the I/O thread
+        self._lock = threading.Lock()           # guards _pending, _unconfirmed and counters
+
+        self._connection = None
+        self._channel = None
+        self._ready = False
+        self._stopping = False
+        self._delivery_tag = 0
+        self._thread = None
+        self._started_at = time.monotonic()
+
+        self.counters = {
+            'published': 0,
+            'confirmed': 0,
+            'nacked': 0,
+            'republished': 0,
+            'dropped': 0,
+            'flushes': 0,
+            'reconnects': 0,
+            'confirm_latency_ms_total': 0.0,
+            'confirm_latency_ms_max': 0.0
+        }
+
+    # ---- caller side -------------------------------------------------------
+
+    def start(self):
+        self._started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name='rabbitmq-publisher', daemon=True)
+        self._thread.start()
+
+    def publish(self, message, routing_key=None, exchange='', transient=False):
+        """
+        Buffer a message for the current tick; nothing is sent until flush().
+        transient: send non-persistent and at most once (see the module docstring).
+        """
+        routing_key = self.queue if routing_key is None else routing_key
+        self._buffer.append((exchange, routing_key, json.dumps(message), transient))
+
+    def flush(self):
+        """Hand every buffered message to the I/O thread in one batch"""
+        if not self._buffer:
+            return 0
+
+        batch, self._buffer = self._buffer, []
+        with self._lock:
+            self._pending.extend(batch)
+            self._trim_pending()
+            self.counters['flushes'] += 1
+
+        self._schedule(self._drain)
+        return len(batch)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['pending'] = len(self._pending)
+            stats['unconfirmed'] = len(self._unconfirmed)
+        confirmed = stats['confirmed']
+        stats['confirm_latency_ms_avg'] = (
+            stats['confirm_latency_ms_total'] / confirmed if confirmed else 0.0
+        )
+        uptime = max(time.monotonic() - self._started_at, 1e-9)
+        stats['published_per_sec'] = stats['published'] / uptime
+        stats['confirmed_per_sec'] = confirmed / uptime
+        return stats
+
+    def stop(self):
+        self._stopping = True
+        self._schedule(self._close)
+        if self._thread:
+            self._thread.join(timeout=self.reconnect_delay)
+
+    def _trim_pending(self):
+        """Drop the oldest waiting messages beyond max_pending. Call with _lock held."""
+        overflow = len(self._pending) - self.max_pending
+        if overflow <= 0:
+            return
+        for _ in range(overflow):
+            self._pending.popleft()
+        self.counters['dropped'] += overflow
+        print(f"[PUBLISHER] Pending queue full ({self.max_pending}): dropped the {overflow} oldest "
+              f"message(s), {self.counters['dropped']} in total", flush=True)
+
+    def _schedule(self, callback):
+        connection = self._connection
+        if connection is None:
+            return
+        try:
+            connection.ioloop.add_callback_threadsafe(callback)
+        except Exception:
+            # Connection is being torn down; pending messages go out after reconnect
+            pass
+
+    # ---- I/O thread --------------------------------------------------------
+
+    def _run(self):
+        while not self._stopping:
+            self._connection = pika.SelectConnection(
+                pika.URLParameters(self.amqp_url),
+                on_open_callback=self._on_connection_open,
+                on_open_error_callback=self._on_connection_open_error,
+                on_close_callback=self._on_connection_closed
+            )
+            self._connection.ioloop.start()
+
+            if not self._stopping:
+                with self._lock:
+                    self.counters['reconnects'] += 1
+                print(f"[PUBLISHER] Reconnecting in {self.reconnect_delay}s...", flush=True)
+                time.sleep(self.reconnect_delay)
+
+    def _on_connection_open(self, connection):
+        print("[PUBLISHER] RabbitMQ connection established", flush=True)
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_connection_open_error(self, connection, error):
+        print(f"[PUBLISHER] RabbitMQ connection failed: {error}", flush=True)
+        connection.ioloop.stop()
+
+    def _on_connection_closed(self, connection, reason):
+        self._ready = False
+        self._channel = None
+
+        # Anything not yet confirmed may be lost; publish it again on reconnect.
+        # Transient messages still waiting will be stale by then: drop them.
+        with self._lock:
+            unconfirmed = [message for message, _ in self._unconfirmed.values()]
+            self._unconfirmed.clear()
+            waiting = len(self._pending)
+            self._pending = collections.deque(message for message in self._pending if not message[3])
+            self.counters['dropped'] += waiting - len(self._pending)
+            self._pending.extendleft(reversed(unconfirmed))
+            self.counters['republished'] += len(unconfirmed)
+            self._trim_pending()
+
+        if not self._stopping:
+            print(f"[PUBLISHER] RabbitMQ connection closed: {reason}", flush=True)
+        connection.ioloop.stop()
+
+    def _on_channel_open(self, channel):
+        self._channel = channel
+        channel.queue_declare(queue=self.queue, durable=True, callback=self._on_queue_declared)
+
+    def _on_queue_declared(self, frame):
+        self._declare_exchanges(list(self.fanout_exchanges))
+
+    def _declare_exchanges(self, remaining):
+        if not remaining:
+            self._on_exchanges_declared()
+            return
+        exchange = remaining.pop(0)
+        self._channel.exchange_declare(
+            exchange=exchange, exchange_type='fanout',
+            callback=lambda frame: self._declare_exchanges(remaining)
+        )
+
+    def _on_exchanges_declared(self):
+        self._delivery_tag = 0
+        self._channel.confirm_delivery(ack_nack_callback=self._on_delivery_confirmation)
+        self._ready = True
+        self._drain()
+
+    def _drain(self):
+        if not self._ready:
+            return
+
+        while True:
+            with self._lock:
+                if not self._pending:
+                    return
+                message = self._pending.popleft()
+
+            exchange, routing_key, body, transient = message
+            try:
+                self._channel.basic_publish(
+                    exchange=exchange,
+                    routing_key=routing_key,
+                    body=body,
+                    properties=pika.BasicProperties(
+                        delivery_mode=1 if transient else 2,  # 2: persistent
+                    )
+                )
+            except Exception as e:
+                print(f"[PUBLISHER] Publish failed: {e}", flush=True)
+                with self._lock:
+                    if transient:
+                        self.counters['dropped'] += 1
+                    else:
+                        self._pending.appendleft(message)
+                return
+
+            # Every publish on the channel takes a delivery tag, but only
+            # durable messages wait for their confirm
+            self._delivery_tag += 1
+            with self._lock:
+                if not transient:
+                    self._unconfirmed[self._delivery_tag] = (message, time.perf_counter())
+                self.counters['published'] += 1
+
+    def _on_delivery_confirmation(self, frame):
+        method = frame.method
+        acked = isinstance(method, pika.spec.Basic.Ack)
+
+        now = time.perf_counter()
+        with self._lock:
+            if method.multiple:
+                tags = [tag for tag in self._unconfirmed if tag <= method.delivery_tag]
+            else:
+                tags = [method.delivery_tag] if method.delivery_tag in self._unconfirmed else []
+            for tag in tags:
+                message, sent_at = self._unconfirmed.pop(tag)
+                if acked:
+                    latency_ms = (now - sent_at) * 1000.0
+                    self.counters['confirmed'] += 1
+                    self.counters['confirm_latency_ms_total'] += latency_ms
+                    self.counters['confirm_latency_ms_max'] = max(
+                        self.counters['confirm_latency_ms_max'], latency_ms
+                    )
+                else:
+                    self.counters['nacked'] += 1
+                    self._pending.append(message)
+            self._trim_pending()
+
+        if not acked:
+            self._drain()
+
+    def _close(self):
+        if self._connection and self._connection.is_open:
+            self._connection.close()
+        elif self._connection:
+            self._connection.ioloop.stop()
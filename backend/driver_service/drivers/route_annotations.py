@@ -0,0 +1,224 @@
+"""
+Per-waypoint station annotations for driver routes.
+
+Routes only change on creation and on matching's route edits, so the station
+checks the simulator used to repeat every tick are computed once and stored
+on each waypoint next to lat/lng:
+
+    station_id       station whose lat/lng box contains the waypoint (the
+                     waypoint is that station), or None
+    near_station_id  nearest station within the proximity threshold, or None
+    near_station_m   distance to that station in meters, or None
+
+Driver.route_station_version records the station catalog version the
+annotations were computed against. When stations change, only waypoints that
+reference a changed station or lie within range of one (old or new position)
+are recomputed.
+"""
+
+import threading
+import time
+
+import grpc
+from django.conf import settings
+
+from .proximity import StationProximityEngine
+from .station_cache import StationSnapshotCache
+
+
+class RouteAnnotator:
+
+    def __init__(self, station_stub, threshold_meters=100.0, waypoint_tolerance_deg=0.0005):
+        self.cache = StationSnapshotCache(station_stub)
+        self.engine = StationProximityEngine(threshold_meters, waypoint_tolerance_deg)
+
+        # Stations that differ between previous_version and the current version
+        self.previous_version = 0
+        self.changed_ids = set()
+        self._changed = StationProximityEngine(threshold_meters, waypoint_tolerance_deg)
+
+        self.full_annotations = 0
+        self.incremental_annotations = 0
+        self.waypoints_annotated = 0
+
+        # time.monotonic() of the last station sync, for callers that throttle it
+        self.last_refresh = None
+
+    @property
+    def version(self):
+        return self.cache.version
+
+    def refresh(self):
+        """
+        Sync stations with the Station Service. On a new version, rebuild the
+        index and remember which stations changed for incremental re-annotation.
+        Returns True when stations changed.
+        """
+        return self.load_snapshot(self.cache.fetch())
+
+    def load_snapshot(self, response):
+        """
+        Apply a snapshot from cache.fetch() (None when nothing changed): the
+        second half of refresh(), for callers that fetch without their lock.
+        Returns True when stations changed.
+        """
+        if response is None:
+            return False
+        old = {station['id']: station for station in self.cache.stations}
+        old_version = self.cache.version
+        if not self.cache.load(response):
+            return False
+
+        new = {station['id']: station for station in self.cache.stations}
+        changed = [
+            station_id for station_id in set(old) | set(new)
+            if old.get(station_id) != new.get(station_id)
+        ]
+        self.previous_version = old_version
+        self.changed_ids = set(changed)
+        self._changed.load(
+            [old[i] for i in changed if i in old] + [new[i] for i in changed if i in new]
+        )
+        self.engine.load(self.cache.stations)
+        return True
+
+    def annotate(self, route):
+        """Annotate every waypoint of a route (list of lat/lng dicts) in place"""
+        self._annotate_points([(route, i) for i in range(len(route))])
+        return route
+
+    def annotate_driver(self, driver, route):
+        """Set a freshly built route on a driver, fully annotated"""
+        driver.route_queue = self.annotate(route)
+        driver.route_station_version = self.version
+
+    def reannotate(self, drivers):
+        """
+        Bring drivers annotated against an older station version up to date.
+        Drivers one version behind are patched incrementally; anything older
+        (or never annotated) is annotated in full. Returns the updated drivers.
+        """
+        stale = []
+        points = []
+        for driver in drivers:
+            if driver.route_station_version == self.version:
+                continue
+            route = driver.route_queue
+            if self.previous_version and driver.route_station_version == self.previous_version:
+                points.extend((route, i) for i in self._affected(route))
+                self.incremental_annotations += 1
+            else:
+                points.extend((route, i) for i in range(len(route)))
+                self.full_annotations += 1
+            stale.append((driver, route))
+
+        self._annotate_points(points)
+        for driver, route in stale:
+            driver.route_queue = route
+            driver.route_station_version = self.version
+        return [driver for driver, _ in stale]
+
+    def _affected(self, route):
+        """Indices of waypoints whose annotation may depend on a changed station"""
+        if not route or not self.changed_ids:
+            return []
+        lats = [coord['lat'] for coord in route]
+        lngs = [coord['lng'] for coord in route]
+        near_changed, _ = self._changed.nearest_within(lats, lngs)
+        box_changed = self._changed.match_waypoints(lats, lngs)
+        return [
+            i for i, coord in enumerate(route)
+            if near_changed[i] >= 0 or box_changed[i] >= 0
+            or coord.get('station_id') in self.changed_ids
+            or coord.get('near_station_id') in self.changed_ids
+        ]
+
+    def _annotate_points(self, points):
+        """Annotate the given (route, index) waypoints with one vectorized query"""
+        if not points:
+            return
+        lats = [route[i]['lat'] for route, i in points]
+        lngs = [route[i]['lng'] for route, i in points]
+        matched = self.engine.match_waypoints(lats, lngs)
+        nearest, distances = self.engine.nearest_within(lats, lngs)
+
+        ids = self.engine.ids
+        for (route, i), box, near, distance in zip(points, matched, nearest, distances):
+            coord = route[i]
+            coord['station_id'] = int(ids[box]) if box >= 0 else None
+            coord['near_station_id'] = int(ids[near]) if near >= 0 else None
+            coord['near_station_m'] = round(float(distance), 2) if near >= 0 else None
+        self.waypoints_annotated += len(points)
+
+    def stats(self):
+        return {
+            'version': self.version,
+            'full': self.full_annotations,
+            'incremental': self.incremental_annotations,
+            'waypoints': self.waypoints_annotated
+        }
+
+
+_annotator = None
+_annotator_lock = threading.Lock()
+
+
+def _shared_annotator():
+    """
+    Process-wide annotator for the REST and gRPC servers. Stations are
+    re-synced at most once per ROUTE_STATION_REFRESH_SECONDS, and the
+    snapshot round trip runs without _annotator_lock held, so a slow Station
+    Service never stalls route writes; they use the stations already loaded.
+    If the Station Service is unreachable routes keep version 0 and the
+    simulator annotates them later. Call without _annotator_lock held.
+    """
+    global _annotator
+    from proto_generated import station_pb2_grpc
+
+    with _annotator_lock:
+        if _annotator is None:
+            channel = grpc.insecure_channel(
+                f"{settings.STATION_SERVICE_HOST}:{settings.STATION_SERVICE_PORT}"
+            )
+            _annotator = RouteAnnotator(
+                station_pb2_grpc.StationServiceStub(channel),
+                threshold_meters=settings.SIMULATOR_PROXIMITY_METERS
+            )
+        annotator = _annotator
+        now = time.monotonic()
+        due = (annotator.last_refresh is None
+               or now - annotator.last_refresh >= settings.ROUTE_STATION_REFRESH_SECONDS)
+        if due:
+            annotator.last_refresh = now
+
+    if due:
+        response = annotator.cache.fetch()
+        if response is not None:
+            with _annotator_lock:
+                annotator.load_snapshot(response)
+    return annotator
+
+
+def set_annotated_route(driver, route):
+    """Set a new route on a driver with every waypoint annotated"""
+    annotator = _shared_annotator()
+    with _annotator_lock:
+        annotator.annotate_driver(driver, route)
+
+
+def set_edited_route(driver, route, inserted):
+    """
+    Set an edited route on a driver (EditDriverRoute). Only the inserted
+    waypoint dicts are annotated here; the rest keep their annotations.
+    """
+    annotator = _shared_annotator()
+    with _annotator_lock:
+        annotator.annotate(inserted)
+        driver.route_queue = route
+        # No-op unless stations changed since the rest of the route was annotated
+        annotator.reannotate([driver])
+
+
+def get_station(station_id):
+    """Station dict from the shared snapshot, or None when unknown"""
+    return _shared_annotator().cache.get(station_id)
@@ -0,0 +1,114 @@
+"""
+Atomic, versioned route edits (EditDriverRoute).
+
+A request carries a list of edit operations that are applied together to the
+driver's remaining route, in order:
+
+    INSERT                waypoint at index (0 = front; past the end appends)
+    REMOVE                waypoint at index
+    REPLACE_HEAD          the next waypoint (appends when the route is empty)
+    SET_MATCHED_STATION   matched station (None clears it); resets wait_counter
+
+Edits are applied in memory and written with a compare-and-swap on
+Driver.route_version, so matching and the simulator can write the same row
+without row locks: a writer whose version is stale writes nothing. With an
+expected_version the caller owns conflict handling; without one the edits are
+re-applied to a fresh read up to max_attempts times.
+"""
+
+from .models import Driver, RouteVersionConflict
+from .route_annotations import set_edited_route
+
+INSERT = 'INSERT'
+REMOVE = 'REMOVE'
+REPLACE_HEAD = 'REPLACE_HEAD'
+SET_MATCHED_STATION = 'SET_MATCHED_STATION'
+
+OPS = (INSERT, REMOVE, REPLACE_HEAD, SET_MATCHED_STATION)
+
+# Columns an edit may change, besides the dirty route columns
+EDIT_FIELDS = ('route_station_version', 'matched_station_id', 'wait_counter')
+
+
+class RouteEditError(ValueError):
+    """An edit is invalid for the driver's current route; nothing was written"""
+
+
+class RouteEditConflict(RouteVersionConflict):
+    """The route changed under the edit (route_version moved); nothing was written"""
+
+    def __init__(self, current_version, attempts):
+        super().__init__(
+            f"Route version conflict (current version {current_version}, {attempts} attempt(s))"
+        )
+        self.current_version = current_version
+        self.attempts = attempts
+
+
+def _waypoint(edit):
+    return {'lat': edit['lat'], 'lng': edit['lng']}
+
+
+def apply_edits(driver, edits):
+    """Apply edits to an in-memory driver; raises RouteEditError before touching it"""
+    route = driver.route_queue
+    inserted = []
+    matched_station = None
+    set_matched = False
+
+    for position, edit in enumerate(edits):
+        op = edit['op']
+        index = edit.get('index', 0)
+        if op == INSERT:
+            if index < 0:
+                raise RouteEditError(f"Edit {position}: negative index {index}")
+            coord = _waypoint(edit)
+            route.insert(min(index, len(route)), coord)
+            inserted.append(coord)
+        elif op == REMOVE:
+            if not 0 <= index < len(route):
+                raise RouteEditError(f"Edit {position}: no waypoint at index {index} "
+                                     f"(route has {len(route)})")
+            removed = route.pop(index)
+            inserted = [coord for coord in inserted if coord is not removed]
+        elif op == REPLACE_HEAD:
+            coord = _waypoint(edit)
+            if route:
+                inserted = [other for other in inserted if other is not route[0]]
+                route[0] = coord
+            else:
+                route.append(coord)
+            inserted.append(coord)
+        elif op == SET_MATCHED_STATION:
+            matched_station = edit.get('station_id') or None
+            set_matched = True
+        else:
+            raise RouteEditError(f"Edit {position}: unknown op {op!r}")
+
+    if any(edit['op'] != SET_MATCHED_STATION for edit in edits):
+        set_edited_route(driver, route, inserted)
+    if set_matched:
+        driver.matched_station_id = matched_station
+        driver.wait_counter = 0
+
+
+def edit_driver_route(driver_id, edits, expected_version=None, max_attempts=5):
+    """
+    Apply edits atomically with compare-and-swap on route_version.
+    Returns (driver, attempts). Raises Driver.DoesNotExist, RouteEditError
+    or RouteEditConflict.
+    """
+    attempts = 0
+    while True:
+        attempts += 1
+        driver = Driver.objects.get(id=driver_id)
+        if expected_version is not None and driver.route_version != expected_version:
+            raise RouteEditConflict(driver.route_version, attempts)
+
+        apply_edits(driver, edits)
+        if driver.save_route(*driver.dirty_route_fields(), *EDIT_FIELDS):
+            return driver, attempts
+
+        if expected_version is not None or attempts >= max_attempts:
+            current = Driver.objects.filter(id=driver_id).values_list('route_version', flat=True).first()
+            raise RouteEditConflict(current, attempts)
@@ -0,0 +1,91 @@
+"""
+Arrival estimates from the driver's stored route.
+
+Driver.route_cumdist holds the distance along the route to every packed
+record (prefix sums, rebuilt only when the route blob is rewritten; pops just
+advance route_head). The distance from the driver to any remaining waypoint
+is the leg to the head waypoint plus one subtraction, so ranking drivers by
+arrival reads two numbers per driver instead of re-measuring routes.
+
+Time follows the simulator (simulator_worker.py): one waypoint per tick (one
+simulated minute), and a matched station holds the driver STATION_WAIT_TICKS
+ticks before it is popped without a move. The driver's sim clock only
+advances on moves, so arrival_time counts moves while arrival_ticks also
+counts the wait.
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from .proximity import haversine_meters
+
+# Ticks simulate_driver_tick waits at a matched station
+STATION_WAIT_TICKS = 5
+
+
+def add_minutes(hhmm, minutes):
+    """'HH:MM' plus minutes, wrapping at midnight"""
+    try:
+        hour, minute = map(int, hhmm.split(':'))
+        return (datetime(2024, 1, 1, hour, minute) + timedelta(minutes=minutes)).strftime('%H:%M')
+    except (AttributeError, ValueError):
+        return hhmm
+
+
+def estimate_arrival(driver, station_id=None, lat=None, lng=None):
+    """
+    Arrival at the first remaining waypoint that is `station_id`, or else at
+    the route's closest approach to (lat, lng). None when the route is empty
+    or the target can't be placed on it. Otherwise a dict:
+
+        waypoint_index    index into the remaining route
+        route_meters      along the route from the driver's position
+        off_route_meters  straight line from that waypoint to (lat, lng)
+        arrival_ticks     simulator ticks until the driver is there
+        arrival_time      driver's sim clock (HH:MM) on arrival
+    """
+    records = driver._route_records()[driver.route_head:]
+    if not len(records):
+        return None
+    cumulative = driver.route_cumulative()[driver.route_head:]
+
+    index, off_route = None, 0.0
+    if station_id is not None:
+        hits = np.flatnonzero(records['station_id'] == station_id)
+        if len(hits):
+            index = int(hits[0])
+    if index is None and lat is not None and lng is not None:
+        distances = haversine_meters(lat, lng, records['lat'], records['lng'])
+        index = int(np.argmin(distances))
+        off_route = float(distances[index])
+    if index is None:
+        return None
+
+    to_head = float(haversine_meters(driver.current_lat, driver.current_lng, records['lat'][0], records['lng'][0]))
+    route_meters = to_head + float(cumulative[index] - cumulative[0])
+
+    # One move per waypoint up to and including the target...
+    moves = index + 1
+    ticks = moves
+    if driver.matched_station_id is not None:
+        stops = np.flatnonzero(records['station_id'][:index + 1] == driver.matched_station_id)
+        if len(stops):
+            stop = int(stops[0])
+            if stop == index:
+                # ...except the matched station itself, where the driver waits
+                # instead of moving onto it
+                moves = ticks = index
+            else:
+                # ...and the matched station on the way is popped without a
+                # move after the wait (part of it may already be done)
+                moves -= 1
+                ticks += STATION_WAIT_TICKS - (driver.wait_counter if stop == 0 else 0)
+
+    return {
+        'waypoint_index': index,
+        'route_meters': route_meters,
+        'off_route_meters': off_route,
+        'arrival_ticks': ticks,
+        'arrival_time': add_minutes(driver.sim_timestamp, moves),
+    }
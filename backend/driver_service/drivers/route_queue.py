@@ -0,0 +1,81 @@
+"""
+Packed storage for a driver's route queue.
+
+A route is stored as one binary blob of fixed-size waypoint records plus a
+head cursor (Driver.route_head). Popping the head only advances the cursor,
+so a simulator move writes a single integer column instead of re-serializing
+the whole route. Anything else (a new route, a push to the front, an edit)
+rebuilds the blob from the remaining records and resets the cursor to 0,
+dropping the consumed prefix.
+
+A cursor is only meaningful for the blob it was read with. Every route write
+is therefore a compare-and-swap on Driver.route_version (Driver.save_route,
+drivers/write_behind.py): a cursor-only write that raced a rebuild is
+rejected instead of skipping into the new blob.
+
+Each record holds the coordinate and its station annotations (see
+drivers/route_annotations.py); -1 / NaN mean "none". Alongside the blob,
+Driver.route_cumdist keeps the cumulative distance to each record (see
+cumulative_meters and drivers/route_eta.py).
+"""
+
+import math
+
+import numpy as np
+
+from .proximity import haversine_meters
+
+WAYPOINT_DTYPE = np.dtype([
+    ('lat', '<f8'),
+    ('lng', '<f8'),
+    ('station_id', '<i4'),
+    ('near_station_id', '<i4'),
+    ('near_station_m', '<f4'),
+])
+
+NO_STATION = -1
+
+
+def pack_route(route):
+    """List of waypoint dicts -> record array"""
+    records = np.empty(len(route), dtype=WAYPOINT_DTYPE)
+    for i, coord in enumerate(route):
+        station_id = coord.get('station_id')
+        near_station_id = coord.get('near_station_id')
+        near_station_m = coord.get('near_station_m')
+        records[i] = (
+            coord['lat'],
+            coord['lng'],
+            NO_STATION if station_id is None else station_id,
+            NO_STATION if near_station_id is None else near_station_id,
+            math.nan if near_station_m is None else near_station_m,
+        )
+    return records
+
+
+def cumulative_meters(records):
+    """Distance along the route from the first record to each record (prefix sums of the legs)"""
+    cumulative = np.zeros(len(records))
+    if len(records) > 1:
+        legs = haversine_meters(records['lat'][:-1], records['lng'][:-1], records['lat'][1:], records['lng'][1:])
+        np.cumsum(legs, out=cumulative[1:])
+    return cumulative
+
+
+def unpack_route(blob):
+    """Stored bytes -> read-only record array (no copy)"""
+    if not blob:
+        return np.empty(0, dtype=WAYPOINT_DTYPE)
+    return np.frombuffer(blob, dtype=WAYPOINT_DTYPE)
+
+
+def waypoint(record):
+    """One record -> the external {'lat', 'lng', ...} waypoint dict"""
+    lat, lng, station_id, near_station_id, near_station_m = record.tolist()
+    return {
+        'lat': lat,
+        'lng': lng,
+        'station_id': None if station_id == NO_STATION else station_id,
+        'near_station_id': None if near_station_id == NO_STATION else near_station_id,
+        'near_station_m': None if math.isnan(near_station_m) else round(near_station_m, 2),
+    }
@@ -0,0 +1,100 @@
+"""
+Fixed-rate tick scheduler for the simulator.
+
+Ticks are scheduled against absolute deadlines (start + n * interval) rather
+than sleeping a fixed amount after each tick, so processing time does not
+stretch the tick period. When a tick overruns its slot the overrun policy
+decides what happens to the missed slots:
+
+- catch_up: run the missed ticks back-to-back (at most max_catch_up of them,
+  older ones are dropped) so simulated time keeps pace with wall time
+- skip: drop the missed slots and resume on the next future deadline
+"""
+
+import time
+
+CATCH_UP = 'catch_up'
+SKIP = 'skip'
+
+
+class TickScheduler:
+
+    def __init__(self, interval, overrun_policy=CATCH_UP, max_catch_up=3,
+                 now=time.monotonic, sleep=time.sleep):
+        if overrun_policy not in (CATCH_UP, SKIP):
+            raise ValueError(f"Unknown overrun policy: {overrun_policy}")
+
+        self.interval = interval
+        self.overrun_policy = overrun_policy
+        self.max_catch_up = max_catch_up
+        self.now = now
+        self.sleep = sleep
+
+        self.deadline = None
+        self._tick_started = None
+        self._tick_started_perf = None
+
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+        self.total_duration = 0.0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def wait(self):
+        """Sleep until the next tick is due and mark the tick as started"""
+        if self.deadline is None:
+            self.deadline = self.now()
+
+        remaining = self.deadline - self.now()
+        if remaining > 0:
+            self.sleep(remaining)
+
+        self._tick_started = self.now()
+        self._tick_started_perf = time.perf_counter()
+        # How late the tick starts relative to its slot
+        self.last_lag = max(self._tick_started - self.deadline, 0.0)
+        self.max_lag = max(self.max_lag, self.last_lag)
+
+    def tick_done(self):
+        """Record the tick duration and schedule the next deadline"""
+        finished = self.now()
+        # Processing time is always real time, even on a virtual clock
+        duration = time.perf_counter() - self._tick_started_perf
+
+        self.ticks += 1
+        self.last_duration = duration
+        self.max_duration = max(self.max_duration, duration)
+        self.total_duration += duration
+
+        self.deadline += self.interval
+        if duration > self.interval:
+            self.overruns += 1
+        if finished <= self.deadline:
+            return
+
+        # Already past the next slot (overrun or catching up after one):
+        # the slot at self.deadline and every full interval after it are overdue
+        overdue = int((finished - self.deadline) // self.interval) + 1
+        if self.overrun_policy == SKIP:
+            dropped = overdue
+        else:
+            dropped = max(overdue - self.max_catch_up, 0)
+        self.deadline += dropped * self.interval
+        self.skipped += dropped
+
+    def stats(self):
+        return {
+            'ticks': self.ticks,
+            'interval_s': self.interval,
+            'policy': self.overrun_policy,
+            'last_duration_ms': self.last_duration * 1000.0,
+            'avg_duration_ms': (self.total_duration / self.ticks * 1000.0) if self.ticks else 0.0,
+            'max_duration_ms': self.max_duration * 1000.0,
+            'overruns': self.overruns,
+            'skipped': self.skipped,
+            'last_lag_ms': self.last_lag * 1000.0,
+            'max_lag_ms': self.max_lag * 1000.0
+        }
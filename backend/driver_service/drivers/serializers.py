@@ -1,5 +1,7 @@
 from rest_framework import serializers
 from .models import Driver
+from .route_annotations import set_annotated_route
+from .route_queue import WAYPOINT_DTYPE
 import json
 
 
@@ -10,12 +12,31 @@ class DriverSerializer(serializers.ModelSerializer):
         model = Driver
         fields = ['id', 'user_id', 'current_lat', 'current_lng', 'free_seats', 
                   'route_queue', 'sim_timestamp', 'is_simulating', 
-                  'matched_station_id', 'wait_counter']
+                  'matched_station_id', 'wait_counter', 'route_version']
+        read_only_fields = ['route_version']
     
     def get_route_queue(self, obj):
         return obj.route_queue
 
 
+class DriverStateSerializer(serializers.ModelSerializer):
+    """Driver without its route (route_length instead), for frequent polling"""
+    route_length = serializers.SerializerMethodField()
+    updated_at = serializers.DateTimeField(read_only=True)
+    
+    class Meta:
+        model = Driver
+        fields = ['id', 'user_id', 'current_lat', 'current_lng', 'free_seats',
+                  'route_length', 'sim_timestamp', 'is_simulating',
+                  'matched_station_id', 'wait_counter', 'updated_at']
+    
+    def get_route_length(self, obj):
+        # Annotated by the query so the route blob never has to be loaded
+        if hasattr(obj, 'route_bytes'):
+            return max((obj.route_bytes or 0) // WAYPOINT_DTYPE.itemsize - obj.route_head, 0)
+        return obj.route_length
+
+
 class CreateDriverSerializer(serializers.Serializer):
     user_id = serializers.IntegerField()
     free_seats = serializers.IntegerField(default=4)
@@ -28,7 +49,7 @@ class CreateDriverSerializer(serializers.Serializer):
         from datetime import datetime
         route = validated_data.pop('route')
         driver = Driver.objects.create(**validated_data)
-        driver.route_queue = route
+        set_annotated_route(driver, route)
         
         # Set initial position to first coordinate
         if route:
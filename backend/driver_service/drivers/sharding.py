@@ -0,0 +1,143 @@
+"""
+Lease-based driver partitioning for running several simulator workers.
+
+Drivers are split into a fixed number of partitions by `id % partitions`.
+Every live worker heartbeats into SimulatorShard and renews a lease in
+SimulatorLease for each partition it owns. Live workers are ordered by
+worker_id and partition p belongs to worker number `p % live_workers`, so
+when a worker joins or stops heartbeating the others converge on the new
+assignment within one lease period. Leases are claimed and renewed with
+conditional UPDATEs, so two workers can never own the same partition at once.
+
+A tick that runs longer than the lease can lose a partition halfway through,
+so the worker renews its leases again right before writing (renew()) and
+drops the writes of drivers in partitions it no longer holds.
+"""
+
+import os
+import socket
+from datetime import timedelta
+
+from django.db.models import Q
+from django.db.models.functions import Mod
+from django.utils import timezone
+
+from .models import SimulatorShard, SimulatorLease
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def leased_partitions():
+    """Partitions currently held by a live sharded worker (unexpired lease)"""
+    return sorted(
+        SimulatorLease.objects.exclude(owner='').filter(expires_at__gt=timezone.now())
+        .values_list('partition', flat=True)
+    )
+
+
+class ShardCoordinator:
+
+    def __init__(self, worker_id=None, partitions=16, lease_seconds=15):
+        self.worker_id = worker_id or default_worker_id()
+        self.partitions = partitions
+        self.lease_seconds = lease_seconds
+        self.owned = []
+
+        SimulatorLease.objects.bulk_create(
+            [SimulatorLease(partition=p) for p in range(partitions)],
+            ignore_conflicts=True
+        )
+
+    def live_workers(self, now):
+        cutoff = now - timedelta(seconds=self.lease_seconds)
+        return list(
+            SimulatorShard.objects.filter(last_heartbeat__gte=cutoff)
+            .order_by('worker_id')
+            .values_list('worker_id', flat=True)
+        )
+
+    def target_partitions(self, live):
+        if self.worker_id not in live:
+            return []
+        index = live.index(self.worker_id)
+        return [p for p in range(self.partitions) if p % len(live) == index]
+
+    def rebalance(self, last_tick_ms=0.0, drivers_last_tick=0):
+        """
+        Heartbeat, then release partitions assigned elsewhere and claim or
+        renew our own. Call once per tick, before loading drivers.
+        Returns the list of partitions this worker owns for the tick.
+        """
+        now = timezone.now()
+        SimulatorShard.objects.update_or_create(
+            worker_id=self.worker_id,
+            defaults={
+                'last_heartbeat': now,
+                'partitions': ','.join(str(p) for p in self.owned),
+                'last_tick_ms': last_tick_ms,
+                'drivers_last_tick': drivers_last_tick
+            }
+        )
+
+        target = self.target_partitions(self.live_workers(now))
+
+        # Hand back anything that now belongs to another worker
+        SimulatorLease.objects.filter(owner=self.worker_id).exclude(partition__in=target).update(
+            owner='', expires_at=None
+        )
+
+        # Claim free or expired partitions, renew the ones we already hold
+        SimulatorLease.objects.filter(partition__in=target).filter(
+            Q(owner=self.worker_id) | Q(owner='') | Q(expires_at__lt=now)
+        ).update(owner=self.worker_id, expires_at=now + timedelta(seconds=self.lease_seconds))
+
+        previous = self.owned
+        self.owned = sorted(
+            SimulatorLease.objects.filter(owner=self.worker_id, expires_at__gt=now)
+            .values_list('partition', flat=True)
+        )
+        if self.owned != previous:
+            print(f"[SHARD {self.worker_id}] Partitions: {self.owned} "
+                  f"(target {target}, {self.partitions} total)", flush=True)
+
+        # Forget workers that have been gone for a long time
+        SimulatorShard.objects.filter(
+            last_heartbeat__lt=now - timedelta(seconds=self.lease_seconds * 10)
+        ).delete()
+
+        return self.owned
+
+    def renew(self):
+        """
+        Extend the leases we still hold (owner is us and not expired) and
+        return the partitions that were lost since rebalance(). Call right
+        before persisting a tick's writes.
+        """
+        now = timezone.now()
+        SimulatorLease.objects.filter(
+            owner=self.worker_id, partition__in=self.owned, expires_at__gt=now
+        ).update(expires_at=now + timedelta(seconds=self.lease_seconds))
+        held = set(
+            SimulatorLease.objects.filter(owner=self.worker_id, expires_at__gt=now)
+            .values_list('partition', flat=True)
+        )
+        lost = [p for p in self.owned if p not in held]
+        if lost:
+            print(f"[SHARD {self.worker_id}] Lost partitions {lost} during the tick", flush=True)
+            self.owned = [p for p in self.owned if p in held]
+        return lost
+
+    def partition_of(self, driver_id):
+        return driver_id % self.partitions
+
+    def filter_drivers(self, queryset):
+        """Restrict a Driver queryset to the partitions owned by this worker"""
+        return queryset.annotate(partition=Mod('id', self.partitions)).filter(partition__in=self.owned)
+
+    def release(self):
+        """Give up all leases and the heartbeat row (clean shutdown)"""
+        SimulatorLease.objects.filter(owner=self.worker_id).update(owner='', expires_at=None)
+        SimulatorShard.objects.filter(worker_id=self.worker_id).delete()
+        self.owned = []
@@ -0,0 +1,232 @@
+"""
+Asynchronous Trip Service side effects for the simulator.
+
+Starting and completing trips used to be blocking HTTP calls made inline in
+the tick loop, so one slow Trip Service response stalled every other driver.
+Here they run on an asyncio event loop in a background thread with a pooled
+aiohttp client: calls for different drivers overlap (bounded by a semaphore),
+calls for the same driver run in submission order, and the tick only waits a
+bounded amount of time for its batch before moving on.
+"""
+
+import asyncio
+import threading
+import time
+
+import aiohttp
+
+
+START = 'start'
+COMPLETE = 'complete'
+
+
+class TripSideEffects:
+
+    def __init__(self, trip_host, trip_port, concurrency=32, timeout=3.0):
+        self.base_url = f"http://{trip_host}:{trip_port}/api/trips"
+        # trip_service host has underscore; force safe Host
+        self.headers = {'Host': 'localhost'}
+        self.concurrency = concurrency
+        self.timeout = timeout
+
+        self._loop = None
+        self._thread = None
+        self._session = None
+        self._semaphore = None
+        self._ready = threading.Event()
+
+        self._tails = {}        # driver id -> last future for that driver (loop thread)
+        self._batch = []        # futures submitted during the current tick
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+        self.counters = {
+            'submitted': 0,
+            'succeeded': 0,
+            'failed': 0,
+            'trips_started': 0,
+            'trips_completed': 0,
+            'latency_ms_total': 0.0,
+            'latency_ms_max': 0.0
+        }
+
+    # ---- caller side -------------------------------------------------------
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='trip-side-effects', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def start_trips(self, driver_id):
+        """Start all SCHEDULED trips for a driver (when they pick up rider)"""
+        self._submit(driver_id, START)
+
+    def complete_trips(self, driver_id):
+        """Complete all active trips for a driver when they reach destination"""
+        self._submit(driver_id, COMPLETE)
+
+    def wait_for_batch(self, timeout):
+        """
+        Wait up to `timeout` seconds for the side effects submitted since the
+        last call. Calls still running afterwards keep going in the background.
+        Returns (finished, still_running) for this batch.
+        """
+        batch, self._batch = self._batch, []
+        if not batch:
+            return 0, 0
+
+        deadline = time.monotonic() + timeout
+        for future in batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                future.result(timeout=remaining)
+            except Exception:
+                # Timed out or failed; failures are counted by the coroutine
+                pass
+
+        finished = sum(1 for future in batch if future.done())
+        return finished, len(batch) - finished
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['in_flight'] = len(self._in_flight)
+        done = stats['succeeded'] + stats['failed']
+        stats['latency_ms_avg'] = stats['latency_ms_total'] / done if done else 0.0
+        return stats
+
+    def stop(self, timeout=5.0):
+        """Let in-flight calls finish (up to timeout), then close the pool and loop"""
+        if self._loop is None:
+            return
+        with self._lock:
+            pending = list(self._in_flight)
+        for future in pending:
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                pass
+        asyncio.run_coroutine_threadsafe(self._close(), self._loop).result(timeout=timeout)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=timeout)
+
+    def _submit(self, driver_id, action):
+        future = asyncio.run_coroutine_threadsafe(self._chain(driver_id, action), self._loop)
+        with self._lock:
+            self.counters['submitted'] += 1
+            self._in_flight.add(future)
+        future.add_done_callback(self._on_done)
+        self._batch.append(future)
+
+    def _on_done(self, future):
+        with self._lock:
+            self._in_flight.discard(future)
+
+    # ---- event loop thread -------------------------------------------------
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._open())
+        self._ready.set()
+        self._loop.run_forever()
+        self._loop.close()
+
+    async def _open(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers=self.headers
+        )
+
+    async def _close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    async def _chain(self, driver_id, action):
+        # Side effects of one driver run in order (pickup before completion)
+        previous = self._tails.get(driver_id)
+        current = asyncio.ensure_future(self._run_after(previous, driver_id, action))
+        self._tails[driver_id] = current
+        try:
+            return await current
+        finally:
+            if self._tails.get(driver_id) is current:
+                del self._tails[driver_id]
+
+    async def _run_after(self, previous, driver_id, action):
+        if previous is not None:
+            try:
+                await previous
+            except Exception:
+                pass
+
+        started = time.perf_counter()
+        ok = False
+        try:
+            async with self._semaphore:
+                if action == START:
+                    await self._start_trips(driver_id)
+                else:
+                    await self._complete_trips(driver_id)
+            ok = True
+        except Exception as e:
+            print(f"[SIMULATOR] ❌ Error {'starting' if action == START else 'completing'} "
+                  f"trips for driver {driver_id}: {e}", flush=True)
+        finally:
+            latency_ms = (time.perf_counter() - started) * 1000.0
+            with self._lock:
+                self.counters['succeeded' if ok else 'failed'] += 1
+                self.counters['latency_ms_total'] += latency_ms
+                self.counters['latency_ms_max'] = max(self.counters['latency_ms_max'], latency_ms)
+        return ok
+
+    async def _fetch_trips(self, driver_id, phase):
+        url = f"{self.base_url}/by_driver/"
+        async with self._session.get(url, params={'driver_id': driver_id}) as response:
+            if response.status != 200:
+                text = await response.text()
+                print(f"[SIMULATOR] ⚠️ Failed to fetch trips ({phase}) for driver {driver_id}: "
+                      f"{response.status} - {text}", flush=True)
+                return []
+            return await response.json()
+
+    async def _post(self, trip_id, action):
+        async with self._session.post(f"{self.base_url}/{trip_id}/{action}/") as response:
+            return response.status, await response.text()
+
+    async def _start_trips(self, driver_id):
+        for trip in await self._fetch_trips(driver_id, 'start phase'):
+            if trip.get('status') != 'SCHEDULED':
+                continue
+            trip_id = trip['id']
+            status, text = await self._post(trip_id, START)
+            if status == 200:
+                with self._lock:
+                    self.counters['trips_started'] += 1
+                print(f"[SIMULATOR] ✅ Trip {trip_id} STARTED for driver {driver_id}", flush=True)
+            else:
+                print(f"[SIMULATOR] ⚠️ Failed to start trip {trip_id}: {status} - {text}", flush=True)
+
+    async def _complete_trips(self, driver_id):
+        for trip in await self._fetch_trips(driver_id, 'complete phase'):
+            trip_status = trip.get('status')
+            if trip_status not in ('ACTIVE', 'SCHEDULED'):
+                continue
+            trip_id = trip['id']
+
+            # If SCHEDULED, start it first to follow state machine
+            if trip_status == 'SCHEDULED':
+                print(f"[SIMULATOR] Trip {trip_id} is SCHEDULED. Starting it before completion...", flush=True)
+                await self._post(trip_id, START)
+
+            status, text = await self._post(trip_id, COMPLETE)
+            if status == 200:
+                with self._lock:
+                    self.counters['trips_completed'] += 1
+                print(f"[SIMULATOR] ✅ Trip {trip_id} completed for driver {driver_id}", flush=True)
+            else:
+                print(f"[SIMULATOR] ⚠️ Failed to complete trip {trip_id}: {status} - {text}", flush=True)
@@ -0,0 +1,371 @@
+"""
+In-memory spatial index over live driver positions.
+
+Drivers are bucketed into a uniform lat/lng grid. A background thread keeps
+the index current from the database, so queries never wait on it: every
+refresh_interval it applies a delta (rows whose change_seq moved past the
+cursor), and a full resync runs every resync_interval as a safety net.
+
+change_seq is drawn from a database sequence by every write to a driver row
+(simulator flush, location ingest, REST/gRPC updates; see
+Driver.change_seq). A value is drawn before the writing transaction commits,
+so a row can become visible after rows with higher values. Each delta
+therefore reads from the highest change_seq seen by a read that finished at
+least change_overlap ago, on this process's monotonic clock. Anything drawn
+since then is re-read. change_overlap has to cover the longest write
+transaction plus refresh_interval. Unlike updated_at, the cursor doesn't
+depend on the clocks of the processes that write.
+
+Deletes leave no row behind to find, so every delete_check_interval the
+refresh compares the row count and the sum of ids with the index's (kept
+incrementally). Ids only grow, so any delete (even one followed by a create)
+changes one of them; the index then drops the ids that are gone.
+
+Queries:
+- nearest(): k nearest available drivers, searched ring by ring outwards
+  from the query cell and stopping once no closer driver can exist
+- within_bounds(): drivers inside a lat/lng box (map viewport)
+"""
+
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import deque
+
+from django.db import close_old_connections
+from django.db.models import Count, Sum
+
+from .models import Driver
+from .proximity import EARTH_RADIUS_METERS, METERS_PER_DEGREE
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    """Great-circle distance in meters for scalar inputs"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2.0) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_METERS * math.asin(math.sqrt(min(a, 1.0)))
+
+
+class DriverSpatialIndex:
+
+    FIELDS = ('id', 'user_id', 'current_lat', 'current_lng', 'free_seats',
+              'matched_station_id', 'is_simulating', 'change_seq')
+
+    def __init__(self, cell_deg=0.01, refresh_interval=1.0, resync_interval=60.0, change_overlap=3.0,
+                 delete_check_interval=2.0):
+        self.cell_deg = cell_deg
+        self.refresh_interval = refresh_interval
+        self.resync_interval = resync_interval
+        self.change_overlap = change_overlap
+        self.delete_check_interval = delete_check_interval
+
+        self._drivers = {}     # driver id -> entry dict
+        self._cells = {}       # (row, col) -> set of driver ids
+        self._id_sum = 0       # sum of self._drivers' ids
+        self._lock = threading.RLock()
+
+        self._cursor = None    # highest change_seq applied
+        self._marks = deque()  # (monotonic time a read finished, cursor after it)
+        self._last_refresh = 0.0
+        self._last_resync = 0.0
+        self._last_delete_check = 0.0
+
+        self._thread = None
+        self._stop = threading.Event()
+
+        self.full_resyncs = 0
+        self.delta_refreshes = 0
+        self.rows_applied = 0
+        self.deletes_applied = 0
+        self.delete_checks = 0
+        self.failed_refreshes = 0
+
+    def __len__(self):
+        return len(self._drivers)
+
+    # ---- maintenance -------------------------------------------------------
+
+    def _cell(self, lat, lng):
+        return (math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg))
+
+    def upsert(self, driver_id, user_id, lat, lng, free_seats, matched_station_id, is_simulating):
+        with self._lock:
+            entry = self._drivers.get(driver_id)
+            cell = self._cell(lat, lng)
+            if entry is not None and entry['cell'] != cell:
+                self._discard_from_cell(driver_id, entry['cell'])
+            if entry is None or entry['cell'] != cell:
+                self._cells.setdefault(cell, set()).add(driver_id)
+            if entry is None:
+                self._id_sum += driver_id
+            self._drivers[driver_id] = {
+                'driver_id': driver_id,
+                'user_id': user_id,
+                'lat': lat,
+                'lng': lng,
+                'free_seats': free_seats,
+                'matched_station_id': matched_station_id,
+                'is_simulating': is_simulating,
+                'cell': cell
+            }
+
+    def remove(self, driver_id):
+        with self._lock:
+            entry = self._drivers.pop(driver_id, None)
+            if entry is not None:
+                self._discard_from_cell(driver_id, entry['cell'])
+                self._id_sum -= driver_id
+
+    def _discard_from_cell(self, driver_id, cell):
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(driver_id)
+            if not members:
+                del self._cells[cell]
+
+    def _apply(self, rows):
+        cursor = self._cursor
+        for driver_id, user_id, lat, lng, free_seats, matched, simulating, change_seq in rows:
+            self.upsert(driver_id, user_id, lat, lng, free_seats, matched, simulating)
+            if cursor is None or change_seq > cursor:
+                cursor = change_seq
+        self._cursor = cursor
+        self.rows_applied += len(rows)
+
+    def _mark(self):
+        """Remember the cursor a finished read reached, for _floor()"""
+        self._marks.append((time.monotonic(), self._cursor))
+
+    def _floor(self, now):
+        """
+        change_seq a delta reads after: the cursor of the newest read that
+        finished at least change_overlap ago. Values drawn by writes still in
+        flight then are all higher, so those writes can't be skipped. Until
+        such a read exists (just after start-up) every changed row is read.
+        """
+        horizon = now - self.change_overlap
+        while len(self._marks) > 1 and self._marks[1][0] <= horizon:
+            self._marks.popleft()
+        if self._marks and self._marks[0][0] <= horizon:
+            return self._marks[0][1]
+        return 0
+
+    def resync(self):
+        """Rebuild the whole index from the database"""
+        started = time.monotonic()
+        rows = list(Driver.objects.values_list(*self.FIELDS))
+        with self._lock:
+            self._drivers = {}
+            self._cells = {}
+            self._id_sum = 0
+            self._cursor = None
+            self._apply(rows)
+            self._last_resync = self._last_refresh = self._last_delete_check = started
+            self._mark()
+            self.full_resyncs += 1
+
+    def refresh(self, force=False):
+        """Apply rows changed since the last refresh (or resync when due)"""
+        now = time.monotonic()
+        if not force and now - self._last_refresh < self.refresh_interval:
+            return
+        if self._cursor is None or now - self._last_resync >= self.resync_interval:
+            self.resync()
+            return
+
+        rows = list(
+            Driver.objects.filter(change_seq__gt=self._floor(now)).values_list(*self.FIELDS)
+        )
+        with self._lock:
+            self._apply(rows)
+            self._mark()
+            self._last_refresh = now
+            self.delta_refreshes += 1
+        if now - self._last_delete_check >= self.delete_check_interval:
+            self._drop_deleted()
+
+    def _drop_deleted(self):
+        """Remove drivers whose rows were deleted (see the module docstring)"""
+        self._last_delete_check = time.monotonic()
+        self.delete_checks += 1
+        totals = Driver.objects.aggregate(count=Count('id'), id_sum=Sum('id'))
+        with self._lock:
+            if totals['count'] == len(self._drivers) and (totals['id_sum'] or 0) == self._id_sum:
+                return
+        # Something differs (a delete, or a row created since the delta): compare ids
+        existing = set(Driver.objects.values_list('id', flat=True))
+        with self._lock:
+            gone = [driver_id for driver_id in self._drivers if driver_id not in existing]
+            for driver_id in gone:
+                self.remove(driver_id)
+            self.deletes_applied += len(gone)
+
+    def start(self):
+        """Keep the index current from a background thread (once per refresh_interval)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='driver-index-refresh', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            # Drop a connection that broke or aged out, as Django does per request
+            close_old_connections()
+            try:
+                self.refresh(force=True)
+            except Exception as e:
+                self.failed_refreshes += 1
+                print(f"[DRIVER INDEX] Refresh failed: {e}", flush=True)
+
+    # ---- queries -----------------------------------------------------------
+
+    @staticmethod
+    def _available(entry, min_free_seats, include_matched):
+        return (entry['is_simulating']
+                and entry['free_seats'] >= min_free_seats
+                and (include_matched or entry['matched_station_id'] is None))
+
+    def nearest(self, lat, lng, k=5, min_free_seats=1, include_matched=False, max_meters=None):
+        """
+        k nearest available drivers (simulating, enough free seats, not
+        already matched unless include_matched) as entry dicts with
+        distance_m, closest first.
+        """
+        with self._lock:
+            if not self._drivers or k <= 0:
+                return []
+
+            row0, col0 = self._cell(lat, lng)
+            cell_lat_m = self.cell_deg * METERS_PER_DEGREE
+            cell_lng_m = cell_lat_m * max(math.cos(math.radians(min(abs(lat) + self.cell_deg, 89.0))), 1e-6)
+            ring_m = min(cell_lat_m, cell_lng_m)
+
+            best = []  # max-heap of (-distance, driver id)
+
+            def consider(cell):
+                for driver_id in self._cells.get(cell, ()):
+                    entry = self._drivers[driver_id]
+                    if not self._available(entry, min_free_seats, include_matched):
+                        continue
+                    distance = haversine(lat, lng, entry['lat'], entry['lng'])
+                    if max_meters is not None and distance > max_meters:
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, driver_id))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, driver_id))
+
+            for ring in itertools.count():
+                # Anything in this ring is at least (ring - 1) cells away
+                if len(best) == k and (ring - 1) * ring_m > -best[0][0]:
+                    break
+                if max_meters is not None and (ring - 1) * ring_m > max_meters:
+                    break
+                if 8 * ring > len(self._cells):
+                    # Sparse grid: cheaper to visit the remaining occupied cells directly
+                    for cell in list(self._cells):
+                        if max(abs(cell[0] - row0), abs(cell[1] - col0)) >= ring:
+                            consider(cell)
+                    break
+                for cell in self._ring_cells(row0, col0, ring):
+                    consider(cell)
+
+            results = []
+            for negative_distance, driver_id in sorted(best, reverse=True):
+                result = self._public(self._drivers[driver_id])
+                result['distance_m'] = round(-negative_distance, 2)
+                results.append(result)
+            return results
+
+    @staticmethod
+    def _ring_cells(row0, col0, ring):
+        if ring == 0:
+            yield (row0, col0)
+            return
+        for col in range(col0 - ring, col0 + ring + 1):
+            yield (row0 - ring, col)
+            yield (row0 + ring, col)
+        for row in range(row0 - ring + 1, row0 + ring):
+            yield (row, col0 - ring)
+            yield (row, col0 + ring)
+
+    def within_bounds(self, min_lat, min_lng, max_lat, max_lng, limit=1000, available_only=False,
+                      min_free_seats=1):
+        """Drivers inside the lat/lng box (simulating ones only), up to limit"""
+        with self._lock:
+            row_lo, col_lo = self._cell(min_lat, min_lng)
+            row_hi, col_hi = self._cell(max_lat, max_lng)
+            span = (row_hi - row_lo + 1) * (col_hi - col_lo + 1)
+
+            # Walk the box's cells, or the occupied cells when the box is huge
+            if span <= len(self._cells):
+                cells = [(row, col) for row in range(row_lo, row_hi + 1)
+                         for col in range(col_lo, col_hi + 1)]
+            else:
+                cells = [cell for cell in self._cells
+                         if row_lo <= cell[0] <= row_hi and col_lo <= cell[1] <= col_hi]
+
+            results = []
+            for cell in cells:
+                for driver_id in self._cells.get(cell, ()):
+                    entry = self._drivers[driver_id]
+                    if not entry['is_simulating']:
+                        continue
+                    if available_only and not self._available(entry, min_free_seats, False):
+                        continue
+                    if min_lat <= entry['lat'] <= max_lat and min_lng <= entry['lng'] <= max_lng:
+                        results.append(self._public(entry))
+                        if len(results) >= limit:
+                            return results
+            return results
+
+    @staticmethod
+    def _public(entry):
+        return {key: value for key, value in entry.items() if key != 'cell'}
+
+    def stats(self):
+        return {
+            'drivers': len(self._drivers),
+            'cells': len(self._cells),
+            'full_resyncs': self.full_resyncs,
+            'delta_refreshes': self.delta_refreshes,
+            'rows_applied': self.rows_applied,
+            'deletes_applied': self.deletes_applied,
+            'delete_checks': self.delete_checks,
+            'failed_refreshes': self.failed_refreshes
+        }
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_driver_index():
+    """
+    Process-wide index (REST and gRPC servers). The first call loads it; from
+    then on a background thread keeps it current, so queries never wait on
+    the database.
+    """
+    global _index
+    from django.conf import settings
+
+    with _index_lock:
+        if _index is None:
+            index = DriverSpatialIndex(
+                cell_deg=settings.DRIVER_INDEX_CELL_DEG,
+                refresh_interval=settings.DRIVER_INDEX_REFRESH_SECONDS,
+                resync_interval=settings.DRIVER_INDEX_RESYNC_SECONDS,
+                change_overlap=settings.DRIVER_INDEX_CHANGE_OVERLAP_SECONDS,
+                delete_check_interval=settings.DRIVER_INDEX_DELETE_CHECK_SECONDS
+            )
+            index.resync()
+            index.start()
+            _index = index
+    return _index
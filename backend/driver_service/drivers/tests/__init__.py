@@ -0,0 +1,6 @@
+"""
+Unit tests for the drivers app. They need the compiled protos, so run them
+inside the driver service image (or anywhere proto_generated has been built):
+
+    python manage.py test drivers
+"""
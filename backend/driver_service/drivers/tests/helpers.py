@@ -0,0 +1,25 @@
+from proto_generated import station_pb2
+
+
+class FakeStationStub:
+    """Station Service stub serving a fixed snapshot"""
+
+    def __init__(self, stations=(), version=1):
+        self.stations = list(stations)      # (id, name, lat, lng)
+        self.version = version
+
+    def GetStationSnapshot(self, request, timeout=None):
+        if request.since_version == self.version:
+            return station_pb2.StationSnapshotResponse(success=True, version=self.version, not_modified=True)
+        return station_pb2.StationSnapshotResponse(
+            success=True,
+            version=self.version,
+            station_ids=[station[0] for station in self.stations],
+            names=[station[1] for station in self.stations],
+            latitudes=[station[2] for station in self.stations],
+            longitudes=[station[3] for station in self.stations]
+        )
+
+
+def route(*points):
+    return [{'lat': lat, 'lng': lng} for lat, lng in points]
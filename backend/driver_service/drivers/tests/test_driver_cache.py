@@ -0,0 +1,93 @@
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+
+from drivers.driver_cache import DriverCache
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def driver(driver_id, user_id=None):
+    return SimpleNamespace(id=driver_id, user_id=user_id if user_id is not None else driver_id + 100)
+
+
+class DriverCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = DriverCache(max_entries=3, ttl=2.0, clock=self.clock)
+
+    def test_hit_by_id_and_user(self):
+        cached = driver(1)
+        self.cache.put(cached, self.cache.generation())
+
+        self.assertIs(self.cache.get(1), cached)
+        self.assertIs(self.cache.get_by_user(101), cached)
+
+    def test_entries_expire_after_the_ttl(self):
+        self.cache.put(driver(1), self.cache.generation())
+        self.clock.now = 2.0
+
+        self.assertIsNone(self.cache.get(1))
+        self.assertEqual(self.cache.expirations, 1)
+
+    def test_least_recently_used_is_evicted(self):
+        for driver_id in (1, 2, 3):
+            self.cache.put(driver(driver_id), self.cache.generation())
+        self.cache.get(1)
+        self.cache.put(driver(4), self.cache.generation())
+
+        self.assertIsNone(self.cache.get(2))
+        self.assertIsNotNone(self.cache.get(1))
+        self.assertIsNone(self.cache.get_by_user(102))
+
+    def test_invalidate_drops_the_entry(self):
+        self.cache.put(driver(1), self.cache.generation())
+        self.cache.invalidate(1)
+
+        self.assertIsNone(self.cache.get(1))
+        self.assertIsNone(self.cache.get_by_user(101))
+
+    def test_load_that_raced_an_invalidation_is_not_cached(self):
+        generation = self.cache.generation()     # reader starts loading
+        self.cache.invalidate(1)                 # writer commits and invalidates
+        self.cache.put(driver(1), generation)    # reader stores what it loaded before the write
+
+        self.assertIsNone(self.cache.get(1))
+
+    def test_load_started_after_the_invalidation_is_cached(self):
+        self.cache.invalidate(1)
+        generation = self.cache.generation()
+        self.cache.put(driver(1), generation)
+
+        self.assertIsNotNone(self.cache.get(1))
+
+    def test_invalidating_another_driver_does_not_block_the_load(self):
+        generation = self.cache.generation()
+        self.cache.invalidate(2)
+        self.cache.put(driver(1), generation)
+
+        self.assertIsNotNone(self.cache.get(1))
+
+    def test_load_that_raced_a_clear_is_not_cached(self):
+        generation = self.cache.generation()
+        self.cache.clear()
+        self.cache.put(driver(1), generation)
+
+        self.assertIsNone(self.cache.get(1))
+
+    def test_race_is_detected_after_its_invalidation_is_trimmed(self):
+        generation = self.cache.generation()
+        # More invalidations than max_entries trim driver 1's record
+        self.cache.invalidate(1)
+        self.cache.invalidate(2, 3, 4)
+        self.cache.put(driver(1), generation)
+
+        self.assertIsNone(self.cache.get(1))
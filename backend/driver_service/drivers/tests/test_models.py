@@ -0,0 +1,57 @@
+from django.test import TestCase
+
+from drivers.models import Driver, RouteVersionConflict
+from drivers.tests.helpers import route
+
+
+class SaveRouteTests(TestCase):
+
+    def setUp(self):
+        self.driver = Driver.objects.create(user_id=1, is_simulating=True)
+        self.driver.route_queue = route((12.97, 77.59), (12.971, 77.59), (12.972, 77.59))
+        self.assertTrue(self.driver.save_route(*self.driver.dirty_route_fields()))
+
+    def load(self):
+        return Driver.objects.get(id=self.driver.id)
+
+    def test_save_route_bumps_the_version(self):
+        driver = self.load()
+        driver.pop_route(save=False)
+
+        self.assertTrue(driver.save_route(*driver.dirty_route_fields()))
+        self.assertEqual(driver.route_version, 2)
+        self.assertEqual(self.load().route_version, 2)
+        self.assertEqual(self.load().route_length, 2)
+
+    def test_stale_writer_writes_nothing(self):
+        first, second = self.load(), self.load()
+        first.push_front_route({'lat': 12.9, 'lng': 77.5})
+        second.pop_route(save=False)
+
+        self.assertFalse(second.save_route(*second.dirty_route_fields()))
+        stored = self.load()
+        self.assertEqual(stored.route_version, 2)
+        self.assertEqual(stored.route_head, 0)
+        self.assertEqual(stored.peek_route()['lat'], 12.9)
+        self.assertEqual(stored.route_length, 4)
+
+    def test_cursor_write_cannot_land_on_a_rebuilt_blob(self):
+        stale = self.load()
+        rebuilt = self.load()
+        rebuilt.push_front_route({'lat': 12.9, 'lng': 77.5})
+
+        with self.assertRaises(RouteVersionConflict):
+            stale.pop_route()
+        self.assertEqual(self.load().peek_route()['lat'], 12.9)
+
+    def test_dirty_fields_follow_the_kind_of_change(self):
+        driver = self.load()
+        driver.pop_route(save=False)
+        self.assertEqual(driver.dirty_route_fields(), ('route_head',))
+
+        driver.push_front_route({'lat': 12.9, 'lng': 77.5}, save=False)
+        self.assertEqual(
+            driver.dirty_route_fields(), ('route_blob', 'route_cumdist', 'route_head', 'route_queue_json')
+        )
+        driver.save_route(*driver.dirty_route_fields())
+        self.assertEqual(driver.dirty_route_fields(), ('route_head',))
@@ -0,0 +1,95 @@
+import json
+from types import SimpleNamespace
+
+import pika
+from django.test import SimpleTestCase
+
+from drivers.publisher import RabbitMQPublisher
+
+
+class FakeChannel:
+
+    def __init__(self):
+        self.published = []
+
+    def basic_publish(self, exchange, routing_key, body, properties):
+        self.published.append((exchange, json.loads(body), properties.delivery_mode))
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.ioloop = SimpleNamespace(stop=lambda: None, add_callback_threadsafe=lambda callback: None)
+
+
+def confirm(delivery_tag, acked=True, multiple=False):
+    method = (pika.spec.Basic.Ack if acked else pika.spec.Basic.Nack)(
+        delivery_tag=delivery_tag, multiple=multiple
+    )
+    return SimpleNamespace(method=method)
+
+
+class PublisherTests(SimpleTestCase):
+
+    def setUp(self):
+        self.publisher = RabbitMQPublisher('amqp://unused', max_pending=3)
+        self.publisher._stopping = True
+
+    def connect(self):
+        self.channel = FakeChannel()
+        self.publisher._channel = self.channel
+        self.publisher._delivery_tag = 0
+        self.publisher._ready = True
+        self.publisher._drain()
+
+    def disconnect(self):
+        self.publisher._on_connection_closed(FakeConnection(), 'test')
+
+    def test_transient_messages_are_sent_non_persistent_and_never_wait_for_a_confirm(self):
+        self.publisher.publish({'n': 1})
+        self.publisher.publish({'n': 2}, routing_key='', exchange='feed', transient=True)
+        self.publisher.flush()
+        self.connect()
+
+        self.assertEqual(self.channel.published, [('', {'n': 1}, 2), ('feed', {'n': 2}, 1)])
+        self.assertEqual(list(self.publisher._unconfirmed), [1])
+
+        self.publisher._on_delivery_confirmation(confirm(2, multiple=True))
+        self.assertEqual(self.publisher.stats()['confirmed'], 1)
+        self.assertEqual(self.publisher.stats()['unconfirmed'], 0)
+
+    def test_reconnect_republishes_durable_messages_only(self):
+        self.connect()
+        self.publisher.publish({'n': 1})
+        self.publisher.publish({'n': 2}, exchange='feed', transient=True)
+        self.publisher.flush()
+        self.publisher._drain()
+        self.publisher.publish({'n': 3}, exchange='feed', transient=True)
+        self.publisher._ready = False
+        self.publisher.flush()
+
+        self.disconnect()
+
+        stats = self.publisher.stats()
+        self.assertEqual((stats['republished'], stats['dropped'], stats['pending']), (1, 1, 1))
+        self.connect()
+        self.assertEqual(self.channel.published, [('', {'n': 1}, 2)])
+
+    def test_pending_queue_drops_the_oldest_beyond_max_pending(self):
+        for n in range(5):
+            self.publisher.publish({'n': n})
+        self.publisher.flush()
+
+        self.assertEqual(self.publisher.stats()['dropped'], 2)
+        self.connect()
+        self.assertEqual([body['n'] for _, body, _ in self.channel.published], [2, 3, 4])
+
+    def test_nacked_durable_message_is_sent_again(self):
+        self.publisher.publish({'n': 1})
+        self.publisher.flush()
+        self.connect()
+
+        self.publisher._on_delivery_confirmation(confirm(1, acked=False))
+
+        self.assertEqual([body['n'] for _, body, _ in self.channel.published], [1, 1])
+        self.assertEqual(self.publisher.stats()['nacked'], 1)
@@ -0,0 +1,57 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from drivers import route_annotations
+from drivers.route_annotations import RouteAnnotator, get_station
+from drivers.tests.helpers import FakeStationStub
+
+STATION = (7, 'Central', 12.975, 77.595)
+
+
+class CountingStationStub(FakeStationStub):
+    """Records each call and whether the annotator lock was held during it"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = []
+
+    def GetStationSnapshot(self, request, timeout=None):
+        self.calls.append((timeout, route_annotations._annotator_lock.locked()))
+        return super().GetStationSnapshot(request, timeout)
+
+
+class SharedAnnotatorTests(SimpleTestCase):
+
+    def setUp(self):
+        self.stub = CountingStationStub([STATION])
+        patcher = mock.patch.object(route_annotations, '_annotator', RouteAnnotator(self.stub))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(ROUTE_STATION_REFRESH_SECONDS=60)
+    def test_stations_are_rechecked_at_most_once_per_interval(self):
+        self.assertEqual(get_station(7)['name'], 'Central')
+        self.assertIsNone(get_station(8))
+
+        self.assertEqual(len(self.stub.calls), 1)
+
+    @override_settings(ROUTE_STATION_REFRESH_SECONDS=0)
+    def test_snapshot_call_has_a_deadline_and_runs_without_the_lock(self):
+        get_station(7)
+        get_station(7)
+
+        self.assertEqual(len(self.stub.calls), 2)
+        for timeout, locked in self.stub.calls:
+            self.assertIsNotNone(timeout)
+            self.assertFalse(locked)
+
+    @override_settings(ROUTE_STATION_REFRESH_SECONDS=0)
+    def test_new_version_is_loaded_on_the_next_due_check(self):
+        get_station(7)
+        self.stub.stations.append((8, 'North', 13.0, 77.6))
+        self.stub.version = 2
+
+        self.assertEqual(get_station(8)['name'], 'North')
+        self.assertEqual(route_annotations._annotator.version, 2)
+        self.assertEqual(route_annotations._annotator.changed_ids, {8})
@@ -0,0 +1,116 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from drivers import route_annotations
+from drivers.models import Driver
+from drivers.route_annotations import RouteAnnotator
+from drivers.route_edits import (
+    INSERT, REMOVE, REPLACE_HEAD, SET_MATCHED_STATION, RouteEditConflict, RouteEditError,
+    apply_edits, edit_driver_route
+)
+from drivers.tests.helpers import FakeStationStub, route
+
+STATION = (7, 'Central', 12.975, 77.595)
+
+
+class RouteEditTests(TestCase):
+
+    def setUp(self):
+        annotator = RouteAnnotator(FakeStationStub([STATION]))
+        patcher = mock.patch.object(route_annotations, '_annotator', annotator)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.driver = Driver.objects.create(user_id=1, is_simulating=True)
+        self.driver.route_queue = route((12.97, 77.59), (12.971, 77.59), (12.972, 77.59))
+        self.driver.save_route(*self.driver.dirty_route_fields())
+
+    def coords(self, driver):
+        return [(coord['lat'], coord['lng']) for coord in driver.route_queue]
+
+    def test_insert_remove_and_replace_head_apply_in_order(self):
+        driver = Driver.objects.get(id=self.driver.id)
+        apply_edits(driver, [
+            {'op': INSERT, 'index': 1, 'lat': 12.975, 'lng': 77.595},
+            {'op': REMOVE, 'index': 3},
+            {'op': REPLACE_HEAD, 'lat': 12.96, 'lng': 77.58},
+            {'op': INSERT, 'index': 99, 'lat': 12.99, 'lng': 77.6},
+        ])
+
+        self.assertEqual(self.coords(driver), [(12.96, 77.58), (12.975, 77.595), (12.971, 77.59), (12.99, 77.6)])
+        # Inserted waypoints are annotated against the station snapshot
+        self.assertEqual(driver.route_queue[1]['station_id'], 7)
+
+    def test_replace_head_appends_to_an_empty_route(self):
+        driver = Driver.objects.get(id=self.driver.id)
+        driver.route_queue = []
+        apply_edits(driver, [{'op': REPLACE_HEAD, 'lat': 12.96, 'lng': 77.58}])
+
+        self.assertEqual(self.coords(driver), [(12.96, 77.58)])
+
+    def test_set_matched_station_resets_the_wait(self):
+        driver = Driver.objects.get(id=self.driver.id)
+        driver.wait_counter = 3
+        apply_edits(driver, [{'op': SET_MATCHED_STATION, 'station_id': 7}])
+
+        self.assertEqual((driver.matched_station_id, driver.wait_counter), (7, 0))
+        self.assertEqual(driver.dirty_route_fields(), ('route_head',))
+
+    def test_invalid_edit_writes_nothing(self):
+        with self.assertRaises(RouteEditError):
+            edit_driver_route(self.driver.id, [
+                {'op': INSERT, 'index': 0, 'lat': 12.9, 'lng': 77.5},
+                {'op': REMOVE, 'index': 10},
+            ])
+
+        stored = Driver.objects.get(id=self.driver.id)
+        self.assertEqual(stored.route_version, 1)
+        self.assertEqual(stored.route_length, 3)
+
+    def test_edit_is_written_with_a_version_bump(self):
+        driver, attempts = edit_driver_route(
+            self.driver.id, [{'op': INSERT, 'index': 0, 'lat': 12.9, 'lng': 77.5}], expected_version=1
+        )
+
+        self.assertEqual(attempts, 1)
+        stored = Driver.objects.get(id=self.driver.id)
+        self.assertEqual(stored.route_version, 2)
+        self.assertEqual(self.coords(stored)[0], (12.9, 77.5))
+        self.assertEqual(stored.route_station_version, 1)
+
+    def test_expected_version_mismatch_is_a_conflict(self):
+        with self.assertRaises(RouteEditConflict) as raised:
+            edit_driver_route(self.driver.id, [{'op': REMOVE, 'index': 0}], expected_version=0)
+
+        self.assertEqual(raised.exception.current_version, 1)
+        self.assertEqual(Driver.objects.get(id=self.driver.id).route_length, 3)
+
+    def test_concurrent_write_is_retried_on_a_fresh_read(self):
+        original = apply_edits
+
+        def racing_apply(driver, edits):
+            if driver.route_version == 1:
+                # Another writer pops the head between our read and our write
+                other = Driver.objects.get(id=driver.id)
+                other.pop_route()
+            original(driver, edits)
+
+        with mock.patch('drivers.route_edits.apply_edits', racing_apply):
+            driver, attempts = edit_driver_route(self.driver.id, [{'op': INSERT, 'index': 0, 'lat': 12.9, 'lng': 77.5}])
+
+        self.assertEqual(attempts, 2)
+        stored = Driver.objects.get(id=self.driver.id)
+        self.assertEqual(stored.route_version, 3)
+        # Both writes survive: the pop and the insert on top of it
+        self.assertEqual(self.coords(stored), [(12.9, 77.5), (12.971, 77.59), (12.972, 77.59)])
+
+    def test_expected_version_conflict_is_not_retried(self):
+        def racing_apply(driver, edits):
+            Driver.objects.get(id=driver.id).pop_route()
+
+        with mock.patch('drivers.route_edits.apply_edits', racing_apply):
+            with self.assertRaises(RouteEditConflict) as raised:
+                edit_driver_route(self.driver.id, [], expected_version=1)
+
+        self.assertEqual((raised.exception.current_version, raised.exception.attempts), (2, 1))
@@ -0,0 +1,49 @@
+import math
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from drivers.proximity import haversine_meters
+from drivers.route_queue import NO_STATION, cumulative_meters, pack_route, unpack_route, waypoint
+
+
+class RouteQueueTests(SimpleTestCase):
+
+    def test_round_trip_keeps_coordinates_and_annotations(self):
+        route = [
+            {'lat': 12.97, 'lng': 77.59, 'station_id': 3, 'near_station_id': 3, 'near_station_m': 12.345},
+            {'lat': 12.98, 'lng': 77.6},
+        ]
+        records = unpack_route(pack_route(route).tobytes())
+
+        self.assertEqual(waypoint(records[0]), {
+            'lat': 12.97, 'lng': 77.59, 'station_id': 3, 'near_station_id': 3, 'near_station_m': 12.35
+        })
+        self.assertEqual(waypoint(records[1]), {
+            'lat': 12.98, 'lng': 77.6, 'station_id': None, 'near_station_id': None, 'near_station_m': None
+        })
+
+    def test_missing_annotations_are_stored_as_sentinels(self):
+        records = pack_route([{'lat': 1.0, 'lng': 2.0, 'station_id': None}])
+
+        self.assertEqual(records['station_id'][0], NO_STATION)
+        self.assertEqual(records['near_station_id'][0], NO_STATION)
+        self.assertTrue(math.isnan(records['near_station_m'][0]))
+
+    def test_unpack_empty_blob(self):
+        self.assertEqual(len(unpack_route(b'')), 0)
+
+    def test_unpack_does_not_copy(self):
+        blob = pack_route([{'lat': 1.0, 'lng': 2.0}]).tobytes()
+        records = unpack_route(blob)
+
+        self.assertFalse(records.flags.writeable)
+        self.assertFalse(records.flags.owndata)
+
+    def test_cumulative_meters_are_prefix_sums_of_the_legs(self):
+        records = pack_route([{'lat': 12.97 + i * 0.001, 'lng': 77.59} for i in range(4)])
+        cumulative = cumulative_meters(records)
+        leg = haversine_meters(12.97, 77.59, 12.971, 77.59)
+
+        self.assertEqual(cumulative[0], 0.0)
+        np.testing.assert_allclose(np.diff(cumulative), leg, rtol=1e-6)
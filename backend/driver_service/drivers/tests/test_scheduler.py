@@ -0,0 +1,67 @@
+from django.test import SimpleTestCase
+
+from drivers.clock import VirtualClock
+from drivers.scheduler import CATCH_UP, SKIP, TickScheduler
+
+
+def run_ticks(scheduler, clock, durations):
+    """Run one tick per duration; returns the clock time each tick started at"""
+    started = []
+    for duration in durations:
+        scheduler.wait()
+        started.append(clock.now())
+        clock.sleep(duration)
+        scheduler.tick_done()
+    return started
+
+
+class TickSchedulerTests(SimpleTestCase):
+
+    def scheduler(self, policy, max_catch_up=3):
+        clock = VirtualClock(tick_seconds=1.0)
+        return TickScheduler(1.0, policy, max_catch_up, now=clock.now, sleep=clock.sleep), clock
+
+    def test_ticks_follow_absolute_deadlines(self):
+        scheduler, clock = self.scheduler(CATCH_UP)
+
+        started = run_ticks(scheduler, clock, [0.25, 0.5, 0.75])
+
+        self.assertEqual(started, [0.0, 1.0, 2.0])
+        self.assertEqual(scheduler.skipped, 0)
+
+    def test_catch_up_runs_at_most_max_catch_up_missed_ticks(self):
+        scheduler, clock = self.scheduler(CATCH_UP, max_catch_up=3)
+
+        # Slots 1..10 are overdue when the first tick ends at 10.5
+        started = run_ticks(scheduler, clock, [10.5, 0, 0, 0, 0])
+
+        self.assertEqual(started, [0.0, 10.5, 10.5, 10.5, 11.0])
+        self.assertEqual(scheduler.skipped, 7)
+
+    def test_catch_up_within_the_limit_drops_nothing(self):
+        scheduler, clock = self.scheduler(CATCH_UP, max_catch_up=3)
+
+        started = run_ticks(scheduler, clock, [2.5, 0, 0, 0])
+
+        self.assertEqual(started, [0.0, 2.5, 2.5, 3.0])
+        self.assertEqual(scheduler.skipped, 0)
+
+    def test_skip_resumes_on_the_next_future_deadline(self):
+        scheduler, clock = self.scheduler(SKIP)
+
+        started = run_ticks(scheduler, clock, [10.5, 0])
+
+        self.assertEqual(started, [0.0, 11.0])
+        self.assertEqual(scheduler.skipped, 10)
+
+    def test_finishing_exactly_on_the_deadline_is_not_an_overrun(self):
+        scheduler, clock = self.scheduler(SKIP)
+
+        started = run_ticks(scheduler, clock, [1.0, 0])
+
+        self.assertEqual(started, [0.0, 1.0])
+        self.assertEqual(scheduler.skipped, 0)
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            TickScheduler(1.0, 'later')
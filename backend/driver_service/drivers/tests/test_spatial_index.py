@@ -0,0 +1,127 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from drivers import spatial_index
+from drivers.location_ingest import LocationIngestBuffer
+from drivers.models import Driver
+from drivers.spatial_index import DriverSpatialIndex
+from drivers.tests.helpers import route
+from drivers.write_behind import DriverWriteBehind
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class ChangeSeqTests(TestCase):
+
+    def seq(self, driver):
+        return Driver.objects.get(id=driver.id).change_seq
+
+    def test_every_writer_draws_a_higher_change_seq(self):
+        driver = Driver.objects.create(user_id=1, is_simulating=True)
+        seen = [self.seq(driver)]
+
+        driver.free_seats = 3
+        driver.save(update_fields=['free_seats'])
+        seen.append(self.seq(driver))
+
+        driver = Driver.objects.get(id=driver.id)
+        driver.route_queue = route((12.97, 77.59), (12.971, 77.59))
+        driver.save_route(*driver.dirty_route_fields())
+        seen.append(self.seq(driver))
+
+        writes = DriverWriteBehind()
+        driver.pop_route(save=False)
+        writes.mark(driver, 'route_head')
+        writes.flush()
+        seen.append(self.seq(driver))
+
+        ingest = LocationIngestBuffer()
+        ingest.add(driver.id, 12.98, 77.6, 1)
+        ingest.flush()
+        seen.append(self.seq(driver))
+
+        self.assertEqual(seen, sorted(set(seen)))
+        self.assertGreater(seen[0], 0)
+
+
+class SpatialIndexRefreshTests(TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(spatial_index, 'time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.drivers = [
+            Driver.objects.create(user_id=user_id, is_simulating=True, current_lat=12.97, current_lng=77.59)
+            for user_id in (1, 2, 3)
+        ]
+        self.index = DriverSpatialIndex(refresh_interval=1.0, change_overlap=3.0, delete_check_interval=2.0)
+        self.index.resync()
+
+    def advance(self, seconds):
+        self.clock.now += seconds
+
+    def move(self, driver, lat):
+        driver.current_lat = lat
+        driver.save(update_fields=['current_lat'])
+
+    def test_delta_reads_only_recent_changes(self):
+        for _ in range(4):
+            self.advance(1.0)
+            self.index.refresh()
+        applied = self.index.rows_applied
+
+        self.move(self.drivers[0], 12.99)
+        self.advance(1.0)
+        self.index.refresh()
+
+        self.assertEqual(self.index.rows_applied - applied, 1)
+        self.assertEqual(self.index.nearest(12.99, 77.59, k=1)[0]['driver_id'], self.drivers[0].id)
+
+    def test_late_commit_below_the_cursor_is_still_read(self):
+        for _ in range(4):
+            self.advance(1.0)
+            self.index.refresh()
+        self.move(self.drivers[0], 12.99)
+        self.move(self.drivers[2], 12.98)
+        self.advance(1.0)
+        self.index.refresh()
+        cursor = self.index._cursor
+
+        # A write that drew its change_seq before the newest one but committed after the read
+        late = self.drivers[1]
+        Driver.objects.filter(id=late.id).update(current_lat=12.90, change_seq=cursor - 1)
+        self.advance(1.0)
+        self.index.refresh()
+
+        entry = self.index.nearest(12.90, 77.59, k=1)[0]
+        self.assertEqual((entry['driver_id'], entry['lat']), (late.id, 12.90))
+
+    def test_deletes_are_checked_once_per_interval(self):
+        Driver.objects.filter(id=self.drivers[2].id).delete()
+        self.advance(1.0)
+        self.index.refresh()
+        self.assertEqual(len(self.index), 3)
+
+        self.advance(1.0)
+        self.index.refresh()
+        self.assertEqual(len(self.index), 2)
+        self.assertEqual(self.index.delete_checks, 1)
+        self.assertEqual(self.index.deletes_applied, 1)
+
+    def test_unchanged_table_costs_no_id_scan(self):
+        self.advance(2.0)
+        with mock.patch.object(Driver.objects, 'values_list', wraps=Driver.objects.values_list) as scan:
+            self.index.refresh()
+        self.assertEqual(self.index.delete_checks, 1)
+        self.assertEqual(self.index.deletes_applied, 0)
+        scan.assert_not_called()
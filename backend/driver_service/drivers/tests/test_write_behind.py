@@ -0,0 +1,111 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from drivers import route_annotations
+from drivers.models import Driver
+from drivers.route_annotations import RouteAnnotator
+from drivers.route_edits import INSERT, edit_driver_route
+from drivers.tests.helpers import FakeStationStub, route
+from drivers.write_behind import DriverWriteBehind
+
+
+class WriteBehindTests(TestCase):
+
+    def setUp(self):
+        self.drivers = []
+        for user_id in (1, 2, 3):
+            driver = Driver.objects.create(user_id=user_id, is_simulating=True)
+            driver.route_queue = route((12.97, 77.59), (12.971, 77.59), (12.972, 77.59))
+            driver.save_route(*driver.dirty_route_fields())
+            self.drivers.append(driver)
+        self.buffer = DriverWriteBehind(batch_size=2)
+
+    def test_flush_writes_marked_columns_and_bumps_versions(self):
+        for driver in self.drivers:
+            driver.pop_route(save=False)
+            driver.current_lat = 12.97
+            self.buffer.mark(driver, 'route_head', 'current_lat')
+
+        stats = self.buffer.flush()
+
+        self.assertEqual(stats['updated'], 3)
+        self.assertEqual(stats['conflicts'], 0)
+        for driver in self.drivers:
+            stored = Driver.objects.get(id=driver.id)
+            self.assertEqual((stored.route_head, stored.current_lat, stored.route_version), (1, 12.97, 2))
+            self.assertEqual(driver.route_version, 2)
+        self.assertEqual(len(self.buffer), 0)
+
+    def test_rows_edited_since_the_read_are_conflicts(self):
+        edited = Driver.objects.get(id=self.drivers[1].id)
+        edited.push_front_route({'lat': 12.9, 'lng': 77.5})
+        for driver in self.drivers:
+            driver.pop_route(save=False)
+            self.buffer.mark(driver, 'route_head')
+
+        stats = self.buffer.flush()
+
+        self.assertEqual(stats['updated'], 2)
+        self.assertEqual(stats['conflict_ids'], {edited.id})
+        stored = Driver.objects.get(id=edited.id)
+        self.assertEqual((stored.route_head, stored.route_version), (0, 2))
+        self.assertEqual(stored.peek_route()['lat'], 12.9)
+        # The in-memory copy keeps the version it read; the next tick reloads it
+        self.assertEqual(self.drivers[1].route_version, 1)
+
+    def test_rejected_reports_missing_and_unstamped_rows(self):
+        Driver.objects.filter(id=self.drivers[0].id).delete()
+        now = timezone.now()
+        self.buffer._conditional_update([self.drivers[1]], ['route_head'], now)
+
+        rejected = self.buffer._rejected(self.drivers, now)
+
+        self.assertEqual(rejected, {self.drivers[0].id, self.drivers[2].id})
+
+    def test_delete_is_compare_and_swap(self):
+        stale, current = self.drivers[0], self.drivers[1]
+        Driver.objects.get(id=stale.id).push_front_route({'lat': 12.9, 'lng': 77.5})
+        self.buffer.delete(stale)
+        self.buffer.delete(current)
+
+        stats = self.buffer.flush()
+
+        self.assertEqual(stats['deleted'], 1)
+        self.assertEqual(stats['conflict_ids'], {stale.id})
+        self.assertTrue(Driver.objects.filter(id=stale.id).exists())
+        self.assertFalse(Driver.objects.filter(id=current.id).exists())
+
+    def test_discard_forgets_pending_changes(self):
+        driver = self.drivers[0]
+        driver.pop_route(save=False)
+        self.buffer.mark(driver, 'route_head')
+        self.buffer.delete(self.drivers[1])
+        self.buffer.discard([driver.id, self.drivers[1].id])
+
+        self.assertEqual(len(self.buffer), 0)
+        self.buffer.flush()
+        self.assertEqual(Driver.objects.get(id=driver.id).route_head, 0)
+
+    def test_route_edit_committed_mid_tick_survives_the_flush(self):
+        annotator = RouteAnnotator(FakeStationStub())
+        with mock.patch.object(route_annotations, '_annotator', annotator):
+            # The tick moves every driver it loaded...
+            for driver in self.drivers:
+                driver.current_lat, driver.current_lng = driver.peek_route()['lat'], driver.peek_route()['lng']
+                driver.pop_route(save=False)
+                self.buffer.mark(driver, 'route_head', 'current_lat', 'current_lng')
+            # ...while matching pushes a pickup onto one of them
+            edited = self.drivers[0]
+            edit_driver_route(edited.id, [{'op': INSERT, 'index': 0, 'lat': 12.9, 'lng': 77.5}])
+
+            stats = self.buffer.flush()
+
+        self.assertEqual(stats['conflict_ids'], {edited.id})
+        stored = Driver.objects.get(id=edited.id)
+        self.assertEqual((stored.route_head, stored.route_version), (0, 2))
+        self.assertEqual([(coord['lat'], coord['lng']) for coord in stored.route_queue],
+                         [(12.9, 77.5), (12.97, 77.59), (12.971, 77.59), (12.972, 77.59)])
+        # The other drivers' moves were written
+        self.assertEqual(Driver.objects.get(id=self.drivers[1].id).route_head, 1)
@@ -1,11 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import DriverViewSet
+from .views import DriverViewSet, live_drivers
 
 router = DefaultRouter()
 router.register(r'drivers', DriverViewSet)
 
 urlpatterns = [
+    # Before the router, which would treat "live" as a driver pk
+    path('drivers/live/', live_drivers, name='drivers-live'),
     path('', include(router.urls)),
 ]
 
@@ -1,8 +1,74 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from .models import Driver
-from .serializers import DriverSerializer, CreateDriverSerializer
+from .models import Driver, ROUTE_GUARDED_FIELDS
+from .serializers import DriverSerializer, DriverStateSerializer, CreateDriverSerializer
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import Length
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .spatial_index import get_driver_index
+from .route_annotations import get_station
+from .live_feed import get_live_feed_hub
+from .driver_cache import cached_driver, cached_driver_by_user, get_driver_cache
+from .http_cache import etag_matches
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+import json
+import queue
+import time
+from datetime import timedelta, timezone as dt_timezone
+
+# Delta reads re-read this far behind a cursor (see DRIVER_INDEX_CURSOR_OVERLAP_SECONDS)
+CURSOR_OVERLAP = timedelta(seconds=settings.DRIVER_INDEX_CURSOR_OVERLAP_SECONDS)
+
+
+def sse_event(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+def live_drivers(request):
+    """
+    Server-Sent Events stream of live driver positions, fed by simulator tick
+    diffs (see drivers/live_feed.py). No database access per viewer.
+    
+    ?driver_ids=1,2,3                      only these drivers
+    ?bbox=min_lat,min_lng,max_lat,max_lng  only drivers inside the box
+    
+    Events: `snapshot` once, then `tick` with {drivers: [...], removed: [ids]}.
+    """
+    try:
+        driver_ids = [int(i) for i in request.GET.get('driver_ids', '').split(',') if i]
+        bbox = [float(v) for v in request.GET.get('bbox', '').split(',') if v] or None
+        if bbox is not None and len(bbox) != 4:
+            raise ValueError
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'message': 'driver_ids must be integers and bbox must be min_lat,min_lng,max_lat,max_lng'
+        }, status=400)
+    
+    hub = get_live_feed_hub()
+    subscription, snapshot = hub.subscribe(driver_ids or None, bbox)
+    
+    def stream():
+        try:
+            yield sse_event(snapshot)
+            while True:
+                try:
+                    event = subscription.events.get(timeout=settings.LIVE_FEED_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield sse_event(event)
+        finally:
+            hub.unsubscribe(subscription)
+    
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 class DriverViewSet(viewsets.ModelViewSet):
@@ -28,18 +94,47 @@ class DriverViewSet(viewsets.ModelViewSet):
     
     def retrieve(self, request, pk=None):
         try:
-            driver = Driver.objects.get(pk=pk)
+            driver = cached_driver(int(pk))
             serializer = DriverSerializer(driver)
             return Response({
                 'success': True,
                 'driver': serializer.data
             })
-        except Driver.DoesNotExist:
+        except (Driver.DoesNotExist, ValueError):
             return Response({
                 'success': False,
                 'message': 'Driver not found'
             }, status=status.HTTP_404_NOT_FOUND)
     
+    def perform_update(self, serializer):
+        """
+        PUT/PATCH: write only the fields sent, so the rest of the row (route
+        cursor, position written by the simulator) is not overwritten.
+        Route/match fields are a compare-and-swap on route_version.
+        """
+        driver = serializer.instance
+        fields = list(serializer.validated_data)
+        if not set(fields) & set(ROUTE_GUARDED_FIELDS):
+            for field, value in serializer.validated_data.items():
+                setattr(driver, field, value)
+            driver.save(update_fields=fields + ['updated_at'])
+            return
+        for _ in range(settings.ROUTE_EDIT_MAX_ATTEMPTS):
+            for field, value in serializer.validated_data.items():
+                setattr(driver, field, value)
+            if driver.save_route(*fields):
+                return
+            driver.refresh_from_db()
+        raise ValidationError({'route_version': 'Driver route changed concurrently, retry'})
+    
+    @action(detail=False, methods=['get'])
+    def cache_stats(self, request):
+        """Hit/miss/eviction counters of this process's driver cache"""
+        return Response({
+            'success': True,
+            'cache': get_driver_cache().stats()
+        })
+    
     @action(detail=False, methods=['get'])
     def by_user(self, request):
         user_id = request.query_params.get('user_id')
@@ -50,7 +145,7 @@ class DriverViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            driver = Driver.objects.get(user_id=user_id)
+            driver = cached_driver_by_user(int(user_id))
             serializer = DriverSerializer(driver)
             return Response({
                 'success': True,
@@ -67,7 +162,7 @@ class DriverViewSet(viewsets.ModelViewSet):
         try:
             driver = Driver.objects.get(pk=pk)
             driver.is_simulating = True
-            driver.save()
+            driver.save(update_fields=['is_simulating', 'updated_at'])
             return Response({
                 'success': True,
                 'message': 'Simulation started'
@@ -83,7 +178,7 @@ class DriverViewSet(viewsets.ModelViewSet):
         try:
             driver = Driver.objects.get(pk=pk)
             driver.is_simulating = False
-            driver.save()
+            driver.save(update_fields=['is_simulating', 'updated_at'])
             return Response({
                 'success': True,
                 'message': 'Simulation stopped'
@@ -96,11 +191,136 @@ class DriverViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def active_drivers(self, request):
-        drivers = Driver.objects.filter(is_simulating=True)
-        serializer = DriverSerializer(drivers, many=True)
+        """
+        Simulating drivers, optionally as a delta feed.
+        
+        ?include_routes=false  omit route_queue (route_length is sent instead)
+        ?updated_since=<cursor> only drivers changed since a previous response's
+                               `cursor`, plus `removed_ids` (stopped since the
+                               cursor) and `active_ids` (every simulating id)
+                               so the client can drop drivers that are gone
+        ?active_set=<token>    the `active_set` of that previous response;
+                               `active_ids` is only sent when it changed
+        
+        Responses carry an ETag built from the active set's size and latest
+        update; a matching If-None-Match gets 304 Not Modified.
+        """
+        include_routes = request.query_params.get('include_routes', 'true').lower() != 'false'
+        updated_since = request.query_params.get('updated_since')
+        since = None
+        if updated_since:
+            since = parse_datetime(updated_since)
+            if since is None:
+                return Response({
+                    'success': False,
+                    'message': 'updated_since must be a cursor from a previous response'
+                }, status=status.HTTP_400_BAD_REQUEST)
+        
+        active = Driver.objects.filter(is_simulating=True)
+        state = active.aggregate(latest=Max('updated_at'), count=Count('id'), id_sum=Sum('id'))
+        latest = state['latest']
+        # Size and id sum of the active set: equal tokens mean the same drivers
+        active_set = f'{state["count"]}-{state["id_sum"] or 0}'
+        etag = (f'"drivers-{active_set}-{latest.timestamp() if latest else 0}-'
+                f'{int(include_routes)}-{updated_since or ""}"')
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        
+        drivers = active
+        if since is not None:
+            # Overlap so rows committed slightly out of timestamp order aren't missed
+            drivers = drivers.filter(updated_at__gte=since - CURSOR_OVERLAP)
+        if include_routes:
+            data = DriverSerializer(drivers, many=True).data
+        else:
+            drivers = drivers.defer('route_blob', 'route_cumdist', 'route_queue_json').annotate(route_bytes=Length('route_blob'))
+            data = DriverStateSerializer(drivers, many=True).data
+        
+        body = {
+            'success': True,
+            'drivers': data,
+            'count': len(data),
+            # UTC with a Z suffix so the cursor survives unencoded query strings
+            'cursor': (latest or since or timezone.now()).astimezone(dt_timezone.utc).isoformat().replace('+00:00', 'Z'),
+            'active_set': active_set
+        }
+        if since is not None:
+            if request.query_params.get('active_set') != active_set:
+                body['active_ids'] = list(active.values_list('id', flat=True))
+            body['removed_ids'] = list(
+                Driver.objects.filter(is_simulating=False, updated_at__gte=since - CURSOR_OVERLAP)
+                .values_list('id', flat=True)
+            )
+        return Response(body, headers=headers)
+
+    
+    @action(detail=False, methods=['get'])
+    def nearest_available(self, request):
+        """
+        k nearest available drivers to ?lat=&lng= or ?station_id=
+        Optional: k (5), min_free_seats (1), include_matched (false), max_distance_m
+        """
+        params = request.query_params
+        try:
+            if params.get('station_id'):
+                station = get_station(int(params['station_id']))
+                if station is None:
+                    return Response({
+                        'success': False,
+                        'message': 'Station not found'
+                    }, status=status.HTTP_404_NOT_FOUND)
+                lat, lng = station['lat'], station['lng']
+            else:
+                lat, lng = float(params['lat']), float(params['lng'])
+            k = int(params.get('k', 5))
+            min_free_seats = int(params.get('min_free_seats', 1))
+            max_meters = float(params['max_distance_m']) if params.get('max_distance_m') else None
+        except (KeyError, ValueError):
+            return Response({
+                'success': False,
+                'message': 'lat and lng (or station_id) are required; k, min_free_seats and max_distance_m must be numbers'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        started = time.perf_counter()
+        drivers = get_driver_index().nearest(
+            lat, lng, k=k, min_free_seats=min_free_seats,
+            include_matched=params.get('include_matched', 'false').lower() == 'true',
+            max_meters=max_meters
+        )
         return Response({
             'success': True,
-            'drivers': serializer.data,
-            'count': drivers.count()
+            'drivers': drivers,
+            'count': len(drivers),
+            'query_ms': (time.perf_counter() - started) * 1000.0
+        })
+    
+    @action(detail=False, methods=['get'])
+    def in_bounds(self, request):
+        """
+        Simulating drivers inside ?min_lat=&min_lng=&max_lat=&max_lng= (map viewport)
+        Optional: limit (1000), available_only (false), min_free_seats (1)
+        """
+        params = request.query_params
+        try:
+            bounds = [float(params[key]) for key in ('min_lat', 'min_lng', 'max_lat', 'max_lng')]
+            limit = int(params.get('limit', 1000))
+            min_free_seats = int(params.get('min_free_seats', 1))
+        except (KeyError, ValueError):
+            return Response({
+                'success': False,
+                'message': 'min_lat, min_lng, max_lat and max_lng are required numbers'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        started = time.perf_counter()
+        drivers = get_driver_index().within_bounds(
+            *bounds, limit=limit,
+            available_only=params.get('available_only', 'false').lower() == 'true',
+            min_free_seats=min_free_seats
+        )
+        return Response({
+            'success': True,
+            'drivers': drivers,
+            'count': len(drivers),
+            'query_ms': (time.perf_counter() - started) * 1000.0
         })
-
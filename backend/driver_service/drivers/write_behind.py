@@ -0,0 +1,164 @@
+"""
+Write-behind buffer for driver state changed during a simulation tick.
+
+The simulator marks which columns of which drivers changed and flushes once
+per tick: drivers are grouped by their set of dirty columns and each group is
+written with a single bulk UPDATE touching only those columns, and finished
+drivers are removed with a single DELETE.
+
+Every write is a compare-and-swap on Driver.route_version: a row is updated
+(and its version bumped) or deleted only if its version still matches the one
+the simulator read at the start of the tick. Drivers edited concurrently (e.g.
+matching pushed a station) are left untouched and reported as conflicts; the
+next tick reloads them.
+"""
+
+import time
+
+from django.db import connection, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .driver_cache import invalidate_drivers
+from .models import Driver, NextChangeSeq
+
+
+class DriverWriteBehind:
+
+    def __init__(self, batch_size=2000):
+        self.batch_size = batch_size
+        self._dirty = {}       # driver id -> (driver, set of field names)
+        self._deleted = {}     # driver id -> driver
+
+        self.last_flush = {}
+        self.total_rows = 0
+        self.total_conflicts = 0
+        self.total_flushes = 0
+
+    def mark(self, driver, *fields):
+        """Record that `fields` of `driver` changed and must be persisted"""
+        if driver.id in self._deleted:
+            return
+        _, dirty_fields = self._dirty.setdefault(driver.id, (driver, set()))
+        dirty_fields.update(fields)
+
+    def delete(self, driver):
+        self._dirty.pop(driver.id, None)
+        self._deleted[driver.id] = driver
+
+    def discard(self, driver_ids):
+        """Forget pending changes of these drivers without writing them"""
+        for driver_id in driver_ids:
+            self._dirty.pop(driver_id, None)
+            self._deleted.pop(driver_id, None)
+
+    def pending_drivers(self):
+        """Drivers with unflushed changes (before flush())"""
+        return [driver for driver, _ in self._dirty.values()]
+
+    def pending_deletes(self):
+        return list(self._deleted)
+
+    def __len__(self):
+        return len(self._dirty) + len(self._deleted)
+
+    def _expected_version(self, drivers):
+        """route_version = <version read by the simulator>, per row"""
+        return Case(
+            *[When(id=driver.id, then=Value(driver.route_version)) for driver in drivers],
+            output_field=Driver._meta.get_field('route_version')
+        )
+
+    def _conditional_update(self, drivers, fields, now):
+        """One UPDATE for a batch, skipping rows whose route_version moved; returns rows written"""
+        values = {}
+        for name in fields:
+            field = Driver._meta.get_field(name)
+            case = Case(
+                *[When(id=driver.id, then=Value(getattr(driver, field.attname), output_field=field))
+                  for driver in drivers],
+                output_field=field
+            )
+            if connection.features.requires_casted_case_in_updates:
+                case = Cast(case, output_field=field)
+            values[field.attname] = case
+        return Driver.objects.filter(
+            id__in=[driver.id for driver in drivers],
+            route_version=self._expected_version(drivers)
+        ).update(route_version=F('route_version') + 1, updated_at=now, change_seq=NextChangeSeq(), **values)
+
+    def _rejected(self, drivers, now):
+        """
+        Ids of drivers whose write did not apply: the row is gone, or it does
+        not carry our version bump and updated_at stamp (a concurrent edit
+        also bumps the version by one, but stamps its own time).
+        """
+        rows = Driver.objects.filter(id__in=[driver.id for driver in drivers]).values_list(
+            'id', 'route_version', 'updated_at'
+        )
+        written = {driver_id: (version, updated_at) for driver_id, version, updated_at in rows}
+        return {
+            driver.id for driver in drivers
+            if written.get(driver.id) != (driver.route_version + 1, now)
+        }
+
+    def flush(self):
+        """Persist everything marked since the last flush; returns the flush stats"""
+        started = time.perf_counter()
+
+        groups = {}
+        for driver, fields in self._dirty.values():
+            groups.setdefault(frozenset(fields), []).append(driver)
+        deleted = list(self._deleted.values())
+
+        statements = 0
+        updated = 0
+        deleted_rows = 0
+        conflicts = set()
+        if groups or deleted:
+            now = timezone.now()
+            with transaction.atomic():
+                for fields, drivers in groups.items():
+                    for start in range(0, len(drivers), self.batch_size):
+                        batch = drivers[start:start + self.batch_size]
+                        written = self._conditional_update(batch, sorted(fields), now)
+                        statements += 1
+                        if written < len(batch):
+                            conflicts |= self._rejected(batch, now)
+                            statements += 1
+                        for driver in batch:
+                            if driver.id not in conflicts:
+                                driver.route_version += 1
+                                driver.updated_at = now
+                        updated += written
+                if deleted:
+                    deleted_rows, _ = Driver.objects.filter(
+                        id__in=[driver.id for driver in deleted],
+                        route_version=self._expected_version(deleted)
+                    ).delete()
+                    statements += 1
+                    if deleted_rows < len(deleted):
+                        remaining = set(
+                            Driver.objects.filter(id__in=[driver.id for driver in deleted])
+                            .values_list('id', flat=True)
+                        )
+                        conflicts |= remaining
+                        statements += 1
+            invalidate_drivers(*self._dirty, *self._deleted)
+
+        self.last_flush = {
+            'updated': updated,
+            'deleted': deleted_rows,
+            'conflicts': len(conflicts),
+            'conflict_ids': conflicts,
+            'statements': statements,
+            'ms': (time.perf_counter() - started) * 1000.0
+        }
+        self.total_rows += updated + deleted_rows
+        self.total_conflicts += len(conflicts)
+        self.total_flushes += 1
+
+        self._dirty = {}
+        self._deleted = {}
+        return self.last_flush
@@ -12,11 +12,10 @@ It follows the exact trace specified:
 import os
 import sys
 import time
-import json
+import argparse
+import multiprocessing
 import django
 import grpc
-import pika
-import requests
 from datetime import datetime, timedelta
 
 print("[SIMULATOR] ===== STARTING DRIVER SIMULATOR =====", flush=True)
@@ -29,41 +28,107 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'driver_service.settings')
 django.setup()
 print("[SIMULATOR] Django setup complete!", flush=True)
 
-from drivers.models import Driver
+from drivers.models import Driver, NextChangeSeq
+from drivers.route_annotations import RouteAnnotator
+from drivers.sharding import ShardCoordinator, leased_partitions
+from drivers.publisher import RabbitMQPublisher
+from drivers.side_effects import TripSideEffects
+from drivers.write_behind import DriverWriteBehind
+from drivers.live_feed import driver_state
+from drivers.scheduler import TickScheduler
+from drivers.clock import WallClock, VirtualClock, parse_hhmm
 from django.conf import settings
+from django.db import connections
+from django.utils import timezone
 print("[SIMULATOR] Django models imported!", flush=True)
 
 # Import proto files
 print("[SIMULATOR] Importing proto files...", flush=True)
 sys.path.insert(0, os.path.dirname(__file__))
-from proto_generated import location_pb2, location_pb2_grpc
-from proto_generated import station_pb2, station_pb2_grpc
+from proto_generated import station_pb2_grpc
 print("[SIMULATOR] Proto files imported!", flush=True)
 
 
 class SimulationWorker:
     
-    def __init__(self):
+    def __init__(self, shard=None, clock=None, dry_run=False):
         self.rabbitmq_url = settings.RABBITMQ_URL
-        self.location_service_host = settings.LOCATION_SERVICE_HOST
-        self.location_service_port = settings.LOCATION_SERVICE_PORT
         self.station_service_host = settings.STATION_SERVICE_HOST
         self.station_service_port = settings.STATION_SERVICE_PORT
         
         # Setup gRPC clients
         self.setup_grpc_clients()
         
-        print("[SIMULATOR] Worker initialized (RabbitMQ: fresh connection per publish)")
+        # Cached station snapshot + in-process index. Routes carry precomputed
+        # per-waypoint station annotations, so ticks only re-annotate drivers
+        # whose annotations predate the current station version.
+        self.annotator = RouteAnnotator(
+            self.station_stub,
+            threshold_meters=settings.SIMULATOR_PROXIMITY_METERS
+        )
+        self.station_cache = self.annotator.cache
+        
+        # Optional lease-based partition ownership (sharded mode)
+        self.shard = shard
+        self.last_tick_ms = 0.0
+        self.last_tick_drivers = 0
+        self.last_annotation_ms = 0.0
+        self.last_annotated_waypoints = 0
+        
+        # Fixed-rate ticks that compensate for processing time; a VirtualClock
+        # makes them run back-to-back (fast-forward mode)
+        self.clock = clock or WallClock()
+        self.scheduler = TickScheduler(
+            interval=settings.SIMULATOR_TICK_SECONDS,
+            overrun_policy=settings.SIMULATOR_OVERRUN_POLICY,
+            max_catch_up=settings.SIMULATOR_MAX_CATCH_UP,
+            now=self.clock.now,
+            sleep=self.clock.sleep
+        )
+        
+        # dry_run: no RabbitMQ publishes and no Trip Service calls, events are only counted
+        self.dry_run = dry_run
+        self.counters = {
+            'moves': 0,
+            'proximity_events': 0,
+            'matches': 0,          # drivers that reached the station they were matched to
+            'pickups': 0,
+            'trips_completed': 0,  # routes finished (active trips get completed)
+            'write_conflicts': 0,  # driver writes dropped because the route was edited concurrently
+            'annotated_waypoints': 0,
+            'annotation_ms': 0.0   # time spent re-annotating routes (station proximity queries)
+        }
+        
+        # Driver state changes are buffered and written once per tick, as
+        # compare-and-swap on route_version so concurrent route edits win
+        self.writes = DriverWriteBehind(batch_size=settings.SIMULATOR_FLUSH_BATCH_SIZE)
+        # (call, driver id) Trip Service calls, sent once the tick's writes are in
+        self.trip_calls = []
+        
+        # One long-lived RabbitMQ connection with publisher confirms
+        # (also carries the per-tick live position diff on a fanout exchange)
+        self.publisher = RabbitMQPublisher(
+            self.rabbitmq_url, fanout_exchanges=[settings.LIVE_FEED_EXCHANGE],
+            max_pending=settings.SIMULATOR_PUBLISH_MAX_PENDING
+        )
+        if not self.dry_run:
+            self.publisher.start()
+        
+        # Trip Service calls run concurrently on an asyncio loop with a pooled HTTP client
+        self.trip_effects = TripSideEffects(
+            settings.TRIP_SERVICE_HOST, settings.TRIP_SERVICE_PORT,
+            concurrency=settings.SIMULATOR_IO_CONCURRENCY,
+            timeout=settings.SIMULATOR_IO_TIMEOUT_SECONDS
+        )
+        if not self.dry_run:
+            self.trip_effects.start()
+        
+        print("[SIMULATOR] Worker initialized (RabbitMQ: persistent publisher, per-tick flush; "
+              f"Trip Service: async, {settings.SIMULATOR_IO_CONCURRENCY} concurrent calls)")
     
     def setup_grpc_clients(self):
-        """Setup gRPC clients for Location and Station services"""
+        """Setup the Station Service gRPC client (proximity is computed in-process)"""
         try:
-            # Location Service
-            location_address = f"{self.location_service_host}:{self.location_service_port}"
-            location_channel = grpc.insecure_channel(location_address)
-            self.location_stub = location_pb2_grpc.LocationServiceStub(location_channel)
-            
-            # Station Service
             station_address = f"{self.station_service_host}:{self.station_service_port}"
             station_channel = grpc.insecure_channel(station_address)
             self.station_stub = station_pb2_grpc.StationServiceStub(station_channel)
@@ -71,174 +136,151 @@ class SimulationWorker:
             print("[SIMULATOR] gRPC clients initialized")
         except Exception as e:
             print(f"[SIMULATOR] gRPC client setup failed: {e}")
-            self.location_stub = None
             self.station_stub = None
     
-    def get_all_stations(self):
-        """Fetch all stations from Station Service"""
-        try:
-            request = station_pb2.ListStationsRequest(limit=1000, offset=0)
-            response = self.station_stub.ListStations(request)
-            
-            stations = []
-            for station in response.stations:
-                stations.append({
-                    'id': station.station_id,
-                    'name': station.name,
-                    'lat': station.latitude,
-                    'lng': station.longitude
-                })
-            
-            return stations
-        except Exception as e:
-            print(f"[SIMULATOR] Failed to fetch stations: {e}")
-            return []
-    
-    def is_near_station(self, driver_lat, driver_lng, station_lat, station_lng):
-        """Check if driver is near a station (within 100m)"""
-        try:
-            request = location_pb2.ProximityRequest(
-                lat1=driver_lat,
-                lng1=driver_lng,
-                lat2=station_lat,
-                lng2=station_lng,
-                threshold_meters=100.0
-            )
-            response = self.location_stub.IsNearby(request)
-            return response.is_nearby, response.distance_meters
-        except Exception as e:
-            print(f"[SIMULATOR] Location check failed: {e}")
-            return False, -1.0
+    def sync_stations(self):
+        """
+        Refresh the cached station snapshot and rebuild the proximity index
+        only when the Station Service reports a new version.
+        """
+        if self.annotator.refresh():
+            print(f"[SIMULATOR] Stations changed (version {self.annotator.previous_version} -> "
+                  f"{self.annotator.version}, {len(self.annotator.changed_ids)} station(s)), "
+                  f"index rebuilt in {self.annotator.engine.last_timings['load_ms']:.1f}ms", flush=True)
     
-    def is_coordinate_a_station(self, coord, stations):
-        """Check if a coordinate matches any station"""
-        # First, simple Euclidian distance check locally to save gRPC calls
-        # and handle floating point jitter better
-        
-        for station in stations:
-            # Simple approx distance check (lat/lng degrees)
-            # 0.0001 deg is approx 11 meters
-            lat_diff = abs(coord['lat'] - station['lat'])
-            lng_diff = abs(coord['lng'] - station['lng'])
-            
-            if lat_diff < 0.0005 and lng_diff < 0.0005:  # ~50m threshold
-                return True, station
-        return False, None
+    def refresh_route_annotations(self, drivers):
+        """Re-annotate routes computed against an older station version (or never annotated)"""
+        started = time.perf_counter()
+        annotated_before = self.annotator.waypoints_annotated
+        updated = self.annotator.reannotate(drivers)
+        self.last_annotation_ms = (time.perf_counter() - started) * 1000.0
+        self.last_annotated_waypoints = self.annotator.waypoints_annotated - annotated_before
+        self.counters['annotation_ms'] += self.last_annotation_ms
+        self.counters['annotated_waypoints'] += self.last_annotated_waypoints
+        for driver in updated:
+            self.writes.mark(driver, *driver.dirty_route_fields(), 'route_station_version')
+        if updated:
+            stats = self.annotator.stats()
+            print(f"[SIMULATOR] Re-annotated {len(updated)} route(s) for station version "
+                  f"{stats['version']} (total full {stats['full']}, incremental {stats['incremental']}, "
+                  f"{stats['waypoints']} waypoints)", flush=True)
     
     def complete_driver_trips(self, driver_id):
-        """Complete all active trips for a driver when they reach destination"""
-        try:
-            trip_host = os.environ.get('TRIP_SERVICE_HOST', 'localhost')
-            trip_port = os.environ.get('TRIP_SERVICE_PORT', '8008')
-            headers = {'Host': 'localhost'}  # trip_service host has underscore; force safe Host
-            
-            # Get active trips for this driver
-            url = f"http://{trip_host}:{trip_port}/api/trips/by_driver/?driver_id={driver_id}"
-            response = requests.get(url, headers=headers, timeout=3)
-            
-            if response.status_code == 200:
-                trips = response.json()
-                
-                # Complete all ACTIVE or SCHEDULED trips
-                for trip in trips:
-                    trip_status = trip.get('status')
-                    if trip_status in ['ACTIVE', 'SCHEDULED']:
-                        trip_id = trip['id']
-                        
-                        # If SCHEDULED, start it first to follow state machine
-                        if trip_status == 'SCHEDULED':
-                            print(f"[SIMULATOR] Trip {trip_id} is SCHEDULED. Starting it before completion...")
-                            start_url = f"http://{trip_host}:{trip_port}/api/trips/{trip_id}/start/"
-                            requests.post(start_url, headers=headers, timeout=3)
-                            
-                        complete_url = f"http://{trip_host}:{trip_port}/api/trips/{trip_id}/complete/"
-                        
-                        complete_response = requests.post(complete_url, headers=headers, timeout=3)
-                        
-                        if complete_response.status_code == 200:
-                            print(f"[SIMULATOR] ✅ Trip {trip_id} completed for driver {driver_id}")
-                        else:
-                            print(f"[SIMULATOR] ⚠️ Failed to complete trip {trip_id}: {complete_response.status_code} - {complete_response.text}")
-            else:
-                print(f"[SIMULATOR] ⚠️ Failed to fetch trips for driver {driver_id}: {response.status_code} - {response.text}")
-                
-        except Exception as e:
-            print(f"[SIMULATOR] ❌ Error completing trips for driver {driver_id}: {e}", flush=True)
+        """Queue completion of all active trips for a driver (runs on the I/O loop)"""
+        self.trip_effects.complete_trips(driver_id)
     
     def start_driver_trips(self, driver_id):
-        """Start all SCHEDULED trips for a driver (when they pick up rider)"""
-        try:
-            trip_host = os.environ.get('TRIP_SERVICE_HOST', 'localhost')
-            trip_port = os.environ.get('TRIP_SERVICE_PORT', '8008')
-            headers = {'Host': 'localhost'}
-            
-            # Get active trips for this driver
-            url = f"http://{trip_host}:{trip_port}/api/trips/by_driver/?driver_id={driver_id}"
-            response = requests.get(url, headers=headers, timeout=3)
-            
-            if response.status_code == 200:
-                trips = response.json()
-                
-                # Start all SCHEDULED trips
-                for trip in trips:
-                    if trip.get('status') == 'SCHEDULED':
-                        trip_id = trip['id']
-                        start_url = f"http://{trip_host}:{trip_port}/api/trips/{trip_id}/start/"
-                        
-                        start_response = requests.post(start_url, headers=headers, timeout=3)
-                        
-                        if start_response.status_code == 200:
-                            print(f"[SIMULATOR] ✅ Trip {trip_id} STARTED for driver {driver_id}")
-                        else:
-                            print(f"[SIMULATOR] ⚠️ Failed to start trip {trip_id}: {start_response.status_code} - {start_response.text}")
-            else:
-                print(f"[SIMULATOR] ⚠️ Failed to fetch trips (start phase) for driver {driver_id}: {response.status_code} - {response.text}")
-                
-        except Exception as e:
-            print(f"[SIMULATOR] ❌ Error starting trips for driver {driver_id}: {e}", flush=True)
+        """Queue start of all SCHEDULED trips for a driver (runs on the I/O loop)"""
+        self.trip_effects.start_trips(driver_id)
+    
+    def dispatch_trip_calls(self, conflicts):
+        """
+        Send the Trip Service calls decided this tick, except for drivers whose
+        write lost to a concurrent route edit (the tick is redone for them next time).
+        """
+        calls, self.trip_calls = self.trip_calls, []
+        if self.dry_run:
+            return
+        for call, driver_id in calls:
+            if driver_id not in conflicts:
+                call(driver_id)
     
     def publish_to_matching_queue(self, driver, nearby_station):
-        """Publish driver location to RabbitMQ matching queue"""
-        try:
-            # Create fresh connection for each publish (like your reference code)
-            connection = pika.BlockingConnection(pika.URLParameters(self.rabbitmq_url))
-            channel = connection.channel()
-            
-            # Declare queue (idempotent)
-            channel.queue_declare(queue='matching_queue', durable=True)
-            
-            message = {
-                'driver_id': driver.id,
-                'user_id': driver.user_id,
-                'nearby_station_id': nearby_station['id'],
-                'nearby_station_name': nearby_station['name'],
-                'current_lat': driver.current_lat,
-                'current_lng': driver.current_lng,
-                'timestamp': driver.sim_timestamp,
-                'free_seats': driver.free_seats,
-                'destination_lat': driver.current_lat,
-                'destination_lng': driver.current_lng
-            }
-            
-            channel.basic_publish(
-                exchange='',
-                routing_key='matching_queue',
-                body=json.dumps(message),
-                properties=pika.BasicProperties(
-                    delivery_mode=2,  # Make message persistent
-                )
-            )
-            
-            # Close connection after publishing (like your reference code)
-            connection.close()
-            
-            print(f"[SIMULATOR] Published to queue: Driver {driver.id} near Station {nearby_station['id']}")
-            return True
-        except Exception as e:
-            print(f"[SIMULATOR] Failed to publish to queue: {e}")
-            import traceback
-            traceback.print_exc()
-            return False
+        """Buffer a matching request; the whole tick is flushed at once by flush_publisher()"""
+        message = {
+            'driver_id': driver.id,
+            'user_id': driver.user_id,
+            'nearby_station_id': nearby_station['id'],
+            'nearby_station_name': nearby_station['name'],
+            'current_lat': driver.current_lat,
+            'current_lng': driver.current_lng,
+            'timestamp': driver.sim_timestamp,
+            'free_seats': driver.free_seats,
+            'destination_lat': driver.current_lat,
+            'destination_lng': driver.current_lng
+        }
+        self.counters['proximity_events'] += 1
+        if self.dry_run:
+            return
+        self.publisher.publish(message)
+        print(f"[SIMULATOR] Queued for publish: Driver {driver.id} near Station {nearby_station['id']}")
+    
+    def flush_writes(self):
+        """
+        Persist all driver changes from this tick in one batched flush.
+        Returns the ids of drivers whose write was rejected by a concurrent edit.
+        """
+        flush = self.writes.flush()
+        self.counters['write_conflicts'] += flush['conflicts']
+        if flush['updated'] or flush['deleted'] or flush['conflicts']:
+            print(f"[SIMULATOR] Flushed {flush['updated']} updated / {flush['deleted']} deleted "
+                  f"driver(s) in {flush['statements']} statement(s), {flush['ms']:.1f}ms", flush=True)
+        if flush['conflicts']:
+            print(f"[SIMULATOR] {flush['conflicts']} driver(s) edited concurrently, "
+                  f"skipped this tick: {sorted(flush['conflict_ids'])}", flush=True)
+        return flush['conflict_ids']
+    
+    def drop_lost_partitions(self):
+        """
+        Sharded mode: renew our leases before writing. Drivers in partitions
+        taken over by another worker during this tick are not written (the
+        new owner simulates them); returns their ids.
+        """
+        if not self.shard:
+            return set()
+        lost = set(self.shard.renew())
+        if not lost:
+            return set()
+        dropped = {
+            driver_id for driver_id in [driver.id for driver in self.writes.pending_drivers()]
+            + self.writes.pending_deletes()
+            if self.shard.partition_of(driver_id) in lost
+        }
+        self.writes.discard(dropped)
+        print(f"[SHARD {self.shard.worker_id}] Dropped this tick's writes for {len(dropped)} driver(s)", flush=True)
+        return dropped
+    
+    def publish_live_diff(self, changed, removed):
+        """Publish this tick's driver changes for live dashboards (one message per tick)"""
+        if self.dry_run or (not changed and not removed):
+            return
+        self.publisher.publish({
+            'type': 'tick',
+            'tick': self.scheduler.ticks + 1,
+            'worker': self.shard.worker_id if self.shard else None,
+            'drivers': [driver_state(driver) for driver in changed],
+            'removed': removed
+        }, routing_key='', exchange=settings.LIVE_FEED_EXCHANGE, transient=True)
+    
+    def flush_publisher(self):
+        """Send this tick's matching requests in one batch and report publisher counters"""
+        if self.dry_run:
+            return
+        flushed = self.publisher.flush()
+        stats = self.publisher.stats()
+        if flushed or stats['pending'] or stats['unconfirmed']:
+            print(f"[SIMULATOR] Publisher: flushed {flushed} | published {stats['published']} "
+                  f"confirmed {stats['confirmed']} nacked {stats['nacked']} "
+                  f"pending {stats['pending']} unconfirmed {stats['unconfirmed']} dropped {stats['dropped']} "
+                  f"({stats['confirmed_per_sec']:.1f} confirms/s) | "
+                  f"confirm latency avg {stats['confirm_latency_ms_avg']:.1f}ms "
+                  f"max {stats['confirm_latency_ms_max']:.1f}ms", flush=True)
+    
+    def wait_side_effects(self):
+        """
+        Give this tick's Trip Service calls a bounded amount of time to finish;
+        slower ones keep running in the background instead of stalling the tick.
+        """
+        if self.dry_run:
+            return
+        started = time.perf_counter()
+        finished, running = self.trip_effects.wait_for_batch(settings.SIMULATOR_IO_WAIT_SECONDS)
+        if finished or running:
+            stats = self.trip_effects.stats()
+            print(f"[SIMULATOR] Trip calls: {finished} finished, {running} still running "
+                  f"(waited {(time.perf_counter() - started) * 1000.0:.1f}ms) | "
+                  f"ok {stats['succeeded']} failed {stats['failed']} in flight {stats['in_flight']} | "
+                  f"latency avg {stats['latency_ms_avg']:.1f}ms max {stats['latency_ms_max']:.1f}ms", flush=True)
     
     def increment_sim_time(self, current_time_str):
         """Increment simulation time by 1 minute"""
@@ -255,7 +297,7 @@ class SimulationWorker:
         except:
             return "10:00"
     
-    def simulate_driver_tick(self, driver, stations):
+    def simulate_driver_tick(self, driver):
         """
         Simulate one tick for a driver following the Golden Logic:
         
@@ -268,8 +310,11 @@ class SimulationWorker:
         3. If head is NOT a station:
            - Pop coordinate
            - Update current_location
-           - Check proximity to any station
-           - If NEAR station: Publish to RabbitMQ
+           - Return the waypoint so the tick can publish proximity events
+             for all moved drivers from their annotations (see check_proximity)
+        
+        Station checks read the waypoint annotations (station_id,
+        near_station_id) precomputed when the route was set.
         """
         
         next_coord = driver.peek_route()
@@ -279,94 +324,153 @@ class SimulationWorker:
             print(f"[SIMULATOR] Driver {driver.id} - Route complete!")
             
             # Complete any active trips for this driver
-            self.complete_driver_trips(driver.id)
+            self.counters['trips_completed'] += 1
+            self.trip_calls.append((self.complete_driver_trips, driver.id))
             
-            driver.is_simulating = False
-            driver.save()
-            print(f"[SIMULATOR] Driver {driver.id} - Simulation stopped")
-            driver.delete()
-            print(f"[SIMULATOR] Driver {driver.id} - Deleted successfully")
-            return
+            # Stop simulating and delete in the end-of-tick flush
+            self.writes.delete(driver)
+            print(f"[SIMULATOR] Driver {driver.id} - Simulation stopped, deleting")
+            return None
         
         # Check if next coordinate is a matched station
-        is_station, station_info = self.is_coordinate_a_station(next_coord, stations)
+        station_id = next_coord.get('station_id')
         
-        if is_station and driver.matched_station_id == station_info['id']:
+        if station_id is not None and driver.matched_station_id == station_id:
+            station_info = self.station_cache.get(station_id) or {'id': station_id, 'name': f"Station {station_id}"}
             # GOLDEN LOGIC: We're at a matched station, WAIT
             print(f"[SIMULATOR] Driver {driver.id} - Waiting at station {station_info['name']} "
                   f"(counter: {driver.wait_counter}/5)")
             
             if driver.wait_counter < 5:
                 # Still waiting
+                if driver.wait_counter == 0:
+                    self.counters['matches'] += 1
                 driver.wait_counter += 1
-                driver.save()
-                return
+                self.writes.mark(driver, 'wait_counter')
+                return None
             else:
                 # Wait complete, pop the station and move on
                 print(f"[SIMULATOR] Driver {driver.id} - Wait complete at {station_info['name']}, moving on")
                 
                 # CRITICAL: Start the trip now (Pickup happened)
-                self.start_driver_trips(driver.id)
+                self.counters['pickups'] += 1
+                self.trip_calls.append((self.start_driver_trips, driver.id))
                 
-                driver.pop_route()
+                driver.pop_route(save=False)
                 driver.matched_station_id = None
                 driver.wait_counter = 0
-                driver.save()
-                return
+                self.writes.mark(driver, *driver.dirty_route_fields(), 'matched_station_id', 'wait_counter')
+                return None
         
         # NOT at a matched station (or not a station at all)
         # Pop the coordinate and move
-        coord = driver.pop_route()
+        coord = driver.pop_route(save=False)
         driver.current_lat = coord['lat']
         driver.current_lng = coord['lng']
         driver.sim_timestamp = self.increment_sim_time(driver.sim_timestamp)
-        driver.save()
+        self.writes.mark(driver, *driver.dirty_route_fields(), 'current_lat', 'current_lng', 'sim_timestamp')
+        self.counters['moves'] += 1
         
         print(f"[SIMULATOR] T={driver.sim_timestamp} Driver {driver.id} moved to "
               f"({driver.current_lat:.4f}, {driver.current_lng:.4f})")
+        return coord
+    
+    def check_proximity(self, moves):
+        """
+        Publish one matching event for every (driver, waypoint) move whose
+        waypoint was annotated with a station within range.
+        """
+        hits = 0
+        for driver, coord in moves:
+            station_id = coord.get('near_station_id')
+            if station_id is None:
+                continue
+            station = self.station_cache.get(station_id)
+            if station is None:
+                # Deleted since annotation; the route is re-annotated next tick
+                continue
+            hits += 1
+            print(f"[SIMULATOR] Driver {driver.id} is near {station['name']} "
+                  f"({coord['near_station_m']:.2f}m) - Publishing to matching queue")
+            self.publish_to_matching_queue(driver, station)
+        if moves:
+            print(f"[SIMULATOR] Proximity: {hits} of {len(moves)} move(s) near a station", flush=True)
+    
+    def run_tick(self):
+        """One simulation tick (= 1 simulation minute) over all drivers we own"""
+        # Refresh stations (a not-modified check unless stations changed)
+        self.sync_stations()
+        print(f"[SIMULATOR] Stations: {len(self.station_cache.stations)} "
+              f"(version {self.station_cache.version})", flush=True)
         
-        # Check if we're now near any station
-        for station in stations:
-            is_nearby, distance = self.is_near_station(
-                driver.current_lat, driver.current_lng,
-                station['lat'], station['lng']
-            )
-            
-            if is_nearby:
-                print(f"[SIMULATOR] Driver {driver.id} is near {station['name']} "
-                      f"({distance:.2f}m) - Publishing to matching queue")
-                self.publish_to_matching_queue(driver, station)
-                break  # Only publish once per tick
+        # Get all active drivers (only our partitions in sharded mode)
+        active_drivers = Driver.objects.filter(is_simulating=True)
+        if self.shard:
+            self.shard.rebalance(self.last_tick_ms, self.last_tick_drivers)
+            active_drivers = self.shard.filter_drivers(active_drivers)
+        active_drivers = list(active_drivers)
+        print(f"[SIMULATOR] Found {len(active_drivers)} active drivers", flush=True)
+        self.refresh_route_annotations(active_drivers)
+        
+        if active_drivers:
+            print(f"\n[SIMULATOR] Tick - {len(active_drivers)} active driver(s)", flush=True)
+        
+        # Simulate each driver, then publish proximity events for all movers
+        moves = []
+        for driver in active_drivers:
+            coord = self.simulate_driver_tick(driver)
+            if coord is not None:
+                moves.append((driver, coord))
+        
+        lost = self.drop_lost_partitions()
+        changed = self.writes.pending_drivers()
+        removed = self.writes.pending_deletes()
+        conflicts = self.flush_writes() | lost
+        if conflicts:
+            # Lost to a concurrent route edit (or another worker): no events for them this tick
+            moves = [(driver, coord) for driver, coord in moves if driver.id not in conflicts]
+            changed = [driver for driver in changed if driver.id not in conflicts]
+            removed = [driver_id for driver_id in removed if driver_id not in conflicts]
+        self.dispatch_trip_calls(conflicts)
+        self.check_proximity(moves)
+        self.publish_live_diff(changed, removed)
+        self.flush_publisher()
+        self.wait_side_effects()
+        
+        self.last_tick_drivers = len(active_drivers)
+    
+    def report_tick(self):
+        """Log tick duration, scheduling lag and overruns"""
+        stats = self.scheduler.stats()
+        self.last_tick_ms = stats['last_duration_ms']
+        print(f"[SIMULATOR] Tick {stats['ticks']}: {stats['last_duration_ms']:.1f}ms "
+              f"(avg {stats['avg_duration_ms']:.1f}ms, max {stats['max_duration_ms']:.1f}ms) | "
+              f"lag {stats['last_lag_ms']:.1f}ms (max {stats['max_lag_ms']:.1f}ms) | "
+              f"overruns {stats['overruns']}, skipped {stats['skipped']} [{stats['policy']}]", flush=True)
+        if self.last_annotated_waypoints:
+            timings = self.annotator.engine.last_timings
+            print(f"[SIMULATOR] Annotations: {self.last_annotated_waypoints} waypoint(s) in "
+                  f"{self.last_annotation_ms:.1f}ms (last proximity query {timings['query_ms']:.1f}ms "
+                  f"for {timings['query_points']} point(s))", flush=True)
+        if self.shard:
+            print(f"[SHARD {self.shard.worker_id}] Tick: {self.last_tick_drivers} driver(s) in "
+                  f"partitions {self.shard.owned} took {self.last_tick_ms:.1f}ms", flush=True)
     
-    def run(self):
-        """Main simulation loop"""
+    def run(self, max_ticks=None, stop_when_idle=False):
+        """
+        Main simulation loop: fixed-rate ticks, each tick = 1 simulation minute.
+        Runs forever unless max_ticks is given or stop_when_idle is set.
+        """
         print("[SIMULATOR] Starting simulation loop...", flush=True)
-        
-        tick_interval = 3  # seconds (each tick = 1 simulation minute)
+        print(f"[SIMULATOR] Tick every {self.scheduler.interval}s "
+              f"(overrun policy: {self.scheduler.overrun_policy})", flush=True)
         
         print("[SIMULATOR] Entering while loop...", flush=True)
-        while True:
+        while max_ticks is None or self.scheduler.ticks < max_ticks:
             try:
+                self.scheduler.wait()
                 print("[SIMULATOR] Tick start...", flush=True)
-                # Get all stations (cache this in production)
-                stations = self.get_all_stations()
-                print(f"[SIMULATOR] Fetched {len(stations)} stations", flush=True)
-                
-                # Get all active drivers
-                active_drivers = Driver.objects.filter(is_simulating=True)
-                print(f"[SIMULATOR] Found {active_drivers.count()} active drivers", flush=True)
-                
-                if active_drivers.count() > 0:
-                    print(f"\n[SIMULATOR] Tick - {active_drivers.count()} active driver(s)", flush=True)
-                
-                # Simulate each driver
-                for driver in active_drivers:
-                    self.simulate_driver_tick(driver, stations)
-                
-                # Wait before next tick
-                print(f"[SIMULATOR] Sleeping {tick_interval}s...", flush=True)
-                time.sleep(tick_interval)
-                
+                self.run_tick()
             except KeyboardInterrupt:
                 print("\n[SIMULATOR] Shutting down...", flush=True)
                 break
@@ -374,17 +478,164 @@ class SimulationWorker:
                 print(f"[SIMULATOR] Error in simulation loop: {e}", flush=True)
                 import traceback
                 traceback.print_exc()
-                time.sleep(tick_interval)
+            
+            self.scheduler.tick_done()
+            self.report_tick()
+            
+            if stop_when_idle and self.last_tick_drivers == 0:
+                print("[SIMULATOR] No active drivers left, stopping", flush=True)
+                break
+        
+        self.shutdown()
+    
+    def shutdown(self):
+        if not self.dry_run:
+            self.publisher.flush()
+            self.publisher.stop()
+            self.trip_effects.stop()
+        if self.shard:
+            self.shard.release()
+    
+    def summary(self, wall_seconds):
+        """Counters for a finished run (used by fast-forward mode)"""
+        ticks = self.scheduler.ticks
+        summary = dict(self.counters)
+        summary.update({
+            'ticks': ticks,
+            'wall_seconds': wall_seconds,
+            'ticks_per_sec': ticks / wall_seconds if wall_seconds > 0 else 0.0,
+            'avg_tick_ms': self.scheduler.stats()['avg_duration_ms']
+        })
+        if isinstance(self.clock, VirtualClock):
+            summary['sim_start'] = self.clock.start_time
+            summary['sim_end'] = self.clock.sim_time
+        return summary
+
+
+def run_worker(sharded):
+    """Build a worker (sharded or owning every driver) and run it forever"""
+    shard = None
+    if sharded:
+        shard = ShardCoordinator(
+            partitions=settings.SIMULATOR_PARTITIONS,
+            lease_seconds=settings.SIMULATOR_LEASE_SECONDS
+        )
+        print(f"[SIMULATOR] Sharded mode: worker {shard.worker_id}, "
+              f"{shard.partitions} partitions", flush=True)
+    
+    worker = SimulationWorker(shard=shard)
+    print("[SIMULATOR] Worker created! Starting simulation loop...", flush=True)
+    worker.run()
+
+
+def run_fast_forward(args):
+    """
+    Headless run on a virtual clock: ticks execute back-to-back until the
+    tick budget or target simulated time is reached, then print a summary.
+    With --start, every simulating driver's clock (sim_timestamp) is set to it
+    first, so --until is measured on the same clock the drivers follow;
+    without it drivers keep their own clocks. Refuses to run while sharded
+    workers hold leases, since it would move their drivers too.
+    """
+    leased = leased_partitions()
+    if leased:
+        sys.exit(f"[SIMULATOR] Fast-forward refused: partitions {leased} are leased by running "
+                 f"sharded workers; stop them first")
+    
+    clock = VirtualClock(tick_seconds=settings.SIMULATOR_TICK_SECONDS, start_time=args.start or '00:00')
+    if args.until:
+        max_ticks = clock.minutes_until(args.until)
+    else:
+        max_ticks = args.ticks
+    
+    if args.start is None:
+        clocks = "driver clocks unchanged"
+    elif args.dry_run:
+        clocks = "driver clocks not set"
+    else:
+        seeded = Driver.objects.filter(is_simulating=True).update(
+            sim_timestamp=args.start, updated_at=timezone.now(), change_seq=NextChangeSeq()
+        )
+        clocks = f"{seeded} driver clock(s) set to {args.start}"
+    print(f"[SIMULATOR] Fast-forward: {max_ticks if max_ticks is not None else 'unlimited'} tick(s), "
+          f"{clocks}{' (dry run)' if args.dry_run else ''}", flush=True)
+    
+    worker = SimulationWorker(clock=clock, dry_run=args.dry_run)
+    started = time.perf_counter()
+    worker.run(max_ticks=max_ticks, stop_when_idle=args.stop_when_idle or max_ticks is None)
+    summary = worker.summary(time.perf_counter() - started)
+    
+    print("\n[SIMULATOR] ===== FAST-FORWARD SUMMARY =====", flush=True)
+    if args.start:
+        print(f"[SIMULATOR] Simulated {summary['sim_start']} -> {summary['sim_end']} "
+              f"({summary['ticks']} ticks) in {summary['wall_seconds']:.2f}s", flush=True)
+    else:
+        print(f"[SIMULATOR] Simulated {summary['ticks']} minute(s) in {summary['wall_seconds']:.2f}s", flush=True)
+    print(f"[SIMULATOR] Throughput: {summary['ticks_per_sec']:.1f} ticks/sec "
+          f"(avg tick {summary['avg_tick_ms']:.1f}ms)", flush=True)
+    print(f"[SIMULATOR] Moves: {summary['moves']} | Proximity events: {summary['proximity_events']} | "
+          f"Matches: {summary['matches']} | Pickups: {summary['pickups']} | "
+          f"Trips completed: {summary['trips_completed']}", flush=True)
+    print(f"[SIMULATOR] Annotations: {summary['annotated_waypoints']} waypoint(s) in "
+          f"{summary['annotation_ms']:.1f}ms", flush=True)
+    return summary
+
+
+def hhmm(value):
+    """argparse type for HH:MM times"""
+    try:
+        parse_hhmm(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return value
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Driver simulation worker")
+    parser.add_argument('--sharded', action='store_true', default=settings.SIMULATOR_SHARDED,
+                        help="Only simulate drivers in partitions leased by this worker")
+    parser.add_argument('--processes', type=int, default=settings.SIMULATOR_PROCESSES,
+                        help="Run N sharded worker processes in this container")
+    parser.add_argument('--fast-forward', action='store_true',
+                        help="Headless mode: run ticks on a virtual clock as fast as possible")
+    parser.add_argument('--ticks', type=int, default=None,
+                        help="Fast-forward: stop after N ticks (simulated minutes)")
+    parser.add_argument('--until', type=hhmm, default=None,
+                        help="Fast-forward: stop at this simulated time (HH:MM, after --start the same day; needs --start)")
+    parser.add_argument('--start', type=hhmm, default=None,
+                        help="Fast-forward: set every simulating driver's clock to this time (HH:MM) before running")
+    parser.add_argument('--stop-when-idle', action='store_true',
+                        help="Fast-forward: stop once no simulating drivers are left")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Fast-forward: count events without publishing or calling the Trip Service")
+    args = parser.parse_args()
+    if args.until and not args.start:
+        parser.error("--until needs --start: it is measured from the clock --start sets")
+    if args.until and parse_hhmm(args.until) <= parse_hhmm(args.start):
+        parser.error(f"--until {args.until} must be after --start {args.start}")
+    return args
 
 
 if __name__ == '__main__':
+    args = parse_args()
     print("[SIMULATOR] Creating SimulationWorker instance...", flush=True)
     try:
-        worker = SimulationWorker()
-        print("[SIMULATOR] Worker created! Starting simulation loop...", flush=True)
-        print(f"[SIMULATOR] Worker object: {worker}", flush=True)
-        print(f"[SIMULATOR] About to call worker.run()...", flush=True)
-        worker.run()
+        if args.fast_forward:
+            run_fast_forward(args)
+        elif args.processes > 1:
+            # Each child opens its own DB connection and gRPC channels after fork
+            connections.close_all()
+            processes = [
+                multiprocessing.Process(target=run_worker, args=(True,), name=f"simulator-{i}")
+                for i in range(args.processes)
+            ]
+            for process in processes:
+                process.start()
+            print(f"[SIMULATOR] Started {len(processes)} sharded worker processes", flush=True)
+            for process in processes:
+                process.join()
+        else:
+            run_worker(args.sharded)
         print("[SIMULATOR] worker.run() returned!", flush=True)
     except Exception as e:
         print(f"[SIMULATOR] FATAL ERROR: {e}", flush=True)
@@ -392,4 +643,3 @@ if __name__ == '__main__':
         traceback.print_exc()
         sys.exit(1)
     print("[SIMULATOR] Main block completed!", flush=True)
-
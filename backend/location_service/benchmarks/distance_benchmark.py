@@ -0,0 +1,79 @@
+"""
+Distance mode benchmark: throughput and error of each mode against geodesic.
+
+Random point pairs inside a Bangalore-sized box (about 40 km across, centred
+on 12.97N 77.59E) are measured with every mode, one call per pair (scalar, as
+IsNearby does) and as one NumPy batch (as IsNearbyBatch does). Errors are
+against geopy's geodesic distance. No services are needed.
+
+    python benchmarks/distance_benchmark.py [--pairs 20000] [--span-km 40] [--seed 7]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import distance
+
+CENTER = (12.9716, 77.5946)
+
+
+def make_pairs(count, span_km, seed):
+    rng = random.Random(seed)
+    half_deg = span_km / 2.0 / 111.0
+    coords = [
+        (CENTER[0] + rng.uniform(-half_deg, half_deg), CENTER[1] + rng.uniform(-half_deg, half_deg),
+         CENTER[0] + rng.uniform(-half_deg, half_deg), CENTER[1] + rng.uniform(-half_deg, half_deg))
+        for _ in range(count)
+    ]
+    return np.array(coords).T
+
+
+def bench_scalar(mode, lat1, lng1, lat2, lng2):
+    pairs = list(zip(lat1.tolist(), lng1.tolist(), lat2.tolist(), lng2.tolist()))
+    started = time.perf_counter()
+    out = [distance.distance(mode, *pair) for pair in pairs]
+    return np.array(out), time.perf_counter() - started
+
+
+def bench_batch(mode, lat1, lng1, lat2, lng2):
+    started = time.perf_counter()
+    out = distance.distance_many(mode, lat1, lng1, lat2, lng2)
+    return out, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distance mode benchmark")
+    parser.add_argument('--pairs', type=int, default=20000)
+    parser.add_argument('--span-km', type=float, default=40.0)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    lat1, lng1, lat2, lng2 = make_pairs(args.pairs, args.span_km, args.seed)
+    reference, _ = bench_scalar(distance.GEODESIC, lat1, lng1, lat2, lng2)
+    near = reference <= 1000.0
+
+    print(f"{args.pairs} pairs in a {args.span_km:.0f} km box around Bangalore "
+          f"(mean distance {reference.mean() / 1000.0:.1f} km, {int(near.sum())} under 1 km)")
+    print(f"{'mode':>16} {'scalar pairs/s':>15} {'batch pairs/s':>14} {'max err m':>10} "
+          f"{'max err %':>10} {'max err <1km m':>15}")
+    for mode in distance.MODES:
+        scalar, scalar_s = bench_scalar(mode, lat1, lng1, lat2, lng2)
+        batch, batch_s = bench_batch(mode, lat1, lng1, lat2, lng2)
+        if not np.allclose(scalar, batch, rtol=1e-9, atol=1e-6):
+            print(f"[BENCHMARK] {mode}: scalar and batch results differ", flush=True)
+        error = np.abs(batch - reference)
+        relative = error / np.maximum(reference, 1e-9)
+        near_error = error[near].max() if near.any() else 0.0
+        print(f"{mode:>16} {args.pairs / scalar_s:>15,.0f} {args.pairs / batch_s:>14,.0f} "
+              f"{error.max():>10.2f} {relative.max() * 100.0:>9.3f}% {near_error:>15.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Routing benchmark: contraction hierarchy build time and query latency against
+plain A*.
+
+Builds a synthetic city (a grid of streets with jittered intersections, some
+oneway streets and faster arterials every few blocks, centred on 12.97N
+77.59E), or loads an extract with --graph. Random origin/destination pairs are
+answered by both engines; travel times must agree. Then one many-to-many
+matrix is timed against the same pairs queried one by one. No services are
+needed.
+
+    python benchmarks/routing_benchmark.py [--size 80] [--queries 300] [--matrix 30] [--seed 7]
+    python benchmarks/routing_benchmark.py --graph path/to/extract.geojson
+    python benchmarks/routing_benchmark.py --graph data/test_road_graph.geojson   # bundled test grid
+"""
+
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from contraction_hierarchy import ContractionHierarchy
+from road_graph import RoadGraph
+
+CENTER = (12.9716, 77.5946)
+BLOCK_DEG = 0.002  # ~220 m
+
+
+def make_city(size, seed):
+    """Street segments for a size x size grid with jittered intersections"""
+    rng = random.Random(seed)
+    origin = (CENTER[0] - size * BLOCK_DEG / 2, CENTER[1] - size * BLOCK_DEG / 2)
+    points = [
+        [(origin[0] + i * BLOCK_DEG + rng.uniform(-0.25, 0.25) * BLOCK_DEG,
+          origin[1] + j * BLOCK_DEG + rng.uniform(-0.25, 0.25) * BLOCK_DEG) for j in range(size)]
+        for i in range(size)
+    ]
+    segments = []
+    for i in range(size):
+        arterial = i % 8 == 0
+        row = [points[i][j] for j in range(size)]
+        column = [points[j][i] for j in range(size)]
+        for line, oneway in ((row, 1 if i % 5 == 2 else 0), (column, -1 if i % 7 == 3 else 0)):
+            segments.append((line, 50.0 if arterial else rng.choice((20.0, 25.0, 30.0)), 0 if arterial else oneway))
+    return segments
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Routing benchmark")
+    parser.add_argument('--graph', help="GeoJSON / .osm extract instead of the synthetic city")
+    parser.add_argument('--size', type=int, default=80, help="synthetic city: intersections per side")
+    parser.add_argument('--queries', type=int, default=300)
+    parser.add_argument('--matrix', type=int, default=30, help="origins and destinations in the matrix")
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.graph:
+        graph = RoadGraph.from_file(args.graph)
+        source = args.graph
+    else:
+        graph = RoadGraph.from_segments(make_city(args.size, args.seed))
+        source = f"synthetic {args.size}x{args.size} city"
+    load_s = time.perf_counter() - started
+    print(f"{source}: {len(graph)} nodes, {graph.edge_count} edges (loaded in {load_s:.2f}s)")
+
+    started = time.perf_counter()
+    hierarchy = ContractionHierarchy.build(graph)
+    print(f"Contraction hierarchy built in {time.perf_counter() - started:.2f}s "
+          f"({hierarchy.shortcut_count} shortcuts)")
+
+    rng = random.Random(args.seed)
+    pairs = [(rng.randrange(len(graph)), rng.randrange(len(graph))) for _ in range(args.queries)]
+    timings = {'astar': [], 'ch': [], 'ch+path': []}
+    settled = {'astar': 0, 'ch': 0}
+    mismatches = 0
+    for source_node, target_node in pairs:
+        started = time.perf_counter()
+        astar_seconds, _, _, astar_settled = graph.astar(source_node, target_node)
+        timings['astar'].append(time.perf_counter() - started)
+        settled['astar'] += astar_settled
+
+        before = hierarchy.settled
+        started = time.perf_counter()
+        ch_seconds, _, _ = hierarchy.query(source_node, target_node)
+        timings['ch'].append(time.perf_counter() - started)
+        settled['ch'] += hierarchy.settled - before
+
+        started = time.perf_counter()
+        hierarchy.query(source_node, target_node, with_path=True)
+        timings['ch+path'].append(time.perf_counter() - started)
+
+        if not math.isclose(astar_seconds, ch_seconds, rel_tol=1e-9, abs_tol=1e-6):
+            mismatches += 1
+    if mismatches:
+        print(f"[BENCHMARK] {mismatches} pair(s) where A* and the hierarchy disagree", flush=True)
+
+    print(f"{'engine':>10} {'median ms':>10} {'p95 ms':>8} {'settled/query':>14}")
+    for engine, values in timings.items():
+        nodes = settled.get(engine)
+        print(f"{engine:>10} {statistics.median(values) * 1000:>10.3f} {percentile(values, 0.95) * 1000:>8.3f} "
+              f"{nodes / len(pairs) if nodes is not None else float('nan'):>14.0f}")
+
+    sources = [rng.randrange(len(graph)) for _ in range(args.matrix)]
+    targets = [rng.randrange(len(graph)) for _ in range(args.matrix)]
+    started = time.perf_counter()
+    seconds, _ = hierarchy.many_to_many(sources, targets)
+    matrix_s = time.perf_counter() - started
+    started = time.perf_counter()
+    single = [[hierarchy.query(s, t)[0] for t in targets] for s in sources]
+    single_s = time.perf_counter() - started
+    agree = all(math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-6) or a == b
+                for row_a, row_b in zip(seconds.tolist(), single) for a, b in zip(row_a, row_b))
+    print(f"{args.matrix}x{args.matrix} matrix: many-to-many {matrix_s * 1000:.1f} ms, "
+          f"one query per cell {single_s * 1000:.1f} ms{'' if agree else ' (results differ)'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Station catchments: which grid cells can reach each station within a few
+fixed time budgets, kept as bitsets.
+
+For every station, the fastest time from each cell of a DestinationGrid to
+the station is computed once: one bounded Dijkstra over the reversed road
+graph from the station's nearest node, a cell taking the best time of the
+road nodes inside it (cells without roads take their nearest node's), plus
+the station's distance from that node at the graph's top speed. With no road
+graph, times are straight-line distance at a fixed speed from the nearest
+edge of the cell. Both are optimistic, so pruning with them never drops a
+candidate that could make it.
+
+Each budget's answer is one bit per (cell, station), stored cell-major:
+
+    reachable[budget, cell] = packed bits over station columns
+
+so "which stations can a driver in this cell reach in 5 minutes" is one row
+of ceil(stations / 8) bytes, and "can this driver reach station s" is a
+single bit test. sync() only recomputes stations that were added or moved.
+A lookup for a budget that is not configured uses the next larger one (a
+superset, still safe for pruning).
+"""
+
+import threading
+
+import numpy as np
+
+from distance import distance_many
+
+
+class StationCatchments:
+
+    def __init__(self, grid, budgets_seconds, mode, road_graph=None, speed_mps=8.33):
+        if not budgets_seconds or min(budgets_seconds) <= 0:
+            raise ValueError("Catchments need at least one positive time budget")
+        self.grid = grid
+        self.budgets = np.array(sorted(set(budgets_seconds)), dtype=float)
+        self.mode = mode
+        self.road_graph = road_graph
+        self.speed_mps = speed_mps
+
+        self.station_version = 0
+        self._catchments = {}       # station id -> (lat, lng, packed bits [budgets, cells])
+        self._station_ids = np.empty(0, dtype=np.int64)
+        self._columns = {}          # station id -> column in the reachable bitsets
+        self._reachable = np.zeros((len(self.budgets), len(grid), 0), dtype=np.uint8)
+        self._node_cells = None
+        self._lock = threading.Lock()
+
+        self.stations_computed = 0
+        self.lookups = 0
+
+    def __len__(self):
+        return len(self._station_ids)
+
+    def _cell_times(self, lat, lng):
+        """Optimistic seconds from every cell to the point (inf beyond the largest budget)"""
+        limit = float(self.budgets[-1])
+        if self.road_graph is None:
+            centre_lats, centre_lngs = self.grid.centres()
+            half_diagonal = distance_many(self.mode, centre_lats, centre_lngs,
+                                          centre_lats + self.grid.cell_deg / 2, centre_lngs + self.grid.cell_deg / 2)
+            meters = distance_many(self.mode, centre_lats, centre_lngs, lat, lng) - half_diagonal
+            times = np.maximum(meters, 0.0) / self.speed_mps
+            times[times > limit] = np.inf
+            return times
+
+        if self._node_cells is None:
+            self._node_cells = self._map_cells()
+        node_cells, empty_cells, empty_nodes = self._node_cells
+        # The last leg, from the station's nearest node to the station itself
+        node, snap_meters = self.road_graph.snap(lat, lng)
+        snap_seconds = snap_meters / self.road_graph.max_speed_mps
+        if snap_seconds > limit:
+            return np.full(len(self.grid), np.inf)
+        reached = self.road_graph.times_to(node, limit - snap_seconds)
+        node_times = np.full(len(self.road_graph), np.inf)
+        node_times[list(reached)] = list(reached.values())
+        node_times += snap_seconds
+
+        times = np.full(len(self.grid), np.inf)
+        inside = node_cells >= 0
+        np.minimum.at(times, node_cells[inside], node_times[inside])
+        times[empty_cells] = node_times[empty_nodes]
+        return times
+
+    def _map_cells(self):
+        """(cell of every road node, cells with no node, nearest node to each of those)"""
+        graph = self.road_graph
+        node_cells = self.grid.cell_ids(graph.lats, graph.lngs)
+        empty_cells = np.setdiff1d(np.arange(len(self.grid)), node_cells[node_cells >= 0])
+        centre_lats, centre_lngs = self.grid.centres()
+        empty_nodes = np.array(
+            [graph.snap(centre_lats[cell], centre_lngs[cell])[0] for cell in empty_cells.tolist()], dtype=np.int64
+        )
+        return node_cells, empty_cells, empty_nodes
+
+    def sync(self, stations, version):
+        """Recompute catchments of stations that were added or moved; drop removed ones"""
+        with self._lock:
+            catchments = {}
+            computed = 0
+            for station in stations:
+                current = self._catchments.get(station['id'])
+                if current is not None and current[0] == station['lat'] and current[1] == station['lng']:
+                    catchments[station['id']] = current
+                    continue
+                times = self._cell_times(station['lat'], station['lng'])
+                bits = np.packbits(times[None, :] <= self.budgets[:, None], axis=1)
+                catchments[station['id']] = (station['lat'], station['lng'], bits)
+                computed += 1
+
+            station_ids = np.array(sorted(catchments), dtype=np.int64)
+            if len(station_ids):
+                # [budgets, stations, cells] -> cell-major bits over stations
+                reach = np.stack([
+                    np.unpackbits(catchments[station_id][2], axis=1, count=len(self.grid))
+                    for station_id in station_ids.tolist()
+                ], axis=1)
+                reachable = np.packbits(reach.transpose(0, 2, 1), axis=2)
+            else:
+                reachable = np.zeros((len(self.budgets), len(self.grid), 0), dtype=np.uint8)
+
+            self._catchments = catchments
+            self._station_ids = station_ids
+            self._columns = {station_id: column for column, station_id in enumerate(station_ids.tolist())}
+            self._reachable = reachable
+            self.station_version = version
+            self.stations_computed += computed
+            if computed or len(catchments) != len(stations):
+                print(f"[CATCHMENTS] Synced {len(catchments)} station(s) at version {version}: "
+                      f"{computed} recomputed", flush=True)
+            return computed
+
+    def budget_index(self, budget_seconds):
+        """Smallest configured budget >= budget_seconds"""
+        index = int(np.searchsorted(self.budgets, budget_seconds - 1e-9))
+        if index == len(self.budgets):
+            raise ValueError(f"No budget of {budget_seconds:.0f}s or more (configured: "
+                             f"{', '.join(f'{budget:.0f}s' for budget in self.budgets)})")
+        return index
+
+    def reachable_from(self, cell_id, budget_seconds, candidates=None):
+        """
+        (station ids that can be reached from the cell within the budget,
+        budget used). candidates narrows the answer to those station ids.
+        """
+        index = self.budget_index(budget_seconds)
+        with self._lock:
+            self.lookups += 1
+            row = self._reachable[index, cell_id]
+            if candidates is None:
+                hits = np.flatnonzero(np.unpackbits(row, count=len(self._station_ids)))
+                return self._station_ids[hits].tolist(), float(self.budgets[index])
+            found = []
+            for station_id in candidates:
+                column = self._columns.get(station_id)
+                if column is not None and row[column >> 3] & (0x80 >> (column & 7)):
+                    found.append(station_id)
+            return found, float(self.budgets[index])
+
+    def stats(self):
+        return {
+            'stations': len(self._station_ids),
+            'cells': len(self.grid),
+            'budgets_seconds': self.budgets.tolist(),
+            'bitset_bytes': int(self._reachable.nbytes),
+            'stations_computed': self.stations_computed,
+            'lookups': self.lookups,
+        }
@@ -0,0 +1,331 @@
+"""
+Contraction hierarchy over a RoadGraph for fast travel-time queries.
+
+Preprocessing contracts nodes one at a time, least important first (edge
+difference plus contracted neighbours, lazily re-evaluated). Contracting v
+adds a shortcut u -> w for every in/out neighbour pair whose fastest
+connection runs through v; a bounded local Dijkstra (the witness search)
+skips pairs that have another path at least as fast. Every node gets a rank
+in that order.
+
+A query then only ever goes up in rank: a forward search from the source
+over upward edges and a backward search from the target over upward
+reversed edges, which meet at the top of the fastest path. On road networks
+each side settles a few hundred nodes however large the graph is. Shortcuts
+remember the node they bypass so paths unpack to road nodes. Many-to-many
+queries (travel time matrices) run one backward search per target into
+per-node buckets, then one forward search per source over the buckets.
+
+The hierarchy is saved as a .npz (CSR arrays for the upward forward and
+backward graphs, next to the road graph itself) so preprocessing runs once
+per extract.
+"""
+
+import hashlib
+import heapq
+import math
+import os
+
+import numpy as np
+
+from road_graph import RoadGraph
+
+# Witness searches stop after settling this many nodes (a missed witness only
+# costs an unneeded shortcut, never a wrong answer)
+WITNESS_SETTLE_LIMIT = 60
+NO_MIDDLE = -1
+# Bump when the saved layout changes so old cache files are rebuilt
+CACHE_FORMAT = 1
+
+
+class ContractionHierarchy:
+
+    def __init__(self, graph, rank, forward, backward):
+        """forward / backward: (offsets, neighbours, seconds, meters, middles) CSR arrays"""
+        self.graph = graph
+        self.rank = np.asarray(rank, dtype=np.int64)
+        self.forward = tuple(np.asarray(array) for array in forward)
+        self.backward = tuple(np.asarray(array) for array in backward)
+        self._rank = self.rank.tolist()
+        self._up = self._lists(self.forward)
+        self._down = self._lists(self.backward)
+        self.settled = 0
+
+    @staticmethod
+    def _lists(csr):
+        offsets, neighbours, seconds, meters, middles = (array.tolist() for array in csr)
+        return [
+            list(zip(neighbours[offsets[u]:offsets[u + 1]], seconds[offsets[u]:offsets[u + 1]],
+                     meters[offsets[u]:offsets[u + 1]], middles[offsets[u]:offsets[u + 1]]))
+            for u in range(len(offsets) - 1)
+        ]
+
+    @property
+    def shortcut_count(self):
+        return int((self.forward[4] != NO_MIDDLE).sum() + (self.backward[4] != NO_MIDDLE).sum())
+
+    # -- preprocessing ---------------------------------------------------
+
+    @classmethod
+    def build(cls, graph, witness_settle_limit=WITNESS_SETTLE_LIMIT):
+        n = len(graph)
+        out_edges = [dict() for _ in range(n)]  # u -> {w: (seconds, meters, middle)}
+        in_edges = [dict() for _ in range(n)]   # w -> {u: (seconds, meters, middle)}
+        for u, v, seconds, meters in graph.edges():
+            out_edges[u][v] = in_edges[v][u] = (seconds, meters, NO_MIDDLE)
+        contracted = bytearray(n)
+        contracted_neighbours = [0] * n
+
+        def witness_costs(source, skip, limit):
+            """Fastest costs from source avoiding `skip`, up to `limit`"""
+            costs = {source: 0.0}
+            heap = [(0.0, source)]
+            settled = 0
+            while heap and settled < witness_settle_limit:
+                cost, node = heapq.heappop(heap)
+                if cost > costs.get(node, math.inf):
+                    continue
+                if cost > limit:
+                    break
+                settled += 1
+                for neighbour, (seconds, _, _) in out_edges[node].items():
+                    if neighbour == skip or contracted[neighbour]:
+                        continue
+                    candidate = cost + seconds
+                    if candidate < costs.get(neighbour, math.inf):
+                        costs[neighbour] = candidate
+                        heapq.heappush(heap, (candidate, neighbour))
+            return costs
+
+        def shortcuts(v):
+            """(u, w, seconds, meters) shortcuts contracting v would need"""
+            needed = []
+            outgoing = [(w, edge) for w, edge in out_edges[v].items() if not contracted[w]]
+            if not outgoing:
+                return needed
+            for u, (in_seconds, in_meters, _) in in_edges[v].items():
+                if contracted[u]:
+                    continue
+                targets = [(w, edge) for w, edge in outgoing if w != u]
+                if not targets:
+                    continue
+                limit = in_seconds + max(edge[0] for _, edge in targets)
+                costs = witness_costs(u, v, limit)
+                for w, (out_seconds, out_meters, _) in targets:
+                    via = in_seconds + out_seconds
+                    if costs.get(w, math.inf) > via:
+                        needed.append((u, w, via, in_meters + out_meters))
+            return needed
+
+        def priority(v):
+            degree = sum(1 for u in in_edges[v] if not contracted[u]) + \
+                sum(1 for w in out_edges[v] if not contracted[w])
+            return len(shortcuts(v)) - degree + contracted_neighbours[v]
+
+        heap = [(priority(v), v) for v in range(n)]
+        heapq.heapify(heap)
+        rank = [0] * n
+        order = 0
+        while heap:
+            _, v = heapq.heappop(heap)
+            if contracted[v]:
+                continue
+            # Lazy update: re-evaluate, contract only if still the least important
+            current = priority(v)
+            if heap and current > heap[0][0]:
+                heapq.heappush(heap, (current, v))
+                continue
+            for u, w, seconds, meters in shortcuts(v):
+                if seconds < out_edges[u].get(w, (math.inf,))[0]:
+                    out_edges[u][w] = in_edges[w][u] = (seconds, meters, v)
+            contracted[v] = 1
+            rank[v] = order
+            order += 1
+            for neighbour in set(in_edges[v]) | set(out_edges[v]):
+                contracted_neighbours[neighbour] += 1
+
+        # Upward graphs: u -> w with rank[w] > rank[u] for the forward search,
+        # and the reverse of w -> u with rank[w] > rank[u] for the backward one
+        forward = [[(w, *edge) for w, edge in out_edges[u].items() if rank[w] > rank[u]] for u in range(n)]
+        backward = [[(w, *edge) for w, edge in in_edges[u].items() if rank[w] > rank[u]] for u in range(n)]
+        return cls(graph, rank, cls._csr(forward), cls._csr(backward))
+
+    @staticmethod
+    def _csr(adjacency):
+        offsets = np.concatenate([[0], np.cumsum([len(edges) for edges in adjacency])]).astype(np.int64)
+        flat = [edge for edges in adjacency for edge in edges]
+        return (
+            offsets,
+            np.array([edge[0] for edge in flat], dtype=np.int64),
+            np.array([edge[1] for edge in flat], dtype=float),
+            np.array([edge[2] for edge in flat], dtype=float),
+            np.array([edge[3] for edge in flat], dtype=np.int64),
+        )
+
+    # -- persistence -----------------------------------------------------
+
+    def save(self, path):
+        names = ('offsets', 'neighbours', 'seconds', 'meters', 'middles')
+        arrays = dict(self.graph.arrays())
+        arrays['rank'] = self.rank
+        arrays.update({f'up_{name}': array for name, array in zip(names, self.forward)})
+        arrays.update({f'down_{name}': array for name, array in zip(names, self.backward)})
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        names = ('offsets', 'neighbours', 'seconds', 'meters', 'middles')
+        with np.load(path) as data:
+            graph = RoadGraph(data['lats'], data['lngs'], data['out_offsets'], data['out_targets'],
+                              data['out_times'], data['out_lengths'])
+            return cls(
+                graph, data['rank'],
+                [data[f'up_{name}'] for name in names],
+                [data[f'down_{name}'] for name in names],
+            )
+
+    # -- queries ---------------------------------------------------------
+
+    def _edge(self, a, b):
+        """Stored (seconds, meters, middle) of edge a -> b"""
+        if self._rank[b] > self._rank[a]:
+            candidates = self._up[a]
+            key = b
+        else:
+            candidates = self._down[b]
+            key = a
+        for neighbour, seconds, meters, middle in candidates:
+            if neighbour == key:
+                return seconds, meters, middle
+        raise KeyError((a, b))
+
+    def unpack(self, nodes):
+        """Expand shortcuts in a node path into road nodes"""
+        path = [nodes[0]]
+        stack = [(a, b) for a, b in reversed(list(zip(nodes[:-1], nodes[1:])))]
+        while stack:
+            a, b = stack.pop()
+            middle = self._edge(a, b)[2]
+            if middle == NO_MIDDLE:
+                path.append(b)
+            else:
+                stack.append((middle, b))
+                stack.append((a, middle))
+        return path
+
+    def query(self, source, target, with_path=False):
+        """
+        Fastest source -> target: (seconds, meters, road nodes or None).
+        seconds is inf when the target can't be reached.
+        """
+        if source == target:
+            return 0.0, 0.0, [source] if with_path else None
+        costs = ({source: 0.0}, {target: 0.0})
+        lengths = ({source: 0.0}, {target: 0.0})
+        parents = ({source: None}, {target: None})
+        heaps = ([(0.0, source)], [(0.0, target)])
+        graphs = (self._up, self._down)
+        best, meeting = math.inf, None
+        settled = 0
+
+        while True:
+            # Expand the side with the cheaper frontier while it can still improve on best
+            sides = [side for side in (0, 1) if heaps[side] and heaps[side][0][0] < best]
+            if not sides:
+                break
+            side = min(sides, key=lambda s: heaps[s][0][0])
+            cost, node = heapq.heappop(heaps[side])
+            if cost > costs[side][node]:
+                continue
+            settled += 1
+            other = costs[1 - side].get(node)
+            if other is not None and cost + other < best:
+                best, meeting = cost + other, node
+            for neighbour, seconds, meters, _ in graphs[side][node]:
+                candidate = cost + seconds
+                if candidate < costs[side].get(neighbour, math.inf):
+                    costs[side][neighbour] = candidate
+                    lengths[side][neighbour] = lengths[side][node] + meters
+                    parents[side][neighbour] = node
+                    heapq.heappush(heaps[side], (candidate, neighbour))
+
+        self.settled += settled
+        if meeting is None:
+            return math.inf, math.inf, None
+        meters = lengths[0][meeting] + lengths[1][meeting]
+        if not with_path:
+            return best, meters, None
+        up_path = []
+        node = meeting
+        while node is not None:
+            up_path.append(node)
+            node = parents[0][node]
+        down_path = []
+        node = parents[1][meeting]
+        while node is not None:
+            down_path.append(node)
+            node = parents[1][node]
+        return best, meters, self.unpack(up_path[::-1] + down_path)
+
+    def _upward_search(self, start, graph):
+        """Every node reachable upward from start: {node: (seconds, meters)}"""
+        found = {start: (0.0, 0.0)}
+        heap = [(0.0, start)]
+        while heap:
+            cost, node = heapq.heappop(heap)
+            if cost > found[node][0]:
+                continue
+            self.settled += 1
+            length = found[node][1]
+            for neighbour, seconds, meters, _ in graph[node]:
+                candidate = cost + seconds
+                if candidate < found.get(neighbour, (math.inf,))[0]:
+                    found[neighbour] = (candidate, length + meters)
+                    heapq.heappush(heap, (candidate, neighbour))
+        return found
+
+    def many_to_many(self, sources, targets):
+        """(seconds, meters) matrices [len(sources), len(targets)]; inf where unreachable"""
+        seconds = np.full((len(sources), len(targets)), math.inf)
+        meters = np.full((len(sources), len(targets)), math.inf)
+        buckets = {}
+        for column, target in enumerate(targets):
+            for node, (cost, length) in self._upward_search(target, self._down).items():
+                buckets.setdefault(node, []).append((column, cost, length))
+        for row, source in enumerate(sources):
+            best = [math.inf] * len(targets)
+            best_meters = [math.inf] * len(targets)
+            for node, (cost, length) in self._upward_search(source, self._up).items():
+                for column, target_cost, target_length in buckets.get(node, ()):
+                    if cost + target_cost < best[column]:
+                        best[column] = cost + target_cost
+                        best_meters[column] = length + target_length
+            seconds[row] = best
+            meters[row] = best_meters
+        return seconds, meters
+
+
+def cache_path(source_path, cache_dir, default_speed_kph):
+    """Cache file for an extract: keyed by its contents and the speed setting"""
+    digest = hashlib.sha256()
+    with open(source_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    digest.update(f'{default_speed_kph}:{CACHE_FORMAT}'.encode())
+    return os.path.join(cache_dir, f'ch-{digest.hexdigest()[:16]}.npz')
+
+
+def load_or_build(source_path, cache_dir, default_speed_kph=30.0):
+    """(hierarchy, built) for an extract, reusing the cached preprocessing when present"""
+    path = cache_path(source_path, cache_dir, default_speed_kph)
+    if os.path.exists(path):
+        try:
+            return ContractionHierarchy.load(path), False
+        except (OSError, KeyError, ValueError) as e:
+            print(f"[ROUTING] Ignoring unreadable cache {path}: {e}", flush=True)
+    hierarchy = ContractionHierarchy.build(RoadGraph.from_file(source_path, default_speed_kph))
+    hierarchy.save(path)
+    return hierarchy, True
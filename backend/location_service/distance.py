@@ -0,0 +1,117 @@
+"""
+Distance calculations with selectable accuracy.
+
+    haversine        great-circle distance on a sphere of the mean Earth
+                     radius; off by up to ~0.5% (the sphere is not the
+                     ellipsoid), fine for coarse proximity tests at any range
+    equirectangular  flat projection around the mean latitude using the
+                     ellipsoid's local radii of curvature; cheapest, and
+                     within centimetres of geodesic at city scale (it degrades
+                     over hundreds of kilometres and near the poles)
+    geodesic         exact WGS-84 ellipsoid distance (geopy, Karney); slowest
+
+Every function returns meters. The *_many functions take NumPy arrays (or
+anything broadcastable) and compute a whole batch at once; geodesic has no
+vectorized form and falls back to a loop.
+"""
+
+import math
+
+import numpy as np
+from geopy.distance import geodesic
+
+HAVERSINE = 'haversine'
+EQUIRECTANGULAR = 'equirectangular'
+GEODESIC = 'geodesic'
+
+MODES = (HAVERSINE, EQUIRECTANGULAR, GEODESIC)
+
+# IUGG mean Earth radius
+EARTH_RADIUS_METERS = 6371008.8
+
+# WGS-84 semi-major axis and first eccentricity squared
+WGS84_A = 6378137.0
+WGS84_E2 = 0.00669437999014
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2.0) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_METERS * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def equirectangular(lat1, lng1, lat2, lng2):
+    phi = math.radians((lat1 + lat2) / 2.0)
+    w = 1.0 - WGS84_E2 * math.sin(phi) ** 2
+    prime_vertical = WGS84_A / math.sqrt(w)
+    meridional = prime_vertical * (1.0 - WGS84_E2) / w
+    dlng = (lng2 - lng1 + 180.0) % 360.0 - 180.0
+    x = math.radians(dlng) * prime_vertical * math.cos(phi)
+    y = math.radians(lat2 - lat1) * meridional
+    return math.hypot(x, y)
+
+
+def geodesic_distance(lat1, lng1, lat2, lng2):
+    return geodesic((lat1, lng1), (lat2, lng2)).meters
+
+
+def haversine_many(lat1, lng1, lat2, lng2):
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = np.radians(np.asarray(lng2) - np.asarray(lng1))
+    a = np.sin(dphi / 2.0) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlmb / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def equirectangular_many(lat1, lng1, lat2, lng2):
+    lat1 = np.asarray(lat1, dtype=float)
+    lat2 = np.asarray(lat2, dtype=float)
+    phi = np.radians((lat1 + lat2) / 2.0)
+    w = 1.0 - WGS84_E2 * np.sin(phi) ** 2
+    prime_vertical = WGS84_A / np.sqrt(w)
+    meridional = prime_vertical * (1.0 - WGS84_E2) / w
+    dlng = (np.asarray(lng2) - np.asarray(lng1) + 180.0) % 360.0 - 180.0
+    x = np.radians(dlng) * prime_vertical * np.cos(phi)
+    y = np.radians(lat2 - lat1) * meridional
+    return np.hypot(x, y)
+
+
+def geodesic_many(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = np.broadcast_arrays(lat1, lng1, lat2, lng2)
+    out = np.empty(lat1.shape, dtype=float)
+    for index in np.ndindex(out.shape):
+        out[index] = geodesic_distance(lat1[index], lng1[index], lat2[index], lng2[index])
+    return out
+
+
+_SCALAR = {
+    HAVERSINE: haversine,
+    EQUIRECTANGULAR: equirectangular,
+    GEODESIC: geodesic_distance,
+}
+
+_MANY = {
+    HAVERSINE: haversine_many,
+    EQUIRECTANGULAR: equirectangular_many,
+    GEODESIC: geodesic_many,
+}
+
+
+def check_mode(mode):
+    if mode not in _SCALAR:
+        raise ValueError(f"Unknown distance mode {mode!r} (expected one of {', '.join(MODES)})")
+    return mode
+
+
+def distance(mode, lat1, lng1, lat2, lng2):
+    """Distance in meters between two points"""
+    return _SCALAR[check_mode(mode)](lat1, lng1, lat2, lng2)
+
+
+def distance_many(mode, lat1, lng1, lat2, lng2):
+    """Element-wise distances in meters over broadcast arrays"""
+    return _MANY[check_mode(mode)](lat1, lng1, lat2, lng2)
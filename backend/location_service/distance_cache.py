@@ -0,0 +1,90 @@
+"""
+Memo of pairwise distances keyed on quantized coordinates.
+
+Stations never move and simulated routes are re-driven, so IsNearby and
+CalculateDistance see the same coordinate pairs over and over. Coordinates are
+rounded to `precision` decimal places (6 places is ~0.1 m) and the distance is
+computed between the rounded points, so every query that rounds to the same
+key gets the same answer whichever came first. A pair and its reverse share
+one entry. Entries are bounded, least recently used evicted first; distances
+never go stale, so there is no TTL.
+
+With the cache disabled, distances are computed from the exact coordinates as
+before.
+"""
+
+import threading
+from collections import OrderedDict
+
+import distance
+
+
+class DistanceCache:
+
+    def __init__(self, max_entries=100000, precision=6, enabled=True):
+        self.max_entries = max_entries
+        self.precision = precision
+        self.enabled = enabled and max_entries > 0
+        self._scale = 10 ** precision
+
+        self._entries = OrderedDict()   # (mode, a, b) -> meters
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _key(self, mode, lat1, lng1, lat2, lng2):
+        scale = self._scale
+        a = (round(lat1 * scale), round(lng1 * scale))
+        b = (round(lat2 * scale), round(lng2 * scale))
+        return (mode, a, b) if a <= b else (mode, b, a)
+
+    def distance(self, mode, lat1, lng1, lat2, lng2):
+        """Distance in meters, from the cache when this pair was seen before"""
+        if not self.enabled:
+            return distance.distance(mode, lat1, lng1, lat2, lng2)
+
+        key = self._key(distance.check_mode(mode), lat1, lng1, lat2, lng2)
+        with self._lock:
+            meters = self._entries.get(key)
+            if meters is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return meters
+            self.misses += 1
+
+        # Computed outside the lock (geodesic is slow); a concurrent miss on
+        # the same key just computes the same value twice
+        _, (qlat1, qlng1), (qlat2, qlng2) = key
+        scale = self._scale
+        meters = distance.distance(mode, qlat1 / scale, qlng1 / scale, qlat2 / scale, qlng2 / scale)
+
+        with self._lock:
+            self._entries[key] = meters
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return meters
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'precision': self.precision,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions
+            }
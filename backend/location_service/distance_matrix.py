@@ -0,0 +1,338 @@
+"""
+Precomputed station distances in memory-mapped float32 files.
+
+Matching, route insertion and analytics keep asking for the same
+station-to-station (and station-to-area) distances. They are computed once,
+written to .npy files and memory-mapped, so a lookup is a memory read, and
+any process that opens the same directory shares the pages instead of
+holding its own copy.
+
+Files in the matrix directory:
+
+    stations-<gen>.npy  float32 [capacity, capacity], slot x slot
+    cells-<gen>.npy     float32 [capacity, grid cells], slot x cell centre
+                        (only with a destination grid)
+    meta.json           slot and coordinates of every station, mode, grid,
+                        station version and the current file generation
+
+Every station owns a slot. sync() only computes the rows and columns of
+stations that were added or moved. A removed station's slot is retired, not
+reused in the same generation: a reader still holding the previous meta.json
+would otherwise read another station's distances under the removed id. When
+the free slots run out, the matrix moves to a new file generation, doubling
+its capacity if retiring slots is not enough (the old block is copied, not
+recomputed), and retired slots are free again there.
+meta.json is replaced atomically after the data is written, so a reader never
+sees a station whose distances are not there yet. Files from another mode or grid are discarded
+and rebuilt.
+"""
+
+import json
+import os
+import threading
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from distance import distance_many
+
+META_FILE = 'meta.json'
+
+
+class DestinationGrid:
+    """Regular lat/lng grid of destination cells; cell id = row * cols + col, row 0 at min_lat"""
+
+    def __init__(self, min_lat, min_lng, max_lat, max_lng, cell_deg=0.01):
+        if max_lat <= min_lat or max_lng <= min_lng or cell_deg <= 0:
+            raise ValueError("Destination grid needs min < max and a positive cell size")
+        self.min_lat = min_lat
+        self.min_lng = min_lng
+        self.cell_deg = cell_deg
+        self.rows = int(np.ceil((max_lat - min_lat) / cell_deg - 1e-9))
+        self.cols = int(np.ceil((max_lng - min_lng) / cell_deg - 1e-9))
+
+    @classmethod
+    def from_spec(cls, spec):
+        return cls(spec['min_lat'], spec['min_lng'],
+                   spec['min_lat'] + spec['rows'] * spec['cell_deg'],
+                   spec['min_lng'] + spec['cols'] * spec['cell_deg'], spec['cell_deg'])
+
+    @classmethod
+    def from_setting(cls, value, cell_deg):
+        """'min_lat,min_lng,max_lat,max_lng', or None when empty"""
+        if not value:
+            return None
+        return cls(*[float(part) for part in value.split(',')], cell_deg=cell_deg)
+
+    def __len__(self):
+        return self.rows * self.cols
+
+    def cell_ids(self, lats, lngs):
+        """Cell containing each point; -1 outside the grid"""
+        rows = np.floor((np.asarray(lats, dtype=float) - self.min_lat) / self.cell_deg).astype(np.int64)
+        cols = np.floor((np.asarray(lngs, dtype=float) - self.min_lng) / self.cell_deg).astype(np.int64)
+        inside = (rows >= 0) & (rows < self.rows) & (cols >= 0) & (cols < self.cols)
+        return np.where(inside, rows * self.cols + cols, -1)
+
+    def cell_id(self, lat, lng):
+        """Cell containing the point, or None outside the grid"""
+        cell = int(self.cell_ids([lat], [lng])[0])
+        return cell if cell >= 0 else None
+
+    def centres(self):
+        """(lats, lngs) of every cell centre, by cell id"""
+        rows, cols = np.divmod(np.arange(len(self)), self.cols)
+        return (self.min_lat + (rows + 0.5) * self.cell_deg,
+                self.min_lng + (cols + 0.5) * self.cell_deg)
+
+    def spec(self):
+        return {'min_lat': self.min_lat, 'min_lng': self.min_lng, 'cell_deg': self.cell_deg,
+                'rows': self.rows, 'cols': self.cols}
+
+
+class StationDistanceMatrix:
+
+    def __init__(self, directory, mode, grid=None, initial_capacity=64, read_only=False):
+        self.directory = directory
+        self.mode = mode
+        self.grid = grid
+        self.initial_capacity = initial_capacity
+        self.read_only = read_only
+
+        self.station_version = 0
+        self.generation = 0
+        self.capacity = 0
+        self._slots = {}            # station id -> (slot, lat, lng)
+        self._retired = set()       # slots of removed stations, free from the next generation
+        self._stations = None       # memmap [capacity, capacity]
+        self._cells = None          # memmap [capacity, grid cells]
+        self._meta_mtime = None
+        self._lock = threading.Lock()
+
+        self.rows_computed = 0
+        self.lookups = 0
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def open(self):
+        """Map the files left by a previous run; returns False when there are none usable"""
+        with self._lock:
+            return self._load()
+
+    def _load(self):
+        try:
+            meta_path = self._path(META_FILE)
+            mtime = os.stat(meta_path).st_mtime_ns
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if self.read_only:
+                self.mode = meta['mode']
+                self.grid = DestinationGrid.from_spec(meta['grid']) if meta['grid'] else None
+            elif meta['mode'] != self.mode or meta['grid'] != (self.grid.spec() if self.grid else None):
+                print("[DISTANCE MATRIX] Mode or grid changed, rebuilding", flush=True)
+                # Next generation, so files a reader still maps are not overwritten
+                self.generation = meta['generation']
+                return False
+            map_mode = 'r' if self.read_only else 'r+'
+            stations = np.load(self._path(meta['stations_file']), mmap_mode=map_mode)
+            cells = np.load(self._path(meta['cells_file']), mmap_mode=map_mode) if meta['cells_file'] else None
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"[DISTANCE MATRIX] Ignoring unreadable matrix in {self.directory}: {e}", flush=True)
+            return False
+
+        self._stations, self._cells = stations, cells
+        self._slots = {int(station_id): tuple(entry) for station_id, entry in meta['stations'].items()}
+        self._retired = set(meta.get('retired_slots', []))
+        self.capacity = stations.shape[0]
+        self.generation = meta['generation']
+        self.station_version = meta['station_version']
+        self._meta_mtime = mtime
+        return True
+
+    def _reload_if_changed(self):
+        """Readers pick up a new meta.json written by the owning process"""
+        try:
+            mtime = os.stat(self._path(META_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._meta_mtime:
+            self._load()
+
+    def sync(self, stations, station_version):
+        """
+        Bring the matrix in line with a station list ({'id', 'lat', 'lng'}
+        dicts). Only added and moved stations are computed. Returns the
+        number of stations (re)computed.
+        """
+        if self.read_only:
+            raise RuntimeError("Distance matrix opened read-only")
+        with self._lock:
+            current = {station['id']: (station['lat'], station['lng']) for station in stations}
+            removed = [station_id for station_id in self._slots if station_id not in current]
+            changed = [
+                station_id for station_id, coords in current.items()
+                if station_id not in self._slots or tuple(self._slots[station_id][1:]) != coords
+            ]
+            if not removed and not changed and self._stations is not None:
+                if station_version != self.station_version:
+                    self.station_version = station_version
+                    self._write_meta()
+                return 0
+
+            for station_id in removed:
+                slot = self._slots.pop(station_id)[0]
+                self._stations[slot, :] = np.nan
+                self._stations[:, slot] = np.nan
+                self._retired.add(slot)
+            free = sorted(
+                set(range(self.capacity)) - self._retired - {slot for slot, _, _ in self._slots.values()},
+                reverse=True
+            )
+
+            added = [station_id for station_id in changed if station_id not in self._slots]
+            if self._stations is None or len(added) > len(free):
+                free = self._grow(len(self._slots) + len(added))
+            for station_id in changed:
+                slot = self._slots[station_id][0] if station_id in self._slots else free.pop()
+                self._slots[station_id] = (slot, *current[station_id])
+
+            self._compute([self._slots[station_id][0] for station_id in changed])
+            self.station_version = station_version
+            self._stations.flush()
+            if self._cells is not None:
+                self._cells.flush()
+            self._write_meta()
+            print(f"[DISTANCE MATRIX] {len(changed)} station(s) computed, {len(removed)} removed "
+                  f"({len(self._slots)} stations, capacity {self.capacity}, version {station_version})", flush=True)
+            return len(changed)
+
+    def _grow(self, needed):
+        """Move to a bigger file generation; returns the free slots, highest first"""
+        capacity = max(self.initial_capacity, self.capacity)
+        while capacity < needed:
+            capacity *= 2
+        old_stations, old_cells, old_capacity = self._stations, self._cells, self.capacity
+        generation = self.generation + 1
+
+        os.makedirs(self.directory, exist_ok=True)
+        stations = open_memmap(self._path(f'stations-{generation}.npy'), mode='w+',
+                               dtype=np.float32, shape=(capacity, capacity))
+        stations[:] = np.nan
+        cells = None
+        if self.grid is not None:
+            cells = open_memmap(self._path(f'cells-{generation}.npy'), mode='w+',
+                                dtype=np.float32, shape=(capacity, len(self.grid)))
+            cells[:] = np.nan
+        if old_stations is not None:
+            stations[:old_capacity, :old_capacity] = old_stations
+            if cells is not None and old_cells is not None:
+                cells[:old_capacity] = old_cells
+
+        self._stations, self._cells = stations, cells
+        self.capacity = capacity
+        self.generation = generation
+        self._retired = set()
+        used = {slot for slot, _, _ in self._slots.values()}
+        return sorted(set(range(capacity)) - used, reverse=True)
+
+    def _compute(self, slots):
+        if not slots:
+            return
+        active = np.array(sorted(slot for slot, _, _ in self._slots.values()))
+        lats = np.empty(self.capacity)
+        lngs = np.empty(self.capacity)
+        for slot, lat, lng in self._slots.values():
+            lats[slot], lngs[slot] = lat, lng
+        if self.grid is not None:
+            cell_lats, cell_lngs = self.grid.centres()
+        for slot in slots:
+            row = distance_many(self.mode, lats[slot], lngs[slot], lats[active], lngs[active])
+            self._stations[slot, active] = row
+            self._stations[active, slot] = row
+            if self._cells is not None:
+                self._cells[slot] = distance_many(self.mode, lats[slot], lngs[slot], cell_lats, cell_lngs)
+        self.rows_computed += len(slots)
+
+    def _write_meta(self):
+        meta = {
+            'mode': self.mode,
+            'grid': self.grid.spec() if self.grid else None,
+            'generation': self.generation,
+            'station_version': self.station_version,
+            'stations_file': f'stations-{self.generation}.npy',
+            'cells_file': f'cells-{self.generation}.npy' if self._cells is not None else None,
+            'stations': {str(station_id): list(entry) for station_id, entry in self._slots.items()},
+            'retired_slots': sorted(self._retired)
+        }
+        tmp_path = self._path(META_FILE + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._path(META_FILE))
+        self._meta_mtime = os.stat(self._path(META_FILE)).st_mtime_ns
+        # Older generations are unlinked; readers that still map them keep
+        # working until they reload
+        current = {meta['stations_file'], meta['cells_file']}
+        for name in os.listdir(self.directory):
+            if name.endswith('.npy') and name.startswith(('stations-', 'cells-')) and name not in current:
+                try:
+                    os.remove(self._path(name))
+                except FileNotFoundError:
+                    pass
+
+    def lookup(self, origin_ids=None, destination_ids=None, cell_ids=None):
+        """
+        Distances from origin stations to destination stations and grid
+        cells (columns: stations, then cells). None for origins or
+        destinations means every station. Returns (origins, destinations,
+        cells, float32 matrix, unknown station ids, unknown cell ids); unknown
+        ids are left out of the matrix.
+        """
+        with self._lock:
+            if self.read_only:
+                self._reload_if_changed()
+            self.lookups += 1
+            return self._lookup(origin_ids, destination_ids, cell_ids)
+
+    def _lookup(self, origin_ids, destination_ids, cell_ids):
+        slots, stations_map, cells_map = self._slots, self._stations, self._cells
+        unknown = []
+        if origin_ids is None:
+            origin_ids = sorted(slots)
+        if destination_ids is None:
+            destination_ids = sorted(slots)
+        origins = [station_id for station_id in origin_ids if station_id in slots]
+        destinations = [station_id for station_id in destination_ids if station_id in slots]
+        for station_id in list(origin_ids) + list(destination_ids):
+            if station_id not in slots and station_id not in unknown:
+                unknown.append(station_id)
+
+        cell_count = cells_map.shape[1] if cells_map is not None else 0
+        cells = [cell_id for cell_id in (cell_ids or []) if 0 <= cell_id < cell_count]
+        unknown_cells = [cell_id for cell_id in (cell_ids or []) if not 0 <= cell_id < cell_count]
+
+        origin_slots = np.array([slots[station_id][0] for station_id in origins], dtype=np.intp)
+        destination_slots = np.array([slots[station_id][0] for station_id in destinations], dtype=np.intp)
+        matrix = np.empty((len(origins), len(destinations) + len(cells)), dtype=np.float32)
+        if len(origins) and stations_map is not None:
+            matrix[:, :len(destinations)] = stations_map[np.ix_(origin_slots, destination_slots)]
+            if cells:
+                matrix[:, len(destinations):] = cells_map[np.ix_(origin_slots, np.array(cells, dtype=np.intp))]
+        return origins, destinations, cells, matrix, unknown, unknown_cells
+
+    def stats(self):
+        return {
+            'stations': len(self._slots),
+            'capacity': self.capacity,
+            'grid_cells': len(self.grid) if self.grid else 0,
+            'generation': self.generation,
+            'station_version': self.station_version,
+            'retired_slots': len(self._retired),
+            'rows_computed': self.rows_computed,
+            'lookups': self.lookups
+        }
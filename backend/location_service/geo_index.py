@@ -0,0 +1,115 @@
+"""
+Grid index for radius and nearest-neighbour queries over a fixed set of points.
+
+Points are bucketed into a uniform lat/lng grid. A radius query only visits
+the cells overlapping a conservative bounding box of the circle and computes
+distances (in the requested mode, see distance.py) for the points in them in
+one vectorized call, so results match the pairwise RPCs while skipping most
+pairs.
+"""
+
+import math
+
+import numpy as np
+
+from distance import distance_many
+
+# Shortest length of one degree of latitude (ellipsoid) and of longitude at the
+# equator (sphere, the smaller of the two models). Dividing by these
+# over-estimates degree spans; BOX_MARGIN also covers great circles bulging
+# poleward, so boxes never cut the circle in any distance mode.
+MIN_METERS_PER_DEGREE_LAT = 110574.0
+MIN_METERS_PER_DEGREE_LNG_EQUATOR = 111195.0
+BOX_MARGIN = 1.02
+
+# Half the Earth's circumference: no two points are further apart
+MAX_DISTANCE_METERS = 20040000.0
+
+
+def degree_box(lat, meters):
+    """(dlat, dlng) degree half-widths of a box containing the circle"""
+    meters *= BOX_MARGIN
+    dlat = meters / MIN_METERS_PER_DEGREE_LAT
+    edge_lat = min(abs(lat) + dlat, 90.0)
+    cos_lat = math.cos(math.radians(edge_lat))
+    if cos_lat < 1e-6:
+        return dlat, 360.0
+    return dlat, min(meters / (MIN_METERS_PER_DEGREE_LNG_EQUATOR * cos_lat), 360.0)
+
+
+class PointGrid:
+
+    def __init__(self, points, cell_deg=0.01):
+        """points: list of (lat, lng); queries return indices into it"""
+        self.points = list(points)
+        self.lats = np.array([lat for lat, _ in self.points], dtype=float)
+        self.lngs = np.array([lng for _, lng in self.points], dtype=float)
+        self.cell_deg = cell_deg
+        cells = {}
+        for index, (lat, lng) in enumerate(self.points):
+            cells.setdefault(self._cell(lat, lng), []).append(index)
+        self._cells = {cell: np.array(indices) for cell, indices in cells.items()}
+        self.distances_computed = 0
+
+    def __len__(self):
+        return len(self.points)
+
+    def _cell(self, lat, lng):
+        return (math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg))
+
+    def _candidates(self, lat, lng, meters):
+        dlat, dlng = degree_box(lat, meters)
+        row_lo, col_lo = self._cell(lat - dlat, lng - dlng)
+        row_hi, col_hi = self._cell(lat + dlat, lng + dlng)
+        wraps = lng - dlng < -180.0 or lng + dlng > 180.0
+        if wraps or (row_hi - row_lo + 1) * (col_hi - col_lo + 1) > len(self._cells):
+            # Box wraps the antimeridian or is larger than the occupied grid
+            return np.arange(len(self.points))
+        blocks = [
+            self._cells[(row, col)]
+            for row in range(row_lo, row_hi + 1)
+            for col in range(col_lo, col_hi + 1)
+            if (row, col) in self._cells
+        ]
+        return np.concatenate(blocks) if blocks else np.empty(0, dtype=int)
+
+    def within(self, lat, lng, meters, mode):
+        """[(distance, index)] of points within `meters`, closest first"""
+        candidates = self._candidates(lat, lng, meters)
+        if not len(candidates):
+            return []
+        distances = distance_many(mode, lat, lng, self.lats[candidates], self.lngs[candidates])
+        self.distances_computed += len(candidates)
+        inside = distances <= meters
+        order = np.argsort(distances[inside], kind='stable')
+        return list(zip(distances[inside][order].tolist(), candidates[inside][order].tolist()))
+
+    def nearest(self, lat, lng, k, mode, max_meters=None, start_meters=1000.0):
+        """
+        [(distance, index)] of the k nearest points (within max_meters if
+        given), closest first. The search radius doubles until k points are
+        inside it; anything outside the radius is further than those.
+        """
+        if k <= 0 or not self.points:
+            return []
+        limit = min(max_meters, MAX_DISTANCE_METERS) if max_meters else MAX_DISTANCE_METERS
+        radius = min(start_meters, limit)
+        while True:
+            found = self.within(lat, lng, radius, mode)
+            if len(found) >= k or radius >= limit:
+                return found[:k]
+            radius = min(radius * 2.0, limit)
+
+
+def nearby_pairs(points, targets, threshold_meters, mode, cell_deg=0.01):
+    """
+    (point index, target index, distance) for every point/target pair within
+    threshold_meters, grouped by point and closest target first. Returns the
+    pairs and the number of exact distances computed.
+    """
+    grid = PointGrid(targets, cell_deg)
+    pairs = []
+    for point_index, (lat, lng) in enumerate(points):
+        for distance, target_index in grid.within(lat, lng, threshold_meters, mode):
+            pairs.append((point_index, target_index, distance))
+    return pairs, grid.distances_computed
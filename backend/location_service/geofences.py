@@ -0,0 +1,152 @@
+"""
+Registry of circular geofences (stations) with per-entity enter/exit state.
+
+Instead of asking IsNearby about every station on every tick, callers stream
+entity positions and only hear about transitions: ENTER when an entity comes
+within a fence's radius, EXIT when it leaves. Fence centres are grid-indexed
+(see geo_index.py), so an update only measures the fences around it and costs
+the same however many fences are registered.
+
+An entity counts as inside until it is further than radius + the exit
+hysteresis, so GPS jitter at the edge does not produce ENTER/EXIT flapping.
+Entities that are inside no fence take no memory; forget() drops one
+explicitly (EXIT for every fence it was in).
+
+Everything here lives in one process. With several location service replicas
+each pod must hold the same fences, so the server loads them on every pod
+from the shared station snapshot (sync_stations()). Entity state is per
+entity id but still per pod: a stream that reconnects to another replica
+starts from "inside nothing" and hears ENTER again for the fences it is in,
+so clients must treat a repeated ENTER as a no-op.
+"""
+
+import threading
+
+import numpy as np
+
+from geo_index import PointGrid
+
+ENTER = 'ENTER'
+EXIT = 'EXIT'
+
+
+class GeofenceRegistry:
+
+    def __init__(self, mode, exit_hysteresis_meters=0.0, cell_deg=0.01):
+        self.mode = mode
+        self.exit_hysteresis_meters = exit_hysteresis_meters
+        self.cell_deg = cell_deg
+        self.version = 0
+        self.station_version = 0
+
+        self._fences = {}       # fence id -> (lat, lng, radius_meters)
+        self._ids = []          # grid index -> fence id
+        self._radii = np.empty(0)
+        self._max_radius = 0.0
+        self._grid = None
+        self._inside = {}       # entity id -> {fence id: distance}
+        self._lock = threading.Lock()
+
+        self.updates = 0
+        self.enters = 0
+        self.exits = 0
+        self.distances_computed = 0
+
+    def __len__(self):
+        return len(self._fences)
+
+    def set_fences(self, fences, replace=False):
+        """
+        Add or move fences, given as (fence id, lat, lng, radius_meters).
+        With replace, fences not listed are dropped. Entities inside a fence
+        that moved or went away get their EXIT on their next update.
+        """
+        for _, _, _, radius in fences:
+            if radius <= 0:
+                raise ValueError(f"Geofence radius must be positive (got {radius})")
+        with self._lock:
+            if replace:
+                self._fences.clear()
+            for fence_id, lat, lng, radius in fences:
+                self._fences[fence_id] = (lat, lng, radius)
+            self._rebuild()
+            return len(self._fences)
+
+    def sync_stations(self, stations, version, radius_meters):
+        """Replace the fences with one of radius_meters around every station"""
+        count = self.set_fences(
+            [(station['id'], station['lat'], station['lng'], radius_meters) for station in stations], replace=True
+        )
+        self.station_version = version
+        return count
+
+    def remove_fences(self, fence_ids):
+        with self._lock:
+            for fence_id in fence_ids:
+                self._fences.pop(fence_id, None)
+            self._rebuild()
+            return len(self._fences)
+
+    def _rebuild(self):
+        self._ids = list(self._fences)
+        self._grid = PointGrid([self._fences[i][:2] for i in self._ids], self.cell_deg)
+        self._radii = np.array([self._fences[i][2] for i in self._ids], dtype=float)
+        self._max_radius = float(self._radii.max()) if self._ids else 0.0
+        self.version += 1
+
+    def update(self, entity_id, lat, lng):
+        """[(ENTER | EXIT, fence id, distance meters)], exits first"""
+        with self._lock:
+            self.updates += 1
+            previous = self._inside.get(entity_id, {})
+            current = {}
+            nearby = {}
+            if self._ids:
+                before = self._grid.distances_computed
+                found = self._grid.within(lat, lng, self._max_radius + self.exit_hysteresis_meters, self.mode)
+                self.distances_computed += self._grid.distances_computed - before
+                for distance, index in found:
+                    fence_id = self._ids[index]
+                    radius = self._radii[index]
+                    if fence_id in previous:
+                        radius += self.exit_hysteresis_meters
+                    nearby[fence_id] = distance
+                    if distance <= radius:
+                        current[fence_id] = distance
+
+            exits = [(EXIT, fence_id, nearby.get(fence_id, -1.0))
+                     for fence_id in sorted(previous) if fence_id not in current]
+            enters = [(ENTER, fence_id, current[fence_id])
+                      for fence_id in sorted(current) if fence_id not in previous]
+            if current:
+                self._inside[entity_id] = current
+            else:
+                self._inside.pop(entity_id, None)
+            self.exits += len(exits)
+            self.enters += len(enters)
+            return exits + enters
+
+    def forget(self, entity_id):
+        """Drop an entity's state: EXIT for every fence it was in"""
+        with self._lock:
+            previous = self._inside.pop(entity_id, {})
+            self.exits += len(previous)
+            return [(EXIT, fence_id, -1.0) for fence_id in sorted(previous)]
+
+    def inside(self, entity_id):
+        """Fence ids the entity is currently in"""
+        with self._lock:
+            return sorted(self._inside.get(entity_id, {}))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'geofences': len(self._fences),
+                'version': self.version,
+                'station_version': self.station_version,
+                'entities_inside': len(self._inside),
+                'updates': self.updates,
+                'enters': self.enters,
+                'exits': self.exits,
+                'distances_computed': self.distances_computed
+            }
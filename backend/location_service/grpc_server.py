@@ -1,21 +1,135 @@
 import sys
 import os
+import time
 import grpc
 from concurrent import futures
-from geopy.distance import geodesic
 
 # Import generated proto files
 # Import generated proto files
 # sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'proto_generated'))
 from proto_generated import location_pb2
 from proto_generated import location_pb2_grpc
+from proto_generated import station_pb2_grpc
+
+import distance
+from catchments import StationCatchments
+from contraction_hierarchy import load_or_build
+from distance_cache import DistanceCache
+from distance_matrix import DestinationGrid, StationDistanceMatrix
+from geo_index import nearby_pairs
+from geofences import GeofenceRegistry, ENTER
+from road_graph import RoadGraph
+from route_eta import RouteProfile
+from station_index import StationIndex
+
+STATION_SERVICE_HOST = os.environ.get('STATION_SERVICE_HOST', 'localhost')
+STATION_SERVICE_PORT = os.environ.get('STATION_SERVICE_PORT', '50052')
+# How often NearestStations re-checks the station snapshot version
+STATION_REFRESH_SECONDS = float(os.environ.get('STATION_REFRESH_SECONDS', '5'))
+# Distance mode for requests that leave mode at DEFAULT: haversine | equirectangular | geodesic
+DISTANCE_MODE = distance.check_mode(os.environ.get('DISTANCE_MODE', distance.EQUIRECTANGULAR))
+# Memo of IsNearby / CalculateDistance results; coordinates rounded to
+# DISTANCE_CACHE_PRECISION decimal places (6 = ~0.1 m) form the key
+DISTANCE_CACHE_ENABLED = os.environ.get('DISTANCE_CACHE_ENABLED', 'true').lower() == 'true'
+DISTANCE_CACHE_MAX_ENTRIES = int(os.environ.get('DISTANCE_CACHE_MAX_ENTRIES', '100000'))
+DISTANCE_CACHE_PRECISION = int(os.environ.get('DISTANCE_CACHE_PRECISION', '6'))
+# An entity inside a geofence only EXITs once further than radius + this
+GEOFENCE_EXIT_HYSTERESIS_METERS = float(os.environ.get('GEOFENCE_EXIT_HYSTERESIS_METERS', '10'))
+# Geofences are one circle of this radius per station, loaded on every replica
+# from the station snapshot. 0 registers them through SetGeofences instead,
+# which only reaches one pod: run a single replica then.
+GEOFENCE_RADIUS_METERS = float(os.environ.get('GEOFENCE_RADIUS_METERS', '100'))
+# Station distance matrix files (memory-mapped); empty disables GetDistanceMatrix
+DISTANCE_MATRIX_DIR = os.environ.get('DISTANCE_MATRIX_DIR', '/tmp/location_service/distance_matrix')
+DISTANCE_MATRIX_MODE = distance.check_mode(os.environ.get('DISTANCE_MATRIX_MODE', DISTANCE_MODE))
+# Optional destination grid 'min_lat,min_lng,max_lat,max_lng' for station-to-cell distances
+DISTANCE_MATRIX_GRID = os.environ.get('DISTANCE_MATRIX_GRID', '')
+DISTANCE_MATRIX_GRID_CELL_DEG = float(os.environ.get('DISTANCE_MATRIX_GRID_CELL_DEG', '0.01'))
+# Average speed for EstimateArrival when the request has none (30 km/h)
+ETA_SPEED_MPS = float(os.environ.get('ETA_SPEED_MPS', '8.33'))
+# Road network extract (GeoJSON, or OSM XML with a .osm suffix) for Route /
+# TravelTimeMatrix; empty (the default) disables routing. Preprocessing is
+# cached in ROAD_GRAPH_CACHE_DIR, keyed by the file's contents.
+# data/test_road_graph.geojson is a small synthetic grid for tests only.
+ROAD_GRAPH_PATH = os.environ.get('ROAD_GRAPH_PATH', '')
+ROAD_GRAPH_CACHE_DIR = os.environ.get('ROAD_GRAPH_CACHE_DIR', '/tmp/location_service/road_graph')
+# Speed for roads with neither maxspeed nor a known highway class
+ROAD_DEFAULT_SPEED_KPH = float(os.environ.get('ROAD_DEFAULT_SPEED_KPH', '30'))
+# ch: contraction hierarchy (preprocessed) | astar: plain graph, no preprocessing
+ROAD_GRAPH_ALGORITHM = os.environ.get('ROAD_GRAPH_ALGORITHM', 'ch').lower()
+# Points further than this from every road node are off the network:
+# Route fails and TravelTimeMatrix reports them unreachable
+ROAD_SNAP_MAX_METERS = float(os.environ.get('ROAD_SNAP_MAX_METERS', '250'))
+# Station catchments: time budgets for StationsReachableFrom, and the cell
+# grid ('min_lat,min_lng,max_lat,max_lng'; empty disables catchments).
+# Travel times come from the road graph, or straight lines at ETA_SPEED_MPS.
+CATCHMENT_BUDGETS_SECONDS = [
+    float(budget) for budget in os.environ.get('CATCHMENT_BUDGETS_SECONDS', '120,300,600').split(',') if budget
+]
+CATCHMENT_GRID = os.environ.get('CATCHMENT_GRID', '')
+CATCHMENT_GRID_CELL_DEG = float(os.environ.get('CATCHMENT_GRID_CELL_DEG', '0.005'))
+# Each open TrackGeofences stream holds one worker thread
+GRPC_MAX_WORKERS = int(os.environ.get('GRPC_MAX_WORKERS', '10'))
+
+REQUEST_MODES = {
+    location_pb2.HAVERSINE: distance.HAVERSINE,
+    location_pb2.EQUIRECTANGULAR: distance.EQUIRECTANGULAR,
+    location_pb2.GEODESIC: distance.GEODESIC,
+}
+RESPONSE_MODES = {mode: value for value, mode in REQUEST_MODES.items()}
+
+
+def request_mode(request):
+    """Distance mode asked for by a request, or the configured default"""
+    return REQUEST_MODES.get(request.mode, DISTANCE_MODE)
 
 
 class LocationServiceServicer(location_pb2_grpc.LocationServiceServicer):
     """
-    Stateless Location Service for geospatial calculations.
+    Location Service for geospatial calculations. Pairwise results are
+    memoized in a distance cache, batch calculations are stateless,
+    NearestStations and GetDistanceMatrix use the stations loaded from the
+    Station Service, TrackGeofences checks positions against the registered
+    geofences, Route / TravelTimeMatrix search the road graph (through its
+    contraction hierarchy when there is one) and StationsReachableFrom reads
+    the station catchment bitsets.
     """
     
+    def __init__(self, station_index=None, distance_cache=None, geofences=None, distance_matrix=None,
+                 road_graph=None, hierarchy=None, catchments=None):
+        self.station_index = station_index
+        self.distance_cache = distance_cache if distance_cache is not None else DistanceCache(enabled=False)
+        self.geofences = geofences if geofences is not None else GeofenceRegistry(DISTANCE_MODE)
+        self.distance_matrix = distance_matrix
+        self.hierarchy = hierarchy
+        self.road_graph = hierarchy.graph if hierarchy is not None else road_graph
+        self.catchments = catchments
+    
+    def sync_distance_matrix(self):
+        """Compute matrix rows for stations added or moved since the last sync"""
+        self.station_index.refresh()
+        # Version 0: never loaded (Station Service down); keep serving the files
+        if self.station_index.version and self.station_index.version != self.distance_matrix.station_version:
+            self.distance_matrix.sync(self.station_index.stations, self.station_index.version)
+    
+    def sync_geofences(self):
+        """Reload the station geofences when the station snapshot changed"""
+        self.station_index.refresh()
+        if self.station_index.version and self.station_index.version != self.geofences.station_version:
+            self.geofences.sync_stations(
+                self.station_index.stations, self.station_index.version, GEOFENCE_RADIUS_METERS
+            )
+    
+    def station_geofences(self):
+        """True when geofences follow the station snapshot instead of SetGeofences"""
+        return GEOFENCE_RADIUS_METERS > 0 and self.station_index is not None
+    
+    def sync_catchments(self):
+        """Recompute catchments of stations added or moved since the last sync"""
+        self.station_index.refresh()
+        if self.station_index.version and self.station_index.version != self.catchments.station_version:
+            self.catchments.sync(self.station_index.stations, self.station_index.version)
+    
     def IsNearby(self, request, context):
         """
         Check if two coordinates are within a threshold distance.
@@ -26,7 +140,7 @@ class LocationServiceServicer(location_pb2_grpc.LocationServiceServicer):
             coord2 = (request.lat2, request.lng2)
             
             # Calculate distance in meters
-            distance_meters = geodesic(coord1, coord2).meters
+            distance_meters = self.distance_cache.distance(request_mode(request), *coord1, *coord2)
             
             # Default threshold is 100 meters
             threshold = request.threshold_meters if request.threshold_meters > 0 else 100.0
@@ -54,7 +168,7 @@ class LocationServiceServicer(location_pb2_grpc.LocationServiceServicer):
             coord1 = (request.lat1, request.lng1)
             coord2 = (request.lat2, request.lng2)
             
-            distance_meters = geodesic(coord1, coord2).meters
+            distance_meters = self.distance_cache.distance(request_mode(request), *coord1, *coord2)
             
             return location_pb2.DistanceResponse(
                 distance_meters=distance_meters
@@ -66,13 +180,480 @@ class LocationServiceServicer(location_pb2_grpc.LocationServiceServicer):
             return location_pb2.DistanceResponse(
                 distance_meters=-1.0
             )
+    
+    def IsNearbyBatch(self, request, context):
+        """
+        Check every point against every target in one call (replaces
+        points x targets IsNearby calls). Only pairs within the threshold are
+        returned; targets are grid-indexed so far-away pairs are never measured.
+        """
+        try:
+            threshold = request.threshold_meters if request.threshold_meters > 0 else 100.0
+            pairs, computed = nearby_pairs(
+                [(point.lat, point.lng) for point in request.points],
+                [(target.lat, target.lng) for target in request.targets],
+                threshold,
+                request_mode(request)
+            )
+            return location_pb2.NearbyBatchResponse(
+                success=True,
+                matches=[
+                    location_pb2.NearbyMatch(
+                        point_index=point_index,
+                        target_index=target_index,
+                        distance_meters=distance
+                    )
+                    for point_index, target_index, distance in pairs
+                ],
+                distances_computed=computed,
+                message=f"{len(pairs)} pair(s) within {threshold:.0f}m"
+            )
+        except Exception as e:
+            print(f"Error in IsNearbyBatch: {e}")
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(str(e))
+            return location_pb2.NearbyBatchResponse(
+                success=False,
+                message=str(e)
+            )
+    
+    def NearestStations(self, request, context):
+        """
+        k nearest stations to a point (within radius_meters when set),
+        closest first, from the station index.
+        """
+        try:
+            found = self.station_index.nearest(
+                request.lat, request.lng, request_mode(request),
+                k=request.k if request.k > 0 else 5,
+                max_meters=request.radius_meters if request.radius_meters > 0 else None
+            )
+            if not len(self.station_index):
+                return location_pb2.NearestStationsResponse(
+                    success=False,
+                    message="No stations loaded (Station Service unavailable?)"
+                )
+            return location_pb2.NearestStationsResponse(
+                success=True,
+                stations=[
+                    location_pb2.NearStation(
+                        station_id=station['id'],
+                        name=station['name'],
+                        lat=station['lat'],
+                        lng=station['lng'],
+                        distance_meters=distance
+                    )
+                    for station, distance in found
+                ],
+                station_version=self.station_index.version,
+                message=f"Found {len(found)} station(s)"
+            )
+        except Exception as e:
+            print(f"Error in NearestStations: {e}")
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(str(e))
+            return location_pb2.NearestStationsResponse(
+                success=False,
+                message=str(e)
+            )
+    
+    def GetDistanceCacheStats(self, request, context):
+        """
+        Counters of the IsNearby / CalculateDistance memo.
+        """
+        return location_pb2.DistanceCacheStatsResponse(**self.distance_cache.stats())
+    
+    def _geofences_from_stations(self, context):
+        context.set_code(grpc.StatusCode.FAILED_PRECONDITION)
+        context.set_details("Geofences follow the station snapshot (GEOFENCE_RADIUS_METERS > 0)")
+        return location_pb2.GeofencesResponse(success=False, message="Geofences follow the station snapshot")
+    
+    def SetGeofences(self, request, context):
+        """
+        Register geofences (or move registered ones); with replace, the
+        request becomes the whole set. Only this replica sees them, so it is
+        refused while geofences follow the station snapshot.
+        """
+        if self.station_geofences():
+            return self._geofences_from_stations(context)
+        try:
+            count = self.geofences.set_fences(
+                [(fence.station_id, fence.lat, fence.lng, fence.radius_meters) for fence in request.geofences],
+                replace=request.replace
+            )
+            return location_pb2.GeofencesResponse(
+                success=True,
+                geofence_count=count,
+                registry_version=self.geofences.version,
+                message=f"{len(request.geofences)} geofence(s) set"
+            )
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return location_pb2.GeofencesResponse(success=False, message=str(e))
+        except Exception as e:
+            print(f"Error in SetGeofences: {e}")
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(str(e))
+            return location_pb2.GeofencesResponse(success=False, message=str(e))
+    
+    def RemoveGeofences(self, request, context):
+        """
+        Unregister geofences; entities inside them EXIT on their next update.
+        """
+        if self.station_geofences():
+            return self._geofences_from_stations(context)
+        try:
+            count = self.geofences.remove_fences(request.station_ids)
+            return location_pb2.GeofencesResponse(
+                success=True,
+                geofence_count=count,
+                registry_version=self.geofences.version,
+                message=f"{len(request.station_ids)} geofence(s) removed"
+            )
+        except Exception as e:
+            print(f"Error in RemoveGeofences: {e}")
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(str(e))
+            return location_pb2.GeofencesResponse(success=False, message=str(e))
+    
+    def TrackGeofences(self, request_iterator, context):
+        """
+        Bidirectional stream: every position update is checked against the
+        geofences near it and only transitions come back (nothing while an
+        entity stays inside or outside).
+        """
+        updates = 0
+        events = 0
+        try:
+            for update in request_iterator:
+                updates += 1
+                if self.station_geofences():
+                    self.sync_geofences()
+                if update.remove:
+                    transitions = self.geofences.forget(update.entity_id)
+                else:
+                    transitions = self.geofences.update(update.entity_id, update.lat, update.lng)
+                for kind, station_id, distance_meters in transitions:
+                    events += 1
+                    yield location_pb2.GeofenceEvent(
+                        type=location_pb2.GeofenceEvent.ENTER if kind == ENTER else location_pb2.GeofenceEvent.EXIT,
+                        entity_id=update.entity_id,
+                        station_id=station_id,
+                        distance_meters=distance_meters,
+                        lat=update.lat,
+                        lng=update.lng
+                    )
+        except Exception as e:
+            print(f"Error in TrackGeofences: {e}")
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(str(e))
+        print(f"[GEOFENCE] Stream closed: {updates} update(s) -> {events} event(s) "
+              f"({len(self.geofences)} geofence(s))", flush=True)
+    
+    def GetDistanceMatrix(self, request, context):
+        """
+        Distances between any subset of stations (and destination grid
+        cells), read from the precomputed memory-mapped matrix.
+        """
+        if self.distance_matrix is None:
+            context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+            context.set_details("Distance matrix disabled (DISTANCE_MATRIX_DIR is empty)")
+            return location_pb2.DistanceMatrixResponse(success=False, message="Distance matrix disabled")
+        try:
+            self.sync_distance_matrix()
+            only_cells = not request.destination_station_ids and len(request.destination_cell_ids) > 0
+            origins, destinations, cells, matrix, unknown, unknown_cells = self.distance_matrix.lookup(
+                list(request.origin_station_ids) or None,
+                [] if only_cells else (list(request.destination_station_ids) or None),
+                list(request.destination_cell_ids)
+            )
+            grid = self.distance_matrix.grid
+            return location_pb2.DistanceMatrixResponse(
+                success=True,
+                origin_station_ids=origins,
+                destination_station_ids=destinations,
+                destination_cell_ids=cells,
+                distances_meters=matrix.ravel().tolist(),
+                unknown_station_ids=unknown,
+                unknown_cell_ids=unknown_cells,
+                station_version=self.distance_matrix.station_version,
+                mode=RESPONSE_MODES[self.distance_matrix.mode],
+                grid=location_pb2.DestinationGrid(**grid.spec()) if grid is not None else None,
+                message=f"{matrix.shape[0]} x {matrix.shape[1]} distance(s)"
+            )
+        except Exception as e:
+            print(f"Error in GetDistanceMatrix: {e}")
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(str(e))
+            return location_pb2.DistanceMatrixResponse(success=False, message=str(e))
+    
+    def EstimateArrival(self, request, context):
+        """
+        Distance and ETA along a route to each target. The route's legs are
+        measured once into prefix sums; each target is then a lookup.
+        """
+        try:
+            if not request.route:
+                return location_pb2.EstimateArrivalResponse(success=False, message="Empty route")
+            speed = request.speed_mps if request.speed_mps > 0 else ETA_SPEED_MPS
+            profile = RouteProfile(
+                [waypoint.lat for waypoint in request.route],
+                [waypoint.lng for waypoint in request.route],
+                request_mode(request),
+                station_ids=[waypoint.station_id for waypoint in request.route],
+                start=(request.start.lat, request.start.lng) if request.HasField('start') else None
+            )
+            arrivals = [self._arrival(profile, target, speed) for target in request.targets]
+            return location_pb2.EstimateArrivalResponse(
+                success=True,
+                arrivals=arrivals,
+                route_meters=profile.meters_to(len(profile) - 1),
+                message=f"{sum(arrival.reachable for arrival in arrivals)} of {len(arrivals)} target(s) reachable"
+            )
+        except Exception as e:
+            print(f"Error in EstimateArrival: {e}")
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(str(e))
+            return location_pb2.EstimateArrivalResponse(success=False, message=str(e))
+    
+    def _arrival(self, profile, target, speed):
+        """Arrival at one ArrivalTarget"""
+        index, off_route = None, 0.0
+        if target.HasField('waypoint_index'):
+            if 0 <= target.waypoint_index < len(profile):
+                index = target.waypoint_index
+        elif target.station_id:
+            index = profile.station_index(target.station_id)
+            station = self.station_index.get(target.station_id) if index is None and self.station_index else None
+            if station:
+                index, off_route = profile.closest_index(station['lat'], station['lng'])
+        elif target.HasField('point'):
+            index, off_route = profile.closest_index(target.point.lat, target.point.lng)
+        else:
+            index = profile.index_at(target.after_seconds * speed)
+        if index is None:
+            return location_pb2.Arrival(reachable=False)
+        route_meters = profile.meters_to(index)
+        return location_pb2.Arrival(
+            reachable=True,
+            waypoint_index=index,
+            route_meters=route_meters,
+            off_route_meters=off_route,
+            eta_seconds=(route_meters + off_route) / speed
+        )
+    
+    def _routing_disabled(self, context, response_class):
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details("Routing disabled (ROAD_GRAPH_PATH is empty)")
+        return response_class(success=False, message="Routing disabled")
+    
+    def Route(self, request, context):
+        """
+        Fastest path between two points over the road graph. Both points are
+        snapped to their nearest node first, at most ROAD_SNAP_MAX_METERS away.
+        """
+        if self.road_graph is None:
+            return self._routing_disabled(context, location_pb2.RouteResponse)
+        try:
+            source, source_snap = self.road_graph.snap(request.origin.lat, request.origin.lng)
+            target, target_snap = self.road_graph.snap(request.destination.lat, request.destination.lng)
+            if max(source_snap, target_snap) > ROAD_SNAP_MAX_METERS:
+                return location_pb2.RouteResponse(
+                    success=False,
+                    origin_snap_meters=source_snap,
+                    destination_snap_meters=target_snap,
+                    message=f"{'Origin' if source_snap > ROAD_SNAP_MAX_METERS else 'Destination'} is more than "
+                            f"{ROAD_SNAP_MAX_METERS:.0f}m from the road network"
+                )
+            if self.hierarchy is not None:
+                before = self.hierarchy.settled
+                seconds, meters, nodes = self.hierarchy.query(source, target, with_path=request.include_geometry)
+                settled = self.hierarchy.settled - before
+            else:
+                seconds, meters, nodes, settled = self.road_graph.astar(source, target)
+            if seconds == float('inf'):
+                return location_pb2.RouteResponse(
+                    success=False,
+                    origin_snap_meters=source_snap,
+                    destination_snap_meters=target_snap,
+                    nodes_settled=settled,
+                    message="No road path between the points"
+                )
+            geometry = []
+            if request.include_geometry:
+                geometry = [
+                    location_pb2.Point(lat=lat, lng=lng) for lat, lng in self.road_graph.path_coordinates(nodes)
+                ]
+            return location_pb2.RouteResponse(
+                success=True,
+                travel_time_seconds=seconds,
+                distance_meters=meters,
+                geometry=geometry,
+                origin_snap_meters=source_snap,
+                destination_snap_meters=target_snap,
+                nodes_settled=settled,
+                message=f"{meters:.0f}m in {seconds:.0f}s"
+            )
+        except Exception as e:
+            print(f"Error in Route: {e}")
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(str(e))
+            return location_pb2.RouteResponse(success=False, message=str(e))
+    
+    def TravelTimeMatrix(self, request, context):
+        """
+        Travel time and road distance from every origin to every destination
+        (one bucket-based many-to-many search over the hierarchy). Points more
+        than ROAD_SNAP_MAX_METERS from the road network are unreachable.
+        """
+        if self.road_graph is None:
+            return self._routing_disabled(context, location_pb2.TravelTimeMatrixResponse)
+        try:
+            source_snaps = [self.road_graph.snap(point.lat, point.lng) for point in request.origins]
+            target_snaps = [self.road_graph.snap(point.lat, point.lng) for point in request.destinations]
+            sources = [node for node, _ in source_snaps]
+            targets = [node for node, _ in target_snaps]
+            if self.hierarchy is not None:
+                seconds, meters = self.hierarchy.many_to_many(sources, targets)
+            else:
+                results = [[self.road_graph.astar(source, target)[:2] for target in targets] for source in sources]
+                seconds = [[cell[0] for cell in row] for row in results]
+                meters = [[cell[1] for cell in row] for row in results]
+            off_network = [
+                origin_snap > ROAD_SNAP_MAX_METERS or destination_snap > ROAD_SNAP_MAX_METERS
+                for _, origin_snap in source_snaps for _, destination_snap in target_snaps
+            ]
+            seconds = [-1.0 if value == float('inf') or off else value
+                       for value, off in zip((value for row in seconds for value in row), off_network)]
+            meters = [-1.0 if value == float('inf') or off else value
+                      for value, off in zip((value for row in meters for value in row), off_network)]
+            return location_pb2.TravelTimeMatrixResponse(
+                success=True,
+                travel_time_seconds=seconds,
+                distance_meters=meters,
+                origin_count=len(sources),
+                destination_count=len(targets),
+                message=f"{len(sources)} x {len(targets)} travel time(s), "
+                        f"{sum(value < 0 for value in seconds)} unreachable"
+            )
+        except Exception as e:
+            print(f"Error in TravelTimeMatrix: {e}")
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(str(e))
+            return location_pb2.TravelTimeMatrixResponse(success=False, message=str(e))
+    
+    def StationsReachableFrom(self, request, context):
+        """
+        Stations that can be reached from a grid cell within a time budget:
+        one precomputed bitset row, no distances computed. Meant for pruning
+        candidates before exact checks.
+        """
+        if self.catchments is None:
+            context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+            context.set_details("Catchments disabled (CATCHMENT_GRID is empty)")
+            return location_pb2.StationsReachableResponse(success=False, message="Catchments disabled")
+        grid = self.catchments.grid
+        if request.HasField('cell_id'):
+            cell_id = request.cell_id if 0 <= request.cell_id < len(grid) else None
+        else:
+            cell_id = grid.cell_id(request.point.lat, request.point.lng)
+        if cell_id is None:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details("Cell / point outside the catchment grid")
+            return location_pb2.StationsReachableResponse(success=False, message="Outside the catchment grid")
+        try:
+            self.catchments.budget_index(request.budget_seconds)
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return location_pb2.StationsReachableResponse(success=False, message=str(e))
+        try:
+            if self.station_index is not None:
+                self.sync_catchments()
+            station_ids, budget = self.catchments.reachable_from(
+                cell_id, request.budget_seconds, list(request.station_ids) or None
+            )
+            return location_pb2.StationsReachableResponse(
+                success=True,
+                station_ids=station_ids,
+                cell_id=cell_id,
+                budget_seconds=budget,
+                budgets_seconds=self.catchments.budgets.tolist(),
+                grid=location_pb2.DestinationGrid(**grid.spec()),
+                station_version=self.catchments.station_version,
+                message=f"{len(station_ids)} station(s) within {budget:.0f}s"
+            )
+        except Exception as e:
+            print(f"Error in StationsReachableFrom: {e}")
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(str(e))
+            return location_pb2.StationsReachableResponse(success=False, message=str(e))
+
+
+def load_routing():
+    """(road graph, hierarchy or None) from the settings; (None, None) when disabled"""
+    if not ROAD_GRAPH_PATH:
+        return None, None
+    started = time.time()
+    if ROAD_GRAPH_ALGORITHM == 'astar':
+        graph = RoadGraph.from_file(ROAD_GRAPH_PATH, ROAD_DEFAULT_SPEED_KPH)
+        print(f"[ROUTING] Loaded {ROAD_GRAPH_PATH}: {len(graph)} nodes, {graph.edge_count} edges, "
+              f"A* only ({time.time() - started:.1f}s)", flush=True)
+        return graph, None
+    hierarchy, built = load_or_build(ROAD_GRAPH_PATH, ROAD_GRAPH_CACHE_DIR, ROAD_DEFAULT_SPEED_KPH)
+    print(f"[ROUTING] {'Built' if built else 'Loaded cached'} contraction hierarchy for {ROAD_GRAPH_PATH}: "
+          f"{len(hierarchy.graph)} nodes, {hierarchy.graph.edge_count} edges, "
+          f"{hierarchy.shortcut_count} shortcuts ({time.time() - started:.1f}s)", flush=True)
+    return hierarchy.graph, hierarchy
 
 
 def serve():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    location_pb2_grpc.add_LocationServiceServicer_to_server(LocationServiceServicer(), server)
+    station_channel = grpc.insecure_channel(f"{STATION_SERVICE_HOST}:{STATION_SERVICE_PORT}")
+    station_index = StationIndex(
+        station_pb2_grpc.StationServiceStub(station_channel),
+        refresh_interval=STATION_REFRESH_SECONDS
+    )
+    station_index.refresh(force=True)
+    distance_cache = DistanceCache(
+        max_entries=DISTANCE_CACHE_MAX_ENTRIES,
+        precision=DISTANCE_CACHE_PRECISION,
+        enabled=DISTANCE_CACHE_ENABLED
+    )
+    geofences = GeofenceRegistry(DISTANCE_MODE, exit_hysteresis_meters=GEOFENCE_EXIT_HYSTERESIS_METERS)
+    if GEOFENCE_RADIUS_METERS > 0 and len(station_index):
+        geofences.sync_stations(station_index.stations, station_index.version, GEOFENCE_RADIUS_METERS)
+    distance_matrix = None
+    if DISTANCE_MATRIX_DIR:
+        distance_matrix = StationDistanceMatrix(
+            DISTANCE_MATRIX_DIR, DISTANCE_MATRIX_MODE,
+            grid=DestinationGrid.from_setting(DISTANCE_MATRIX_GRID, DISTANCE_MATRIX_GRID_CELL_DEG)
+        )
+        # Files from the last run are reused; only station changes since then are computed
+        distance_matrix.open()
+        if len(station_index):
+            distance_matrix.sync(station_index.stations, station_index.version)
+    road_graph, hierarchy = load_routing()
+    catchments = None
+    grid = DestinationGrid.from_setting(CATCHMENT_GRID, CATCHMENT_GRID_CELL_DEG)
+    if grid is not None:
+        catchments = StationCatchments(grid, CATCHMENT_BUDGETS_SECONDS, DISTANCE_MODE,
+                                       road_graph=road_graph, speed_mps=ETA_SPEED_MPS)
+        if len(station_index):
+            catchments.sync(station_index.stations, station_index.version)
+    
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=GRPC_MAX_WORKERS))
+    location_pb2_grpc.add_LocationServiceServicer_to_server(
+        LocationServiceServicer(
+            station_index, distance_cache, geofences, distance_matrix, road_graph, hierarchy, catchments
+        ),
+        server
+    )
     server.add_insecure_port('[::]:50056')
-    print("Location gRPC server starting on port 50056...")
+    cache_state = (f"{DISTANCE_CACHE_MAX_ENTRIES} entries, {DISTANCE_CACHE_PRECISION} decimal places"
+                   if distance_cache.enabled else "disabled")
+    print(f"Location gRPC server starting on port 50056 (default distance mode: {DISTANCE_MODE}, "
+          f"distance cache: {cache_state})...")
     server.start()
     server.wait_for_termination()
 
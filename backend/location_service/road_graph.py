@@ -0,0 +1,271 @@
+"""
+Road network loaded from a local GeoJSON or OSM XML extract.
+
+GeoJSON: LineString / MultiLineString features (e.g. an `osmium export` or
+ogr2ogr dump of OSM ways). OSM XML (.osm): ways tagged with a routable
+highway class. In both, these properties/tags are read when present:
+
+    highway   road class, sets the speed when there is no maxspeed
+    maxspeed  km/h ("50", "30 mph" is converted)
+    oneway    yes / true / 1 (drawing direction only), -1 (reverse)
+
+Consecutive points of a line become directed edges weighted by travel time
+(seconds) with their length (meters) alongside. Points shared by several
+lines (same coordinates to 1e-7 degrees) are the same node, which is how
+streets connect. The graph is stored as CSR arrays (out_offsets / out_targets
+/ ...), the layout the contraction hierarchy is built from and saved in.
+"""
+
+import heapq
+import json
+import math
+import re
+import xml.etree.ElementTree as ElementTree
+
+import numpy as np
+
+from distance import HAVERSINE, haversine, haversine_many
+from geo_index import PointGrid
+
+HIGHWAY_SPEEDS_KPH = {
+    'motorway': 90.0, 'motorway_link': 50.0,
+    'trunk': 70.0, 'trunk_link': 40.0,
+    'primary': 50.0, 'primary_link': 35.0,
+    'secondary': 40.0, 'secondary_link': 30.0,
+    'tertiary': 35.0, 'tertiary_link': 25.0,
+    'unclassified': 30.0, 'residential': 25.0,
+    'living_street': 10.0, 'service': 15.0,
+}
+MPH_TO_KPH = 1.609344
+# Node identity: coordinates rounded to this many decimal places
+NODE_PRECISION = 7
+
+
+def parse_speed(value):
+    """maxspeed tag -> km/h, or None when it isn't a number"""
+    match = re.match(r'\s*([\d.]+)\s*(mph)?', str(value or ''))
+    if not match:
+        return None
+    speed = float(match.group(1))
+    return speed * MPH_TO_KPH if match.group(2) else speed
+
+
+def oneway_direction(value):
+    """1 = drawing direction only, -1 = reverse only, 0 = both ways"""
+    value = str(value or '').strip().lower()
+    if value in ('yes', 'true', '1'):
+        return 1
+    if value == '-1':
+        return -1
+    return 0
+
+
+def _segment(coords, tags, default_speed_kph):
+    speed = parse_speed(tags.get('maxspeed')) or HIGHWAY_SPEEDS_KPH.get(tags.get('highway'), default_speed_kph)
+    return coords, speed, oneway_direction(tags.get('oneway'))
+
+
+def read_geojson(path, default_speed_kph):
+    """(coords [(lat, lng)], speed km/h, oneway) per line"""
+    with open(path) as f:
+        data = json.load(f)
+    features = data['features'] if data.get('type') == 'FeatureCollection' else [data]
+    for feature in features:
+        geometry = feature.get('geometry') or {}
+        tags = feature.get('properties') or {}
+        if geometry.get('type') == 'LineString':
+            lines = [geometry['coordinates']]
+        elif geometry.get('type') == 'MultiLineString':
+            lines = geometry['coordinates']
+        else:
+            continue
+        for line in lines:
+            yield _segment([(lat, lng) for lng, lat, *_ in line], tags, default_speed_kph)
+
+
+def read_osm_xml(path, default_speed_kph):
+    """(coords [(lat, lng)], speed km/h, oneway) per routable way"""
+    nodes = {}
+    for _, element in ElementTree.iterparse(path):
+        if element.tag == 'node':
+            nodes[element.get('id')] = (float(element.get('lat')), float(element.get('lon')))
+            element.clear()
+        elif element.tag == 'way':
+            tags = {tag.get('k'): tag.get('v') for tag in element.findall('tag')}
+            if tags.get('highway') in HIGHWAY_SPEEDS_KPH:
+                coords = [nodes[ref.get('ref')] for ref in element.findall('nd') if ref.get('ref') in nodes]
+                yield _segment(coords, tags, default_speed_kph)
+            element.clear()
+
+
+class RoadGraph:
+
+    def __init__(self, lats, lngs, out_offsets, out_targets, out_times, out_lengths):
+        self.lats = np.asarray(lats, dtype=float)
+        self.lngs = np.asarray(lngs, dtype=float)
+        self.out_offsets = np.asarray(out_offsets, dtype=np.int64)
+        self.out_targets = np.asarray(out_targets, dtype=np.int64)
+        self.out_times = np.asarray(out_times, dtype=float)
+        self.out_lengths = np.asarray(out_lengths, dtype=float)
+        self._grid = None
+        self._adjacency = None
+        self._reverse = None
+        # Fastest edge speed, for an A* heuristic that never over-estimates
+        speeds = self.out_lengths / np.maximum(self.out_times, 1e-9)
+        self.max_speed_mps = float(speeds.max()) if len(speeds) else 1.0
+
+    @classmethod
+    def from_segments(cls, segments):
+        node_ids = {}
+        lats, lngs = [], []
+        edges = {}  # (u, v) -> (seconds, meters), fastest kept
+
+        def node(lat, lng):
+            key = (round(lat, NODE_PRECISION), round(lng, NODE_PRECISION))
+            index = node_ids.get(key)
+            if index is None:
+                index = node_ids[key] = len(lats)
+                lats.append(key[0])
+                lngs.append(key[1])
+            return index
+
+        for coords, speed_kph, oneway in segments:
+            if len(coords) < 2 or speed_kph <= 0:
+                continue
+            ids = [node(lat, lng) for lat, lng in coords]
+            line_lats = np.array([lats[i] for i in ids])
+            line_lngs = np.array([lngs[i] for i in ids])
+            lengths = haversine_many(line_lats[:-1], line_lngs[:-1], line_lats[1:], line_lngs[1:])
+            for a, b, meters in zip(ids[:-1], ids[1:], lengths.tolist()):
+                if a == b:
+                    continue
+                seconds = meters / (speed_kph / 3.6)
+                pairs = {1: [(a, b)], -1: [(b, a)], 0: [(a, b), (b, a)]}[oneway]
+                for u, v in pairs:
+                    if (u, v) not in edges or seconds < edges[(u, v)][0]:
+                        edges[(u, v)] = (seconds, meters)
+
+        order = sorted(edges)
+        counts = np.bincount([u for u, _ in order], minlength=len(lats))
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        return cls(
+            lats, lngs, offsets,
+            [v for _, v in order],
+            [edges[key][0] for key in order],
+            [edges[key][1] for key in order],
+        )
+
+    @classmethod
+    def from_file(cls, path, default_speed_kph=30.0):
+        reader = read_osm_xml if path.lower().endswith('.osm') else read_geojson
+        return cls.from_segments(reader(path, default_speed_kph))
+
+    def __len__(self):
+        return len(self.lats)
+
+    @property
+    def edge_count(self):
+        return len(self.out_targets)
+
+    def arrays(self):
+        """Arrays that define the graph (saved next to the hierarchy)"""
+        return {
+            'lats': self.lats, 'lngs': self.lngs,
+            'out_offsets': self.out_offsets, 'out_targets': self.out_targets,
+            'out_times': self.out_times, 'out_lengths': self.out_lengths,
+        }
+
+    def edges(self):
+        """(u, v, seconds, meters) for every edge"""
+        sources = np.repeat(np.arange(len(self)), np.diff(self.out_offsets))
+        return zip(sources.tolist(), self.out_targets.tolist(), self.out_times.tolist(), self.out_lengths.tolist())
+
+    def snap(self, lat, lng):
+        """(nearest node, distance in meters to it)"""
+        if self._grid is None:
+            self._grid = PointGrid(list(zip(self.lats.tolist(), self.lngs.tolist())))
+        found = self._grid.nearest(lat, lng, 1, HAVERSINE)
+        if not found:
+            raise ValueError("Road graph is empty")
+        meters, node = found[0]
+        return node, meters
+
+    def path_coordinates(self, nodes):
+        return [(float(self.lats[node]), float(self.lngs[node])) for node in nodes]
+
+    def _out(self):
+        """Adjacency as Python lists (fast per-node access in search loops)"""
+        if self._adjacency is None:
+            offsets = self.out_offsets.tolist()
+            targets, times, lengths = self.out_targets.tolist(), self.out_times.tolist(), self.out_lengths.tolist()
+            self._adjacency = [
+                list(zip(targets[offsets[u]:offsets[u + 1]], times[offsets[u]:offsets[u + 1]],
+                         lengths[offsets[u]:offsets[u + 1]]))
+                for u in range(len(self))
+            ]
+        return self._adjacency
+
+    def _in(self):
+        """Reversed adjacency as Python lists: (source, seconds) per incoming edge"""
+        if self._reverse is None:
+            self._reverse = [[] for _ in range(len(self))]
+            for u, v, seconds, _ in self.edges():
+                self._reverse[v].append((u, seconds))
+        return self._reverse
+
+    def times_to(self, target, max_seconds):
+        """{node: fastest seconds from node to target} for nodes within max_seconds"""
+        reverse = self._in()
+        best = {target: 0.0}
+        heap = [(0.0, target)]
+        while heap:
+            cost, node = heapq.heappop(heap)
+            if cost > best[node]:
+                continue
+            for neighbour, seconds in reverse[node]:
+                candidate = cost + seconds
+                if candidate <= max_seconds and candidate < best.get(neighbour, math.inf):
+                    best[neighbour] = candidate
+                    heapq.heappush(heap, (candidate, neighbour))
+        return best
+
+    def astar(self, source, target):
+        """
+        Fastest path on the plain graph, guided by straight-line distance at
+        the top speed. Returns (seconds, meters, nodes, settled); seconds is
+        inf when the target can't be reached.
+        """
+        adjacency = self._out()
+        lats, lngs = self.lats.tolist(), self.lngs.tolist()
+        target_lat, target_lng = lats[target], lngs[target]
+        speed = self.max_speed_mps
+
+        def estimate(node):
+            return haversine(lats[node], lngs[node], target_lat, target_lng) / speed
+
+        best = {source: 0.0}
+        lengths = {source: 0.0}
+        parents = {source: None}
+        heap = [(estimate(source), 0.0, source)]
+        settled = 0
+        done = set()
+        while heap:
+            _, cost, node = heapq.heappop(heap)
+            if node in done:
+                continue
+            done.add(node)
+            settled += 1
+            if node == target:
+                path = []
+                while node is not None:
+                    path.append(node)
+                    node = parents[node]
+                return cost, lengths[target], path[::-1], settled
+            for neighbour, seconds, meters in adjacency[node]:
+                candidate = cost + seconds
+                if candidate < best.get(neighbour, math.inf):
+                    best[neighbour] = candidate
+                    lengths[neighbour] = lengths[node] + meters
+                    parents[neighbour] = node
+                    heapq.heappush(heap, (candidate + estimate(neighbour), candidate, neighbour))
+        return math.inf, math.inf, [], settled
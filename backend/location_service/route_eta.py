@@ -0,0 +1,53 @@
+"""
+Arrival estimates along a route from cumulative distance prefix sums.
+
+A RouteProfile measures every leg of a route once (one vectorized call) and
+keeps the running total, so the distance from the start to any waypoint is a
+single read and the distance between two waypoints a subtraction. Finding
+where the route is after a given distance is a binary search over the same
+array.
+"""
+
+import numpy as np
+
+from distance import distance, distance_many
+
+
+class RouteProfile:
+
+    def __init__(self, lats, lngs, mode, station_ids=None, start=None):
+        """
+        Waypoint coordinates in driving order; station_ids marks waypoints
+        that are stations (0 = none). start is the current (lat, lng) when
+        it is not the first waypoint.
+        """
+        self.mode = mode
+        self.lats = np.asarray(lats, dtype=float)
+        self.lngs = np.asarray(lngs, dtype=float)
+        self.station_ids = np.asarray(station_ids if station_ids is not None else np.zeros(len(self.lats)), dtype=int)
+        legs = distance_many(mode, self.lats[:-1], self.lngs[:-1], self.lats[1:], self.lngs[1:])
+        self.cumulative = np.concatenate([[0.0], np.cumsum(legs)]) if len(self.lats) else np.empty(0)
+        self.start_meters = distance(mode, start[0], start[1], self.lats[0], self.lngs[0]) if start and len(self.lats) else 0.0
+
+    def __len__(self):
+        return len(self.lats)
+
+    def meters_to(self, index):
+        """Distance along the route from the start position to waypoint `index`"""
+        return self.start_meters + float(self.cumulative[index])
+
+    def index_at(self, meters):
+        """Last waypoint reached after travelling `meters` from the start position"""
+        position = np.searchsorted(self.cumulative, meters - self.start_meters, side='right') - 1
+        return int(position) if position >= 0 else None
+
+    def station_index(self, station_id):
+        """First waypoint that is the station, or None"""
+        hits = np.flatnonzero(self.station_ids == station_id)
+        return int(hits[0]) if len(hits) else None
+
+    def closest_index(self, lat, lng):
+        """(waypoint closest to the point, its distance to the point)"""
+        distances = distance_many(self.mode, lat, lng, self.lats, self.lngs)
+        index = int(np.argmin(distances))
+        return index, float(distances[index])
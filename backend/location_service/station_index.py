@@ -0,0 +1,75 @@
+"""
+Station index kept loaded in the Location Service (NearestStations).
+
+Stations come from the Station Service snapshot (see station_cache.py). The
+snapshot is re-checked at most once per refresh_interval, which is a tiny
+not_modified round trip unless stations changed; the grid is rebuilt only
+on a new version. If the Station Service is unreachable the last loaded
+stations keep being served.
+"""
+
+import threading
+import time
+
+from geo_index import PointGrid
+from station_cache import StationSnapshotCache
+
+
+class StationIndex:
+
+    def __init__(self, station_stub, refresh_interval=5.0, cell_deg=0.01):
+        self.cache = StationSnapshotCache(station_stub)
+        self.refresh_interval = refresh_interval
+        self.cell_deg = cell_deg
+
+        self._grid = PointGrid([], cell_deg)
+        self._stations = []
+        self._last_refresh = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        return self.cache.version
+
+    @property
+    def stations(self):
+        """Loaded stations ({'id', 'name', 'lat', 'lng'} dicts)"""
+        return self._stations
+
+    def refresh(self, force=False):
+        """Sync with the Station Service when due; returns True when the index was rebuilt"""
+        with self._lock:
+            now = time.monotonic()
+            if (not force and self._last_refresh is not None
+                    and now - self._last_refresh < self.refresh_interval):
+                return False
+            self._last_refresh = now
+            if not self.cache.refresh():
+                return False
+            self._stations = list(self.cache.stations)
+            self._grid = PointGrid(
+                [(station['lat'], station['lng']) for station in self._stations], self.cell_deg
+            )
+            return True
+
+    def get(self, station_id):
+        """Station dict by id, or None"""
+        self.refresh()
+        return self.cache.get(station_id)
+
+    def nearest(self, lat, lng, mode, k=5, max_meters=None):
+        """[(station dict, distance)] of the k nearest stations, closest first"""
+        self.refresh()
+        grid, stations = self._grid, self._stations
+        return [
+            (stations[index], distance)
+            for distance, index in grid.nearest(lat, lng, k, mode, max_meters)
+        ]
+
+    def __len__(self):
+        return len(self._stations)
+
+    def stats(self):
+        stats = self.cache.stats()
+        stats['distances_computed'] = self._grid.distances_computed
+        return stats
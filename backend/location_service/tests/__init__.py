@@ -0,0 +1,6 @@
+"""
+Unit tests for the location service modules. The service uses flat imports,
+so run them from backend/location_service:
+
+    python -m unittest discover tests
+"""
@@ -0,0 +1,105 @@
+import os
+import unittest
+
+import numpy as np
+
+from catchments import StationCatchments
+from distance import HAVERSINE, distance_many
+from distance_matrix import DestinationGrid
+from road_graph import RoadGraph
+
+TEST_GRAPH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          'data', 'test_road_graph.geojson')
+
+SPEED_MPS = 10.0
+BUDGETS = [60, 180, 420]
+
+
+def stations(count):
+    return [{'id': 100 + i, 'lat': 12.955 + 0.003 * i, 'lng': 77.58 + 0.0025 * i} for i in range(count)]
+
+
+class StationCatchmentsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.grid = DestinationGrid(12.95, 77.575, 12.99, 77.615, cell_deg=0.005)
+        self.catchments = StationCatchments(self.grid, BUDGETS, HAVERSINE, speed_mps=SPEED_MPS)
+        # 11 stations: the bitset rows span two bytes
+        self.stations = stations(11)
+        self.catchments.sync(self.stations, 1)
+
+    def expected(self, station, budget):
+        """Cells within budget of the station, straight line from the nearest cell edge"""
+        lats, lngs = self.grid.centres()
+        half_diagonal = distance_many(HAVERSINE, lats, lngs, lats + self.grid.cell_deg / 2, lngs + self.grid.cell_deg / 2)
+        meters = distance_many(HAVERSINE, lats, lngs, station['lat'], station['lng']) - half_diagonal
+        return np.maximum(meters, 0.0) / SPEED_MPS <= budget
+
+    def test_bits_are_cell_major_and_msb_first(self):
+        reachable = self.catchments._reachable
+        self.assertEqual(reachable.shape, (len(BUDGETS), len(self.grid), 2))
+        for budget_index, budget in enumerate(BUDGETS):
+            for column, station in enumerate(self.stations):
+                bits = (reachable[budget_index, :, column >> 3] & (0x80 >> (column & 7))) != 0
+                np.testing.assert_array_equal(bits, self.expected(station, budget))
+            # Padding bits past the last station stay clear
+            self.assertFalse((reachable[budget_index, :, 1] & 0x1f).any())
+
+    def test_reachable_from_matches_the_bits(self):
+        for cell in range(len(self.grid)):
+            found, budget = self.catchments.reachable_from(cell, 180)
+            expected = [station['id'] for station in self.stations if self.expected(station, 180)[cell]]
+            self.assertEqual((found, budget), (expected, 180.0))
+
+            candidates = [station['id'] for station in self.stations[::2]] + [999]
+            narrowed, _ = self.catchments.reachable_from(cell, 180, candidates)
+            self.assertEqual(narrowed, [station_id for station_id in candidates if station_id in expected])
+
+    def test_unconfigured_budget_uses_the_next_larger_one(self):
+        cell = self.grid.cell_id(12.97, 77.595)
+        self.assertEqual(self.catchments.reachable_from(cell, 100), self.catchments.reachable_from(cell, 180))
+        with self.assertRaises(ValueError):
+            self.catchments.reachable_from(cell, 600)
+
+    def test_sync_recomputes_only_added_and_moved_stations(self):
+        computed = self.catchments.stations_computed
+        moved = dict(self.stations[3], lat=12.985)
+        updated = self.stations[:3] + [moved] + self.stations[4:10] + [{'id': 500, 'lat': 12.96, 'lng': 77.6}]
+
+        self.assertEqual(self.catchments.sync(updated, 2), 2)
+        self.assertEqual(self.catchments.stations_computed, computed + 2)
+        self.assertEqual(len(self.catchments), 11)
+        cell = self.grid.cell_id(12.985, 77.5875)
+        found, _ = self.catchments.reachable_from(cell, 60)
+        self.assertIn(moved['id'], found)
+        self.assertNotIn(self.stations[10]['id'], self.catchments.reachable_from(cell, 420)[0])
+
+
+class RoadCatchmentsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = RoadGraph.from_file(TEST_GRAPH)
+        self.grid = DestinationGrid(12.955, 77.575, 12.995, 77.615, cell_deg=0.005)
+        self.catchments = StationCatchments(self.grid, BUDGETS, HAVERSINE, road_graph=self.graph)
+
+    def test_times_include_the_station_snap_distance(self):
+        on_road = {'id': 1, 'lat': float(self.graph.lats[0]), 'lng': float(self.graph.lngs[0])}
+        # ~3.3 km north of the network: at least 3300 m / top speed to get there
+        off_road = {'id': 2, 'lat': float(self.graph.lats.max()) + 0.03, 'lng': on_road['lng']}
+        self.catchments.sync([on_road, off_road], 1)
+        node, snap_meters = self.graph.snap(off_road['lat'], off_road['lng'])
+        floor = snap_meters / self.graph.max_speed_mps
+        self.assertGreater(floor, BUDGETS[1])
+
+        for cell in range(len(self.grid)):
+            self.assertNotIn(2, self.catchments.reachable_from(cell, BUDGETS[1])[0])
+        times = self.graph.times_to(node, BUDGETS[2] - floor)
+        reached = {int(cell) for node_id, cell in enumerate(self.grid.cell_ids(self.graph.lats, self.graph.lngs))
+                   if node_id in times and cell >= 0}
+        found = {cell for cell in range(len(self.grid)) if 2 in self.catchments.reachable_from(cell, BUDGETS[2])[0]}
+        self.assertTrue(reached)
+        self.assertTrue(reached <= found)
+
+
+if __name__ == '__main__':
+    unittest.main()
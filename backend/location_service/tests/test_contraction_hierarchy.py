@@ -0,0 +1,67 @@
+import math
+import os
+import random
+import tempfile
+import unittest
+
+from contraction_hierarchy import ContractionHierarchy, load_or_build
+from road_graph import RoadGraph
+
+TEST_GRAPH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          'data', 'test_road_graph.geojson')
+
+
+class ContractionHierarchyTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.graph = RoadGraph.from_file(TEST_GRAPH)
+        cls.hierarchy = ContractionHierarchy.build(cls.graph)
+        rng = random.Random(3)
+        cls.pairs = [(rng.randrange(len(cls.graph)), rng.randrange(len(cls.graph))) for _ in range(150)]
+
+    def assertSameCost(self, got, want):
+        if math.isinf(want):
+            self.assertTrue(math.isinf(got))
+        else:
+            self.assertAlmostEqual(got, want, places=6)
+
+    def test_query_matches_astar(self):
+        for source, target in self.pairs:
+            seconds, meters, _ = self.hierarchy.query(source, target)
+            want_seconds, want_meters, _, _ = self.graph.astar(source, target)
+            self.assertSameCost(seconds, want_seconds)
+            self.assertSameCost(meters, want_meters)
+
+    def test_unpacked_path_is_a_road_path_with_the_same_cost(self):
+        edges = {(u, v): seconds for u, v, seconds, _ in self.graph.edges()}
+        for source, target in self.pairs[:50]:
+            seconds, _, nodes = self.hierarchy.query(source, target, with_path=True)
+            if math.isinf(seconds):
+                continue
+            self.assertEqual((nodes[0], nodes[-1]), (source, target))
+            self.assertAlmostEqual(sum(edges[edge] for edge in zip(nodes[:-1], nodes[1:])), seconds, places=6)
+
+    def test_many_to_many_matches_single_queries(self):
+        sources = [source for source, _ in self.pairs[:12]]
+        targets = [target for _, target in self.pairs[:9]]
+        seconds, meters = self.hierarchy.many_to_many(sources, targets)
+        for row, source in enumerate(sources):
+            for column, target in enumerate(targets):
+                want_seconds, want_meters, _ = self.hierarchy.query(source, target)
+                self.assertSameCost(seconds[row, column], want_seconds)
+                self.assertSameCost(meters[row, column], want_meters)
+
+    def test_cache_round_trip(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            built, was_built = load_or_build(TEST_GRAPH, cache_dir)
+            loaded, rebuilt = load_or_build(TEST_GRAPH, cache_dir)
+
+        self.assertTrue(was_built)
+        self.assertFalse(rebuilt)
+        for source, target in self.pairs[:30]:
+            self.assertSameCost(loaded.query(source, target)[0], built.query(source, target)[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
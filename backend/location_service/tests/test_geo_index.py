@@ -0,0 +1,47 @@
+import random
+import unittest
+
+from distance import EQUIRECTANGULAR, GEODESIC, HAVERSINE, distance
+from geo_index import PointGrid
+
+
+class PointGridTests(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(11)
+        self.points = [(12.9 + rng.random() * 0.2, 77.5 + rng.random() * 0.2) for _ in range(400)]
+        self.queries = [(12.9 + rng.random() * 0.2, 77.5 + rng.random() * 0.2) for _ in range(40)]
+        self.grid = PointGrid(self.points, cell_deg=0.01)
+
+    def brute_force(self, lat, lng, mode):
+        return sorted((distance(mode, lat, lng, *point), index) for index, point in enumerate(self.points))
+
+    def test_nearest_matches_brute_force(self):
+        for mode in (HAVERSINE, EQUIRECTANGULAR, GEODESIC):
+            for lat, lng in self.queries:
+                found = self.grid.nearest(lat, lng, 5, mode, start_meters=200.0)
+                expected = self.brute_force(lat, lng, mode)[:5]
+                self.assertEqual([index for _, index in found], [index for _, index in expected])
+                for (got, _), (want, _) in zip(found, expected):
+                    self.assertAlmostEqual(got, want, places=6)
+
+    def test_nearest_respects_max_meters(self):
+        lat, lng = self.queries[0]
+        found = self.grid.nearest(lat, lng, 50, HAVERSINE, max_meters=1500.0)
+        expected = [entry for entry in self.brute_force(lat, lng, HAVERSINE) if entry[0] <= 1500.0][:50]
+
+        self.assertEqual([index for _, index in found], [index for _, index in expected])
+
+    def test_within_matches_brute_force(self):
+        for lat, lng in self.queries:
+            found = {index for _, index in self.grid.within(lat, lng, 2000.0, HAVERSINE)}
+            expected = {index for meters, index in self.brute_force(lat, lng, HAVERSINE) if meters <= 2000.0}
+            self.assertEqual(found, expected)
+
+    def test_far_query_and_empty_grid(self):
+        self.assertEqual(len(self.grid.nearest(-33.9, 151.2, 3, HAVERSINE)), 3)
+        self.assertEqual(PointGrid([]).nearest(12.9, 77.5, 3, HAVERSINE), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+"""
+Client-side cache of the Station Service snapshot.
+
+Each refresh sends the version we already hold; the Station Service answers
+with a tiny not_modified reply until a station is created, changed or deleted.
+
+The source of this module is backend/shared/station_cache.py; setup_services.sh
+copies it into every service that uses it (like the protos). Edit it there.
+"""
+
+from proto_generated import station_pb2
+
+
+class StationSnapshotCache:
+
+    def __init__(self, station_stub, timeout=2.0):
+        self.station_stub = station_stub
+        self.timeout = timeout  # seconds per GetStationSnapshot call
+        self.version = 0
+        self.stations = []
+        self._by_id = {}
+
+        self.checks = 0
+        self.not_modified = 0
+        self.reloads = 0
+        self.failures = 0
+
+    def refresh(self):
+        """
+        Sync with the Station Service.
+        Returns True when the station list changed, False otherwise. On errors
+        the last good snapshot is kept.
+        """
+        response = self.fetch()
+        return response is not None and self.load(response)
+
+    def fetch(self):
+        """
+        Ask the Station Service for a snapshot newer than the loaded one.
+        Returns the response when stations changed, None when they didn't or
+        on errors. The loaded snapshot is not touched, so callers can make the
+        round trip without holding their own locks and apply it with load().
+        """
+        self.checks += 1
+        try:
+            request = station_pb2.StationSnapshotRequest(since_version=self.version)
+            response = self.station_stub.GetStationSnapshot(request, timeout=self.timeout)
+        except Exception as e:
+            self.failures += 1
+            print(f"[STATION CACHE] Snapshot refresh failed: {e}", flush=True)
+            return None
+
+        if not response.success:
+            self.failures += 1
+            print(f"[STATION CACHE] Snapshot refresh failed: {response.message}", flush=True)
+            return None
+
+        if response.not_modified:
+            self.not_modified += 1
+            return None
+        return response
+
+    def load(self, response):
+        """Load a fetched snapshot; returns False when that version is already loaded"""
+        if response.version == self.version:
+            return False
+        self.stations = [
+            {'id': station_id, 'name': name, 'lat': lat, 'lng': lng}
+            for station_id, name, lat, lng in zip(
+                response.station_ids, response.names, response.latitudes, response.longitudes
+            )
+        ]
+        self._by_id = {station['id']: station for station in self.stations}
+        self.version = response.version
+        self.reloads += 1
+        print(f"[STATION CACHE] Loaded {len(self.stations)} stations (version {self.version})", flush=True)
+        return True
+
+    def get(self, station_id):
+        return self._by_id.get(station_id)
+
+    def stats(self):
+        return {
+            'version': self.version,
+            'stations': len(self.stations),
+            'checks': self.checks,
+            'not_modified': self.not_modified,
+            'reloads': self.reloads,
+            'failures': self.failures
+        }
@@ -20,17 +20,20 @@ import grpc
 import pika
 import requests
 from datetime import datetime, timedelta
+from google.protobuf import field_mask_pb2
 
 # Setup Django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'matching_service.settings')
 django.setup()
 
 from matching.models import Match
+from matching.station_cache import StationSnapshotCache
 from django.conf import settings
 
 # Import proto files
 from proto_generated import rider_pb2, rider_pb2_grpc
 from proto_generated import driver_pb2, driver_pb2_grpc
+from proto_generated import station_pb2_grpc
 
 
 class MatchingConsumer:
@@ -41,14 +44,17 @@ class MatchingConsumer:
         self.rider_service_port = settings.RIDER_SERVICE_PORT
         self.driver_service_host = settings.DRIVER_SERVICE_HOST
         self.driver_service_port = settings.DRIVER_SERVICE_PORT
+        self.station_service_host = settings.STATION_SERVICE_HOST
+        self.station_service_port = settings.STATION_SERVICE_PORT
         
         # Setup gRPC clients
         self.setup_grpc_clients()
+        self.station_cache = StationSnapshotCache(self.station_stub)
         
         print("[MATCHING] Consumer initialized")
     
     def setup_grpc_clients(self):
-        """Setup gRPC clients for Rider and Driver services"""
+        """Setup gRPC clients for Rider, Driver and Station services"""
         try:
             # Rider Service
             rider_address = f"{self.rider_service_host}:{self.rider_service_port}"
@@ -60,16 +66,47 @@ class MatchingConsumer:
             driver_channel = grpc.insecure_channel(driver_address)
             self.driver_stub = driver_pb2_grpc.DriverServiceStub(driver_channel)
             
+            # Station Service
+            station_address = f"{self.station_service_host}:{self.station_service_port}"
+            station_channel = grpc.insecure_channel(station_address)
+            self.station_stub = station_pb2_grpc.StationServiceStub(station_channel)
+            
             print("[MATCHING] gRPC clients initialized")
         except Exception as e:
             print(f"[MATCHING] gRPC client setup failed: {e}")
             self.rider_stub = None
             self.driver_stub = None
+            self.station_stub = None
+    
+    def estimate_driver_arrival(self, driver_id, station_id):
+        """
+        Driver's sim time (HH:MM) on reaching the station along its current
+        route, from the Driver Service's route prefix sums; None if unknown
+        or if the route never comes within ARRIVAL_MAX_OFF_ROUTE_METERS of it.
+        The driver is read uncached so a route edited moments ago counts.
+        """
+        try:
+            response = self.driver_stub.EstimateArrivals(
+                driver_pb2.ArrivalsRequest(driver_ids=[driver_id], station_id=station_id, uncached=True)
+            )
+            if response.success and response.arrivals:
+                arrival = response.arrivals[0]
+                if arrival.off_route_meters > settings.ARRIVAL_MAX_OFF_ROUTE_METERS:
+                    print(f"[MATCHING] Driver {driver_id}'s route passes {arrival.off_route_meters:.0f}m from "
+                          f"Station {station_id}; using the driver's current time")
+                    return None
+                print(f"[MATCHING] Driver {driver_id} reaches Station {station_id} at {arrival.arrival_time} "
+                      f"({arrival.arrival_ticks} tick(s), {arrival.route_meters + arrival.off_route_meters:.0f}m)")
+                return arrival.arrival_time
+            print(f"[MATCHING] No arrival estimate for Driver {driver_id}: {response.message}")
+        except Exception as e:
+            print(f"[MATCHING] Arrival estimate failed: {e}")
+        return None
     
     def calculate_max_eta(self, driver_timestamp):
         """
         Calculate maximum ETA for matching.
-        Driver timestamp + 5 minutes window
+        Driver timestamp (or arrival time at the station) + 5 minutes window
         """
         try:
             # Parse HH:MM format
@@ -115,19 +152,34 @@ class MatchingConsumer:
         """
         CRITICAL: Update driver route by pushing station to front of queue
         This is the key interaction that makes the driver physically visit the station
+        
+        Sent as one atomic EditDriverRoute (insert the station at the head and
+        set it as the matched station). The driver service compare-and-swaps
+        on the route version and re-applies the edits if the simulator moved
+        the driver in between, so the simulator never overwrites the match.
         """
         try:
-            request = driver_pb2.UpdateRouteRequest(
+            request = driver_pb2.EditRouteRequest(
                 driver_id=driver_id,
-                station_id=station_id,
-                station_lat=station_lat,
-                station_lng=station_lng,
-                action="PUSH_FRONT"
+                edits=[
+                    driver_pb2.RouteEdit(
+                        op=driver_pb2.RouteEdit.INSERT,
+                        index=0,
+                        coordinate=driver_pb2.Coordinate(latitude=station_lat, longitude=station_lng)
+                    ),
+                    driver_pb2.RouteEdit(
+                        op=driver_pb2.RouteEdit.SET_MATCHED_STATION,
+                        station_id=station_id
+                    )
+                ],
+                # Only success is checked; don't have the route sent back
+                read_mask=field_mask_pb2.FieldMask(paths=['driver_id', 'route_version'])
             )
-            response = self.driver_stub.UpdateDriverRoute(request)
+            response = self.driver_stub.EditDriverRoute(request)
             
             if response.success:
-                print(f"[MATCHING] Updated Driver {driver_id} route - Station {station_id} pushed to front")
+                print(f"[MATCHING] Updated Driver {driver_id} route - Station {station_id} pushed to front "
+                      f"(route version {response.route_version})")
                 return True
             else:
                 print(f"[MATCHING] Failed to update driver route: {response.message}")
@@ -207,7 +259,7 @@ class MatchingConsumer:
         """
         Main matching logic:
         1. Get riders at the station
-        2. Filter by ETA (within 5 minutes)
+        2. Filter by ETA (within 5 minutes of the driver's arrival)
         3. Match first available rider
         4. Update driver route (push station to front)
         5. Update rider status to MATCHED
@@ -223,8 +275,10 @@ class MatchingConsumer:
         
         print(f"\n[MATCHING] Processing: Driver {driver_id} near Station {station_id} ({station_name}) at {driver_timestamp}")
         
-        # Calculate max ETA window
-        max_eta = self.calculate_max_eta(driver_timestamp)
+        # Calculate max ETA window from when the driver actually reaches the
+        # station along its route (falls back to its current time)
+        arrival_time = self.estimate_driver_arrival(driver_id, station_id)
+        max_eta = self.calculate_max_eta(arrival_time or driver_timestamp)
         print(f"[MATCHING] Looking for riders with ETA <= {max_eta}")
         
         # Get riders at this station
@@ -247,9 +301,17 @@ class MatchingConsumer:
         print(f"[MATCHING]   Meeting Point: Station {station_id} ({station_name})", flush=True)
         
         # CRITICAL STEP: Update driver route to visit the station
-        # We need to get the station coordinates - for now use driver's current location
-        # In production, fetch from Station Service
-        success = self.update_driver_route(driver_id, station_id, driver_lat, driver_lng)
+        # Station coordinates come from the cached station snapshot (a cheap
+        # not-modified check); fall back to the driver's position if unknown
+        self.station_cache.refresh()
+        station = self.station_cache.get(station_id)
+        if station:
+            station_lat, station_lng = station['lat'], station['lng']
+        else:
+            print(f"[MATCHING] Station {station_id} not in snapshot, using driver location")
+            station_lat, station_lng = driver_lat, driver_lng
+        
+        success = self.update_driver_route(driver_id, station_id, station_lat, station_lng)
         
         if not success:
             print(f"[MATCHING] Failed to update driver route, aborting match")
@@ -116,4 +116,10 @@ DRIVER_SERVICE_HOST = os.environ.get('DRIVER_SERVICE_HOST', 'localhost')
 DRIVER_SERVICE_PORT = os.environ.get('DRIVER_SERVICE_PORT', '50054')
 TRIP_SERVICE_HOST = os.environ.get('TRIP_SERVICE_HOST', 'localhost')
 TRIP_SERVICE_PORT = os.environ.get('TRIP_SERVICE_PORT', '8008')
+STATION_SERVICE_HOST = os.environ.get('STATION_SERVICE_HOST', 'localhost')
+STATION_SERVICE_PORT = os.environ.get('STATION_SERVICE_PORT', '50052')
 
+# Arrival estimates whose closest route point is further than this from the
+# station are ignored (the driver only passes nearby); matching then uses the
+# driver's current time. Same default as the simulator's proximity radius.
+ARRIVAL_MAX_OFF_ROUTE_METERS = float(os.environ.get('ARRIVAL_MAX_OFF_ROUTE_METERS', '100'))
@@ -14,3 +14,22 @@ done
 
 echo "✓ Proto files copied to all services!"
 
+# Shared Python modules: one source in shared/, a copy inside each service
+# that imports it (Docker build contexts are per service)
+SHARED_COPIES=(
+    "station_cache.py:driver_service/drivers"
+    "station_cache.py:matching_service/matching"
+    "station_cache.py:location_service"
+    "http_cache.py:driver_service/drivers"
+    "http_cache.py:station_service/stations"
+)
+
+for entry in "${SHARED_COPIES[@]}"; do
+    module="${entry%%:*}"
+    target="${entry#*:}"
+    echo "Copying shared/$module to $target..."
+    cp "shared/$module" "$target/$module"
+done
+
+echo "✓ Shared modules copied to all services!"
+
@@ -10,6 +10,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'station_service.settings')
 django.setup()
 
 from stations.models import Station
+from stations.snapshot import get_snapshot
 import grpc
 from concurrent import futures
 
@@ -120,6 +121,36 @@ class StationServiceServicer(station_pb2_grpc.StationServiceServicer):
                 success=False,
                 total=0
             )
+    
+    def GetStationSnapshot(self, request, context):
+        """
+        Return all stations in columnar form with the catalog version.
+        If the caller already holds since_version, reply not_modified only.
+        """
+        try:
+            snapshot = get_snapshot()
+            
+            if request.since_version and request.since_version == snapshot.version:
+                return station_pb2.StationSnapshotResponse(
+                    success=True,
+                    version=snapshot.version,
+                    not_modified=True
+                )
+            
+            return station_pb2.StationSnapshotResponse(
+                success=True,
+                version=snapshot.version,
+                not_modified=False,
+                station_ids=snapshot.ids,
+                names=snapshot.names,
+                latitudes=snapshot.latitudes,
+                longitudes=snapshot.longitudes
+            )
+        except Exception as e:
+            return station_pb2.StationSnapshotResponse(
+                success=False,
+                message=str(e)
+            )
 
 
 def serve():
@@ -0,0 +1,12 @@
+"""
+Conditional GET helpers shared by the REST services.
+
+The source of this module is backend/shared/http_cache.py; setup_services.sh
+copies it into every service that uses it (like the protos). Edit it there.
+"""
+
+
+def etag_matches(request, etag):
+    """True when the client's If-None-Match already names this ETag"""
+    if_none_match = request.headers.get('If-None-Match', '')
+    return etag in [tag.strip() for tag in if_none_match.split(',')]
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+def create_catalog_row(apps, schema_editor):
+    """The single StationCatalog row, so bump_version only ever updates it"""
+    StationCatalog = apps.get_model('stations', 'StationCatalog')
+    StationCatalog.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StationCatalog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=1)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_catalog_row, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,7 @@
 from django.db import models
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 
 
 class Station(models.Model):
@@ -15,3 +18,34 @@ class Station(models.Model):
     def __str__(self):
         return f"{self.name} ({self.latitude}, {self.longitude})"
 
+
+class StationCatalog(models.Model):
+    """
+    Single-row table holding the station snapshot version.
+    The version increases every time a station is created, updated or deleted,
+    so clients can cache the station list and only refetch when it changes.
+    """
+    version = models.BigIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    # Created by migration 0002_station_catalog_row
+    CATALOG_ID = 1
+    
+    @classmethod
+    def current_version(cls):
+        version = cls.objects.filter(pk=cls.CATALOG_ID).values_list('version', flat=True).first()
+        return version if version is not None else 1
+    
+    @classmethod
+    def bump_version(cls):
+        # A single atomic UPDATE: concurrent bumps never lose an increment
+        cls.objects.filter(pk=cls.CATALOG_ID).update(version=F('version') + 1)
+    
+    def __str__(self):
+        return f"Station catalog v{self.version}"
+
+
+@receiver(post_save, sender=Station)
+@receiver(post_delete, sender=Station)
+def bump_station_catalog_version(sender, **kwargs):
+    StationCatalog.bump_version()
@@ -0,0 +1,62 @@
+"""
+Versioned station snapshot shared by the REST and gRPC endpoints.
+
+The snapshot is rebuilt only when StationCatalog.version changes, so serving
+an unchanged station list costs a single version lookup.
+"""
+
+import json
+import threading
+
+from .models import Station, StationCatalog
+
+
+class StationSnapshot:
+    """Columnar view of all stations at a given catalog version"""
+    
+    def __init__(self, version, ids, names, latitudes, longitudes):
+        self.version = version
+        self.ids = ids
+        self.names = names
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.etag = f'"stations-{version}"'
+        # Pre-encoded once per version, REST responses reuse the bytes as-is
+        self.payload = json.dumps({
+            'version': version,
+            'ids': ids,
+            'names': names,
+            'lat': latitudes,
+            'lng': longitudes
+        }, separators=(',', ':')).encode('utf-8')
+    
+    def __len__(self):
+        return len(self.ids)
+
+
+_lock = threading.Lock()
+_snapshot = None
+
+
+def get_snapshot():
+    """Return the snapshot for the current catalog version, rebuilding if stale"""
+    global _snapshot
+    
+    # Read the version before the rows: a change landing in between only
+    # causes one extra rebuild, never a stale snapshot under a newer version.
+    version = StationCatalog.current_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    
+    with _lock:
+        if _snapshot is None or _snapshot.version != version:
+            rows = list(Station.objects.order_by('id').values_list('id', 'name', 'latitude', 'longitude'))
+            _snapshot = StationSnapshot(
+                version=version,
+                ids=[row[0] for row in rows],
+                names=[row[1] for row in rows],
+                latitudes=[row[2] for row in rows],
+                longitudes=[row[3] for row in rows]
+            )
+        return _snapshot
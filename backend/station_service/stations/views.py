@@ -1,7 +1,11 @@
+from django.http import HttpResponse
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
 from rest_framework.response import Response
-from .models import Station
+from .models import Station, StationCatalog
 from .serializers import StationSerializer
+from .snapshot import get_snapshot
+from .http_cache import etag_matches
 
 
 class StationViewSet(viewsets.ModelViewSet):
@@ -25,11 +29,28 @@ class StationViewSet(viewsets.ModelViewSet):
         }, status=status.HTTP_400_BAD_REQUEST)
     
     def list(self, request):
-        stations = self.get_queryset()
-        serializer = StationSerializer(stations, many=True)
+        etag = f'"stations-list-{StationCatalog.current_version()}"'
+        if etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        
+        serializer = StationSerializer(self.get_queryset(), many=True)
+        stations = serializer.data
         return Response({
             'success': True,
-            'stations': serializer.data,
-            'total': stations.count()
-        })
-
+            'stations': stations,
+            'total': len(stations)
+        }, headers={'ETag': etag})
+    
+    @action(detail=False, methods=['get'])
+    def snapshot(self, request):
+        """
+        Compact columnar station list tagged with the catalog version.
+        Send the last ETag in If-None-Match to get a 304 when nothing changed.
+        """
+        snapshot = get_snapshot()
+        if etag_matches(request, snapshot.etag):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = HttpResponse(snapshot.payload, content_type='application/json')
+        response['ETag'] = snapshot.etag
+        return response
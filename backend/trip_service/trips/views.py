@@ -165,14 +165,12 @@ class TripViewSet(viewsets.ModelViewSet):
             driver_port = os.environ.get('DRIVER_SERVICE_PORT', '8004')
             url = f"http://{driver_host}:{driver_port}/api/drivers/{driver_id}/"
             
-            # Get current driver data
-            response = requests.get(url, timeout=2)
+            # Reset matched_station_id to make driver available (one PATCH, no read first)
+            response = requests.patch(url, json={'matched_station_id': None}, timeout=2)
             if response.status_code == 200:
-                driver_data = response.json()
-                # Reset matched_station_id to make driver available
-                driver_data['matched_station_id'] = None
-                requests.patch(url, json={'matched_station_id': None}, timeout=2)
                 print(f"✅ Driver {driver_id} reset and available for new matches")
+            else:
+                print(f"⚠️ Failed to reset driver {driver_id}: HTTP {response.status_code}")
         except Exception as e:
             print(f"⚠️ Failed to reset driver: {e}")
     
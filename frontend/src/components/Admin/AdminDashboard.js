@@ -1,7 +1,7 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { MapContainer, TileLayer, Marker, Popup, useMapEvents } from 'react-leaflet';
 import L from 'leaflet';
-import { stationAPI, driverAPI } from '../../services/api';
+import { stationAPI, driverAPI, applyLiveDriverEvent } from '../../services/api';
 import '../../App.css';
 
 delete L.Icon.Default.prototype._getIconUrl;
@@ -43,6 +43,8 @@ function MapClickHandler({ onMapClick, isAddingStation }) {
 function AdminDashboard({ onLogout }) {
   const [stations, setStations] = useState([]);
   const [activeDrivers, setActiveDrivers] = useState([]);
+  const driversCursor = useRef(null);
+  const driversActiveSet = useRef(null);
   const [isAddingStation, setIsAddingStation] = useState(false);
   const [newStation, setNewStation] = useState(null);
   const [stationName, setStationName] = useState('');
@@ -52,13 +54,27 @@ function AdminDashboard({ onLogout }) {
 
   useEffect(() => {
     loadStations();
-    loadActiveDrivers();
     
-    const interval = setInterval(() => {
-      loadActiveDrivers();
-    }, 3000);
+    // Live positions are pushed by the driver service; fall back to polling
+    // the delta feed once the stream errors (EventSource would otherwise keep
+    // retrying on its own and leave the map frozen meanwhile)
+    let interval = null;
+    const source = driverAPI.subscribeLiveDrivers(
+      {},
+      (event) => setActiveDrivers((previous) => applyLiveDriverEvent(previous, event)),
+      () => {
+        source.close();
+        if (!interval) {
+          loadActiveDrivers();
+          interval = setInterval(loadActiveDrivers, 3000);
+        }
+      }
+    );
     
-    return () => clearInterval(interval);
+    return () => {
+      source.close();
+      if (interval) clearInterval(interval);
+    };
   }, []);
 
   const loadStations = async () => {
@@ -74,9 +90,30 @@ function AdminDashboard({ onLogout }) {
 
   const loadActiveDrivers = async () => {
     try {
-      const response = await driverAPI.getActiveDrivers();
-      if (response.data.success) {
-        setActiveDrivers(response.data.drivers);
+      const response = await driverAPI.getActiveDrivers({
+        updatedSince: driversCursor.current,
+        activeSet: driversActiveSet.current,
+        includeRoutes: false,
+      });
+      const data = response.data;
+      if (data.success) {
+        if (data.removed_ids) {
+          // Delta: merge changed drivers and drop the ones no longer active
+          // (active_ids only comes back when the active set changed)
+          const activeIds = data.active_ids ? new Set(data.active_ids) : null;
+          const removedIds = new Set(data.removed_ids);
+          setActiveDrivers((previous) => {
+            const byId = new Map(previous.map((driver) => [driver.id, driver]));
+            data.drivers.forEach((driver) => byId.set(driver.id, driver));
+            return Array.from(byId.values()).filter((driver) =>
+              activeIds ? activeIds.has(driver.id) : !removedIds.has(driver.id)
+            );
+          });
+        } else {
+          setActiveDrivers(data.drivers);
+        }
+        driversCursor.current = data.cursor;
+        driversActiveSet.current = data.active_set;
       }
     } catch (err) {
       console.error('Failed to load active drivers:', err);
@@ -192,7 +229,7 @@ function AdminDashboard({ onLogout }) {
             <div key={idx} style={{marginBottom: '10px', fontSize: '12px'}}>
               <p><strong>Driver {driver.user_id}</strong></p>
               <p>Time: {driver.sim_timestamp}</p>
-              <p>Queue: {driver.route_queue?.length || 0} waypoints</p>
+              <p>Queue: {driver.route_length || 0} waypoints</p>
             </div>
           ))}
         </div>
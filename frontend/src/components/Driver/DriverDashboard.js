@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { MapContainer, TileLayer, Marker, Popup, Polyline, useMapEvents } from 'react-leaflet';
 import L from 'leaflet';
 import { driverAPI, stationAPI, matchingAPI } from '../../services/api';
@@ -59,15 +59,60 @@ function DriverDashboard({ user, onLogout }) {
     loadDriver();
   }, []);
 
+  const driverRef = useRef(null);
+  driverRef.current = driver;
+  const driverId = driver?.driver?.id;
+
   useEffect(() => {
-    if (driver && driver.driver.id) {
-      const interval = setInterval(() => {
+    if (!driverId) return undefined;
+    loadMatches();
+
+    // Position and state are pushed once per simulator tick. The full driver
+    // (with its route) and matches are only refetched when a match changes
+    // the route; if the stream can't be opened, fall back to polling.
+    let interval = null;
+    const handleLive = (event) => {
+      const current = driverRef.current?.driver;
+      if (!current) return;
+      if (event.removed.includes(driverId)) {
+        setDriver(null);
+        setMatches([]);
+        return;
+      }
+      const update = event.drivers.find((item) => item.id === driverId);
+      if (!update) return;
+
+      const routeQueue = current.route_queue || [];
+      if (update.matched_station_id !== current.matched_station_id || update.route_length > routeQueue.length) {
         loadDriver();
         loadMatches();
-      }, 3000); // Poll every 3 seconds
-      return () => clearInterval(interval);
-    }
-  }, [driver]);
+        return;
+      }
+      setDriver({
+        ...driverRef.current,
+        driver: { ...current, ...update, route_queue: routeQueue.slice(routeQueue.length - update.route_length) },
+      });
+    };
+
+    // Fall back to polling once the stream errors instead of waiting for
+    // EventSource's own retries
+    const source = driverAPI.subscribeLiveDrivers({ driverIds: [driverId] }, handleLive, () => {
+      source.close();
+      if (!interval) {
+        loadDriver();
+        loadMatches();
+        interval = setInterval(() => {
+          loadDriver();
+          loadMatches();
+        }, 3000); // Poll every 3 seconds
+      }
+    });
+
+    return () => {
+      source.close();
+      if (interval) clearInterval(interval);
+    };
+  }, [driverId]);
 
   const loadStations = async () => {
     try {
@@ -77,11 +77,43 @@ export const driverAPI = {
   stopSimulation: (driverId) =>
     axios.post(`${API_URLS.DRIVER}/drivers/${driverId}/stop_simulation/`),
   
-  getActiveDrivers: () =>
-    axios.get(`${API_URLS.DRIVER}/drivers/active_drivers/`),
+  // Pass updatedSince (the `cursor` of the previous response) to get only
+  // drivers that changed; includeRoutes=false skips the route waypoints
+  getActiveDrivers: ({ updatedSince, activeSet, includeRoutes = true } = {}) =>
+    axios.get(`${API_URLS.DRIVER}/drivers/active_drivers/`, {
+      params: {
+        ...(updatedSince ? { updated_since: updatedSince } : {}),
+        ...(updatedSince && activeSet ? { active_set: activeSet } : {}),
+        ...(includeRoutes ? {} : { include_routes: 'false' }),
+      },
+    }),
   
   deleteDriver: (driverId) =>
     axios.delete(`${API_URLS.DRIVER}/drivers/${driverId}/`),
+  
+  // Server-Sent Events stream of live driver positions (one diff per simulator tick).
+  // onEvent receives {type: 'snapshot' | 'tick', drivers: [...], removed: [ids]}.
+  // Returns the EventSource; call .close() to unsubscribe.
+  subscribeLiveDrivers: ({ driverIds, bbox } = {}, onEvent, onError) => {
+    const params = new URLSearchParams();
+    if (driverIds && driverIds.length) params.set('driver_ids', driverIds.join(','));
+    if (bbox) params.set('bbox', bbox.join(','));
+    const source = new EventSource(`${API_URLS.DRIVER}/drivers/live/?${params.toString()}`);
+    const handle = (event) => onEvent(JSON.parse(event.data));
+    source.addEventListener('snapshot', handle);
+    source.addEventListener('tick', handle);
+    if (onError) source.onerror = onError;
+    return source;
+  },
+};
+
+// Apply a live feed event to a list of drivers (by id)
+export const applyLiveDriverEvent = (drivers, event) => {
+  if (event.type === 'snapshot') return event.drivers;
+  const byId = new Map(drivers.map((driver) => [driver.id, driver]));
+  event.drivers.forEach((driver) => byId.set(driver.id, { ...byId.get(driver.id), ...driver }));
+  event.removed.forEach((id) => byId.delete(id));
+  return Array.from(byId.values());
 };
 
 // Matching Service APIs